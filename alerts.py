@@ -0,0 +1,175 @@
+import logging
+import queue
+import threading
+import time
+
+import requests
+
+alert_log = logging.getLogger('race_display.alerts')
+
+
+class Alert:
+    __slots__ = ('kind', 'key', 'message', 'data', 'at', 'count')
+
+    def __init__(self, kind, key, message, data=None, at=None, count=1):
+        self.kind = kind
+        self.key = key
+        self.message = message
+        self.data = data or {}
+        self.at = time.time() if at is None else at
+        self.count = count
+
+    def to_json(self):
+        return {
+            'type': 'alert',
+            'kind': self.kind,
+            'key': self.key,
+            'message': self.message,
+            'count': self.count,
+            'at': self.at,
+            **self.data,
+        }
+
+
+class LogSink:
+    def __init__(self, logger=alert_log):
+        self.logger = logger
+
+    def send(self, alert):
+        self.logger.warning("[%s] %s", alert.kind, alert.message)
+
+
+class BroadcastSink:
+    """Publish alerts to a BroadcastHub for browsers to show and sound"""
+
+    def __init__(self, hub, sound=None):
+        self.hub = hub
+        self.sound = sound
+
+    def send(self, alert):
+        payload = alert.to_json()
+        if self.sound:
+            payload['sound'] = self.sound
+        self.hub.publish(payload)
+
+
+class WebhookSink:
+    """POST each alert as JSON; runs on the alert worker, never on ingest"""
+
+    def __init__(self, url, timeout=2.0, session=None):
+        self.url = url
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def send(self, alert):
+        self.session.post(self.url, json=alert.to_json(), timeout=self.timeout)
+
+
+class AlertBus:
+    """Out-of-band notifications posted from ingest and delivered by a worker
+
+    post() only enqueues. The worker sends the first alert for a (kind, key)
+    straight away and swallows repeats for `coalesce` seconds, then sends one
+    summary with the repeat count. Each kind is also limited to `per_minute`
+    alerts (a token bucket), so a flood of unknown bibs can't drown out a VIP.
+    Sinks are anything with send(alert); a failing sink is logged and skipped.
+    Checks added with add_check() run on the worker about once a second.
+    """
+
+    def __init__(self, sinks=(), coalesce=5.0, per_minute=30, clock=time.monotonic):
+        self.sinks = list(sinks)
+        self.coalesce = coalesce
+        self.per_minute = per_minute
+        self.clock = clock
+        self.stats = {'posted': 0, 'sent': 0, 'coalesced': 0, 'rate_limited': 0, 'sink_errors': 0}
+        self._queue = queue.SimpleQueue()
+        self._recent = {}   # (kind, key) -> [window end, repeats, latest alert]
+        self._buckets = {}  # kind -> [tokens, last refill]
+        self._checks = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    def post(self, kind, key, message, **data):
+        """Queue an alert; safe to call from the ingest hot path"""
+        self.stats['posted'] += 1
+        self._queue.put(Alert(kind, key, message, data))
+
+    def add_check(self, check):
+        self._checks.append(check)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def _allow(self, kind, now):
+        bucket = self._buckets.get(kind)
+        if bucket is None:
+            bucket = self._buckets[kind] = [self.per_minute, now]
+        bucket[0] = min(self.per_minute, bucket[0] + (now - bucket[1]) * self.per_minute / 60)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def _dispatch(self, alert, now):
+        if not self._allow(alert.kind, now):
+            self.stats['rate_limited'] += 1
+            return
+        self.stats['sent'] += 1
+        for sink in self.sinks:
+            try:
+                sink.send(alert)
+            except Exception as e:
+                self.stats['sink_errors'] += 1
+                alert_log.error("Alert sink %s failed: %s", type(sink).__name__, e)
+
+    def _handle(self, alert, now):
+        key = (alert.kind, alert.key)
+        recent = self._recent.get(key)
+        if recent is not None and now < recent[0]:
+            recent[1] += 1
+            recent[2] = alert
+            self.stats['coalesced'] += 1
+            return
+        self._recent[key] = [now + self.coalesce, 0, alert]
+        self._dispatch(alert, now)
+
+    def _close_windows(self, now):
+        for key, (ends, repeats, alert) in list(self._recent.items()):
+            if now < ends:
+                continue
+            del self._recent[key]
+            if repeats:
+                alert.count = repeats
+                alert.message = f"{alert.message} (repeated {repeats} times)"
+                self._dispatch(alert, now)
+
+    def _run(self):
+        next_tick = self.clock()
+        while True:
+            try:
+                alert = self._queue.get(timeout=max(0.0, next_tick - self.clock()))
+            except queue.Empty:
+                alert = None
+            if alert is None and self._stop.is_set():
+                return
+            now = self.clock()
+            if alert is not None:
+                self._handle(alert, now)
+            if now >= next_tick:
+                next_tick = now + 1.0
+                for check in self._checks:
+                    try:
+                        check()
+                    except Exception:
+                        alert_log.exception("Alert check failed")
+                self._close_windows(now)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name='alerts')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._queue.put(None)
@@ -4,13 +4,17 @@ import os
 import socketserver
 import threading
 import queue
-import json
 import time
 import random
 import hashlib
 import hmac
+import atexit
+import itertools
 import secrets
+import tempfile
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from threading import Lock
 from config import (
@@ -19,20 +23,62 @@ from config import (
     PROTOCOL_CONFIG,
     SERVER_CONFIG
 )
+from alerts import AlertBus, BroadcastSink, LogSink, WebhookSink
+from broadcast import BroadcastHub, projection_key
+from display_pacing import PresentationScheduler
+from event_bus import EventBusPublisher, EventBusSubscriber, HELLO
+from ingest_async import AsyncTimingServer
+from read_dedupe import ReadDeduplicator
+from read_journal import ReadJournal, ACCEPTED, DUPLICATE, UNKNOWN_BIB, INVALID, GUN, ERROR
+from results import ResultsEngine
+from sequence_tracker import SequenceTracker, FILLED as SEQUENCE_FILLED, DUPLICATE as SEQUENCE_DUPLICATE
+from log_config import configure_logging, RateLimitedLogger
+from metrics import Registry
+from roster_snapshot import MappedRoster, write_roster_snapshot
+from roster_store import RosterStore
+from roster_table import RosterTable, normalize_tag
+from stream_filter import filter_from_args
+from tag_observations import TagCrossingReducer
+from template_cache import TemplateCache
+from ws_stream import WebSocketSession
 from bs4 import BeautifulSoup
 import tinycss2
 from urllib.parse import urljoin, urlparse
+from werkzeug.serving import make_server
 import logging
 
+try:
+    from flask_sock import Sock
+except ImportError:
+    # WebSocket transport is optional; /stream works without it
+    Sock = None
+
 app = Flask(__name__, static_folder='static')
 CORS(app)
 
-logging.basicConfig(level=logging.INFO)
+configure_logging(
+    level=SERVER_CONFIG.get('LOG_LEVEL', 'INFO'),
+    levels=SERVER_CONFIG.get('LOG_LEVELS', {})
+)
 logger = logging.getLogger(__name__)
+# Per-subsystem loggers so the hot paths can be turned down independently
+roster_log = logging.getLogger('race_display.roster')
+ingest_log = logging.getLogger('race_display.ingest')
+protocol_log = logging.getLogger('race_display.protocol')
+unknown_bib_log = RateLimitedLogger(
+    ingest_log,
+    burst=SERVER_CONFIG.get('UNKNOWN_BIB_LOG_BURST', 10),
+    sample_every=SERVER_CONFIG.get('UNKNOWN_BIB_LOG_SAMPLE', 100)
+)
 
 # Global variables
-roster_data = {}
-data_queue = queue.Queue()
+# bib -> runner, stored column-wise so large events stay compact
+roster_data = RosterTable()
+# Every /stream client subscribes to the hub and receives every read
+data_hub = BroadcastHub(
+    SERVER_CONFIG.get('SUBSCRIBER_BUFFER', 256),
+    SERVER_CONFIG.get('REPLAY_BUFFER', 1024)
+)
 current_event_id = None
 race_name = None
 
@@ -41,6 +87,275 @@ HOST = '127.0.0.1'
 PORT = 61611
 BUFFER_SIZE = 1024
 
+# Optional pacing between ingest and the displays; with no dwell time reads
+# are published as soon as they arrive
+FINISH_LOCATIONS = tuple(SERVER_CONFIG.get('FINISH_LOCATIONS', ('finish',)))
+
+if SERVER_CONFIG.get('DISPLAY_DWELL', 0) > 0:
+    display_scheduler = PresentationScheduler(
+        data_hub.publish,
+        dwell=SERVER_CONFIG['DISPLAY_DWELL'],
+        max_backlog=SERVER_CONFIG.get('DISPLAY_MAX_BACKLOG', 20),
+        batch_size=SERVER_CONFIG.get('DISPLAY_BATCH_SIZE', 0),
+        finish_locations=FINISH_LOCATIONS,
+        vip_bibs=SERVER_CONFIG.get('VIP_BIBS', ()),
+        vip_teams=SERVER_CONFIG.get('VIP_TEAMS', ())
+    ).start()
+    publish_display = display_scheduler.submit
+else:
+    display_scheduler = None
+    publish_display = data_hub.publish
+
+stream_ids = itertools.count(1)
+
+# TO~ tag observations are reduced to one crossing per tag pass before they
+# reach the read pipeline
+TAG_OBSERVATION_PREFIX = 'TO' + PROTOCOL_CONFIG['FIELD_SEPARATOR']
+TAG_CROSSING_SOURCE = 'tag-crossings'
+tag_reducer = TagCrossingReducer(
+    lambda *crossing: handle_tag_crossing(*crossing),
+    mode=PROTOCOL_CONFIG.get('TAG_CROSSING_MODE', 'peak'),
+    gap=PROTOCOL_CONFIG.get('TAG_CROSSING_GAP', 1.0),
+    max_window=PROTOCOL_CONFIG.get('TAG_CROSSING_MAX_WINDOW', 5.0),
+    locations=PROTOCOL_CONFIG.get('TAG_LOCATIONS', {})
+).start()
+
+# Operator notifications (VIP crossings, unknown bibs, silent readers) are
+# posted here and delivered from the alert worker, never on the ingest path
+alerts_hub = BroadcastHub(64, 128)
+alert_bus = AlertBus(
+    [LogSink(), BroadcastSink(alerts_hub, sound='/alerts/beep.mp3')],
+    coalesce=SERVER_CONFIG.get('ALERT_COALESCE', 5.0),
+    per_minute=SERVER_CONFIG.get('ALERT_RATE', 30)
+)
+if SERVER_CONFIG.get('ALERT_WEBHOOK'):
+    alert_bus.add_sink(WebhookSink(SERVER_CONFIG['ALERT_WEBHOOK']))
+VIP_BIBS = frozenset(SERVER_CONFIG.get('VIP_BIBS', ()))
+READER_SILENCE = SERVER_CONFIG.get('READER_SILENCE', 60)
+silent_sources = set()
+
+def check_silent_readers():
+    """Alert once when a timing connection stops sending, and again if it resumes"""
+    now = time.monotonic()
+    for source, at in list(last_line_at.items()):
+        if source == TAG_CROSSING_SOURCE:
+            continue
+        quiet = now - at
+        if quiet >= READER_SILENCE and source not in silent_sources:
+            silent_sources.add(source)
+            alert_bus.post('reader_silent', source, f"No data from {source} for {int(quiet)}s")
+        elif quiet < READER_SILENCE and source in silent_sources:
+            silent_sources.discard(source)
+            alert_bus.post('reader_resumed', source, f"{source} is sending again")
+
+if READER_SILENCE:
+    alert_bus.add_check(check_silent_readers)
+
+# Durable log of every timing line for the current event; see open_journal()
+read_journal = None
+journal_lock = Lock()
+
+# Leaderboard deltas go to screens subscribed to /stream/leaderboard only
+leaderboard_hub = BroadcastHub(
+    SERVER_CONFIG.get('SUBSCRIBER_BUFFER', 256),
+    SERVER_CONFIG.get('REPLAY_BUFFER', 1024)
+)
+
+# Split times, pace and placements for every accepted read
+results = ResultsEngine(
+    start_locations=SERVER_CONFIG.get('START_LOCATIONS', ('start',)),
+    finish_locations=FINISH_LOCATIONS,
+    rank_by=SERVER_CONFIG.get('RANK_BY', 'chip'),
+    distances=SERVER_CONFIG.get('RACE_DISTANCES', {}),
+    unit=SERVER_CONFIG.get('DISTANCE_UNIT', 'mi'),
+    board_size=SERVER_CONFIG.get('LEADERBOARD_SIZE', 10),
+    on_leaderboard=leaderboard_hub.publish
+)
+
+# Drops repeated chip reads before the broadcast
+read_dedupe = ReadDeduplicator(
+    window=PROTOCOL_CONFIG.get('DEDUPE_WINDOW', 10.0),
+    max_keys=PROTOCOL_CONFIG.get('DEDUPE_MAX_KEYS', 50000)
+)
+
+# Live timing connections by source, each a write_command(*fields) callable,
+# so missing reads can be asked for again over the connection they came from
+timing_channels = {}
+BACKFILL_COMMAND = PROTOCOL_CONFIG.get('BACKFILL_COMMAND', 'rewind')
+BACKFILL_MAX_RANGES = PROTOCOL_CONFIG.get('BACKFILL_MAX_RANGES', 50)
+
+def request_backfill(source, location, first, last):
+    """Ask a timing box to resend reads first..last (inclusive) for a location"""
+    send = timing_channels.get(source)
+    if send is None or not BACKFILL_COMMAND:
+        return False
+    ingest_log.info("Requesting reads %s-%s at %s from %s", first, last, location, source)
+    try:
+        send(BACKFILL_COMMAND, location, first, last)
+    except OSError as e:
+        ingest_log.warning("Backfill request to %s failed: %s", source, e)
+        return False
+    return True
+
+def timing_connected(source, send):
+    """Register a connection's command channel and ask for reads it still owes us"""
+    timing_channels[source] = send
+    # The box may have restarted while it was away; let its next read tell
+    sequences.reconnected(source)
+    ranges = [
+        (location, first, last)
+        for (_, location), gaps in sequences.gaps(source).items()
+        for first, last in gaps
+    ]
+    if len(ranges) > BACKFILL_MAX_RANGES:
+        ingest_log.warning("%s has %d missing ranges; requesting the latest %d",
+                           source, len(ranges), BACKFILL_MAX_RANGES)
+        ranges = ranges[-BACKFILL_MAX_RANGES:]
+    for location, first, last in ranges:
+        request_backfill(source, location, first, last)
+
+def timing_disconnected(source, send):
+    if timing_channels.get(source) == send:
+        del timing_channels[source]
+
+def sequence_reset(source, location, number):
+    ingest_log.warning("%s restarted its count at %s (sequence %s)", source, location, number)
+    alert_bus.post('reader_restart', f"{source}/{location}",
+                   f"{source} restarted its read count at {location}",
+                   source=source, location=location, sequence=number)
+
+def sequence_duplicates(source, location, count):
+    ingest_log.warning("%s sent %d already-seen sequence numbers in a row at %s", source, count, location)
+    alert_bus.post('reader_duplicates', f"{source}/{location}",
+                   f"{source} keeps resending reads at {location}; check whether it restarted",
+                   source=source, location=location, count=count)
+
+# Per-(source, location) sequence numbers: gaps are requested again as soon as
+# they are seen, and again when the box reconnects, and reads already
+# delivered are dropped when the box resends them. A read is fingerprinted so
+# a box that restarted its count isn't mistaken for one resending old reads.
+sequences = SequenceTracker(
+    max_gaps=PROTOCOL_CONFIG.get('SEQUENCE_MAX_GAPS', 1000),
+    on_gap=request_backfill,
+    reset_jump=PROTOCOL_CONFIG.get('SEQUENCE_RESET_JUMP', 10000),
+    duplicate_alert=PROTOCOL_CONFIG.get('SEQUENCE_DUPLICATE_ALERT', 20),
+    on_reset=sequence_reset,
+    on_duplicates=sequence_duplicates
+)
+
+def read_fingerprint(data):
+    return hash((data['bib'], data['tagcode'], data['time']))
+
+# Process layout. 'all' runs everything in this process. 'ingest' owns the
+# timing port, roster, journal and results, and mirrors the hubs and results
+# to the web workers over the event bus; 'web' workers serve the streams and
+# APIs from what the bus delivers and forward control requests to ingest.
+# serve.py starts one ingest process and several web workers.
+PROCESS_ROLE = os.environ.get('RACE_DISPLAY_ROLE') or SERVER_CONFIG.get('PROCESS_ROLE', 'all')
+EVENT_BUS_PATH = SERVER_CONFIG.get('EVENT_BUS', os.path.join(tempfile.gettempdir(), 'race_display.sock'))
+ROSTER_SNAPSHOT = SERVER_CONFIG.get('ROSTER_SNAPSHOT', os.path.join(app.root_path, 'roster.snapshot'))
+INGEST_CONTROL = SERVER_CONFIG.get('INGEST_CONTROL', ('127.0.0.1', 5001))
+# Answered by the ingest process, which holds the roster and timing state
+INGEST_ROUTES = frozenset((
+    '/api/login', '/api/login-progress', '/api/test-connection', '/api/ingest-stats', '/api/journal'
+))
+MIRRORED_HUBS = {'display': data_hub, 'leaderboard': leaderboard_hub, 'alert': alerts_hub}
+event_bus = None
+bus_subscriber = None
+
+def mirror_results(change):
+    """Send a results change to the web workers; a reset starts the retained log over"""
+    if change[0] == 'reset':
+        event_bus.clear('result')
+    event_bus.publish('result', change)
+
+def publish_roster():
+    """Write the roster snapshot the web workers map and tell them to reload it"""
+    if event_bus is None:
+        return
+    started = time.time()
+    try:
+        write_roster_snapshot(ROSTER_SNAPSHOT, roster_data)
+    except OSError as e:
+        roster_log.error("Failed to write roster snapshot for web workers: %s", e)
+        return
+    roster_log.info("Wrote %d runners to %s in %.2fs", len(roster_data), ROSTER_SNAPSHOT, time.time() - started)
+    event_bus.publish('roster', {
+        'event_id': current_event_id,
+        'race_name': race_name,
+        'synced_at': roster_synced_at
+    })
+
+def start_event_bus():
+    """Ingest side: mirror every hub and results change onto the bus"""
+    global event_bus
+    event_bus = EventBusPublisher(
+        EVENT_BUS_PATH,
+        buffer_size=SERVER_CONFIG.get('EVENT_BUS_BUFFER', 10000),
+        hello={channel: hub.boot for channel, hub in MIRRORED_HUBS.items()}
+    )
+    for channel, hub in MIRRORED_HUBS.items():
+        event_bus.retain(channel, SERVER_CONFIG.get('REPLAY_BUFFER', 1024))
+        hub.on_publish = lambda event, channel=channel: event_bus.publish(channel, event.data, event.seq)
+    # Only reads that change the results are sent, so the log since the last
+    # reset is bounded by the runners and their splits
+    event_bus.retain('result')
+    event_bus.retain('roster', 1)
+    results.on_change = mirror_results
+    atexit.register(event_bus.close)
+    return event_bus.start()
+
+def apply_roster_frame(seq, payload):
+    global current_event_id, race_name, roster_synced_at
+    roster_data.refresh()
+    current_event_id = payload['event_id']
+    race_name = payload['race_name']
+    roster_synced_at = payload['synced_at']
+
+def on_bus_hello(seq, boots):
+    # Everything retained is resent after the hello, results included
+    for channel, hub in MIRRORED_HUBS.items():
+        hub.restart(boots[channel])
+    results.reset()
+
+def start_bus_subscriber():
+    """Web side: feed the local hubs, results and roster from the ingest process"""
+    global bus_subscriber
+    handlers = {
+        channel: (lambda seq, payload, hub=hub: hub.publish(payload, seq))
+        for channel, hub in MIRRORED_HUBS.items()
+    }
+    handlers.update({
+        HELLO: on_bus_hello,
+        'result': lambda seq, change: results.apply(change),
+        'roster': apply_roster_frame,
+    })
+    bus_subscriber = EventBusSubscriber(EVENT_BUS_PATH, handlers).start()
+    return bus_subscriber
+
+if PROCESS_ROLE == 'web':
+    # Read-only and shared through the page cache; leaderboard deltas arrive
+    # from the ingest process rather than being generated again here
+    roster_data = MappedRoster(ROSTER_SNAPSHOT)
+    results.on_leaderboard = None
+
+# Prometheus-style metrics served at /metrics
+metrics = Registry()
+ingest_lines = metrics.counter(
+    'race_display_ingest_lines_total', 'Lines received from timing connections', ['source'])
+parse_failures = metrics.counter(
+    'race_display_parse_failures_total', 'Timing lines that were not CT01_33 reads')
+ingest_errors = metrics.counter(
+    'race_display_ingest_errors_total', 'Timing lines that raised while being processed')
+unknown_bibs = metrics.counter(
+    'race_display_unknown_bibs_total', 'Reads for bibs missing from the roster')
+line_seconds = metrics.histogram(
+    'race_display_line_processing_seconds', 'Time spent handling one timing line')
+roster_page_seconds = metrics.histogram(
+    'race_display_roster_page_fetch_seconds', 'Roster API page download time',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+last_line_at = {}  # source -> time.monotonic() of its last line
+
 # Add after global variables
 listener_lock = Lock()
 listeners_started = False
@@ -48,6 +363,14 @@ listeners_started = False
 # Add to global variables
 AUTH_SECRETS = {}  # Store connection-specific secrets
 
+# On-disk roster snapshots so a restart doesn't have to re-download the event
+roster_store = RosterStore(
+    SERVER_CONFIG.get('ROSTER_DB', os.path.join(app.root_path, 'roster_cache.sqlite3'))
+)
+roster_synced_at = None
+refresh_stop = threading.Event()
+full_refresh_warned = set()  # events whose refresh came back as the whole roster
+
 # Track progress while loading roster data
 login_progress = {
     'total_entries': 0,
@@ -60,14 +383,30 @@ TEMPLATE_DIR = os.path.join(app.root_path, 'saved_templates')
 UPLOAD_DIR = os.path.join(app.static_folder, 'uploads')
 os.makedirs(TEMPLATE_DIR, exist_ok=True)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+template_cache = TemplateCache(TEMPLATE_DIR)
 
 def encode_password(password):
     """Encode password using SHA-1"""
     return hashlib.sha1(password.encode('utf-8')).hexdigest()
 
-def fetch_roster_page(event_id, credentials, page=1):
-    """Fetch a single page of roster data"""
+def create_roster_session(workers=1):
+    """Create a keep-alive HTTP session sized for the fetch worker pool"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def fetch_roster_page(event_id, credentials, page=1, session=None, page_size=None, retries=None,
+                      extra_params=None):
+    """Fetch a single page of roster data, retrying transient failures"""
     url = f"{API_CONFIG['BASE_URL']}/event/{event_id}/entry"
+    http = session or requests
+    if page_size is None:
+        page_size = API_CONFIG.get('PAGE_SIZE', 100)
+    if retries is None:
+        retries = API_CONFIG.get('PAGE_RETRIES', 3)
+    backoff = API_CONFIG.get('RETRY_BACKOFF', 0.5)
     
     # Use provided credentials or fall back to defaults
     user_id = credentials.get('user_id') or API_CONFIG.get('DEFAULT_USER_ID', '')
@@ -85,154 +424,331 @@ def fetch_roster_page(event_id, credentials, page=1):
         'user_id': user_id,
         'user_pass': encoded_password,
         'page': page,
-        'size': 100,  # Increased page size to reduce number of requests
+        'size': page_size,
         'include_test_entries': 'true',
         'elide_json': 'false'
     }
+    if extra_params:
+        params.update(extra_params)
     
-    print(f"Requesting roster from: {url}")
-    print(f"Request parameters: {params}")
+    roster_log.debug("Requesting roster page %s from: %s", page, url)
     
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        print(f"API Response status: {response.status_code}")
-        print(f"API Response headers: {dict(response.headers)}")
-        
-        if response.status_code != 200:
-            print(f"API Error: {response.text}")
-            return None, None
+    for attempt in range(retries + 1):
+        if attempt:
+            delay = backoff * (2 ** (attempt - 1))
+            roster_log.info("Retrying roster page %s in %.1fs (attempt %d of %d)", page, delay, attempt + 1, retries + 1)
+            time.sleep(delay)
+        try:
+            request_started = time.perf_counter()
+            response = http.get(url, params=params, timeout=10)
+            roster_page_seconds.observe(time.perf_counter() - request_started)
+            roster_log.debug("API Response status for page %s: %s", page, response.status_code)
             
-        response.raise_for_status()
-        data = response.json()
-        
-        # Validate response structure
-        if not isinstance(data, dict):
-            print(f"Invalid response format: expected dict, got {type(data)}")
-            return None, None
+            if response.status_code == 429 or response.status_code >= 500:
+                roster_log.warning("API Error (retryable) on page %s: %s", page, response.text[:500])
+                continue
+
+            if response.status_code != 200:
+                roster_log.error("API Error: %s", response.text)
+                return None, None
+                
+            try:
+                data = response.json()
+            except ValueError as e:
+                # A malformed page won't come back any different if retried
+                roster_log.error("JSON parsing error: %s; response content: %s...", e, response.text[:500])
+                return None, None
             
-        if 'event_entry' not in data:
-            print(f"Missing 'event_entry' in response: {data}")
-            return None, None
+            # Validate response structure
+            if not isinstance(data, dict):
+                roster_log.error("Invalid response format: expected dict, got %s", type(data))
+                return None, None
+                
+            if 'event_entry' not in data:
+                roster_log.error("Missing 'event_entry' in response: %s", data)
+                return None, None
+                
+            if not isinstance(data['event_entry'], list):
+                roster_log.error("Invalid 'event_entry' format: expected list, got %s", type(data['event_entry']))
+                return None, None
+                
+            if len(data['event_entry']) > 0:
+                roster_log.debug("Successfully fetched %d entries from page %s", len(data['event_entry']), page)
+            else:
+                roster_log.info("Response contained no entries for page %s", page)
+                
+            return data, response.headers
             
-        if not isinstance(data['event_entry'], list):
-            print(f"Invalid 'event_entry' format: expected list, got {type(data['event_entry'])}")
+        except requests.exceptions.RequestException as e:
+            roster_log.warning("Request error on page %s: %s", page, e)
+        except Exception as e:
+            roster_log.exception("Error fetching roster page %s: %s", page, e)
             return None, None
-            
-        if len(data['event_entry']) > 0:
-            print(f"Successfully fetched {len(data['event_entry'])} entries")
-            # Log first entry for debugging
-            print(f"First entry sample: {data['event_entry'][0]}")
-        else:
-            print(f"Response contained no entries. Response data: {data}")
-            
-        return data, response.headers
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Request error: {e}")
-        return None, None
-    except ValueError as e:
-        print(f"JSON parsing error: {e}")
-        print(f"Response content: {response.text[:500]}...")
-        return None, None
-    except Exception as e:
-        print(f"Error fetching roster page {page}: {e}")
-        return None, None
 
-def fetch_complete_roster(event_id, credentials):
-    """Fetch all pages of roster data"""
-    global roster_data, race_name, login_progress
-    roster_data = {}
+    roster_log.error("Giving up on roster page %s after %d attempts", page, retries + 1)
+    return None, None
 
-    # Reset progress tracking
-    login_progress = {
-        'total_entries': 0,
-        'loaded_entries': 0,
-        'complete': False
+def build_runner_record(entry):
+    """Convert an API entry into the roster record used for display"""
+    return {
+        'name': entry.get('entry_name', ''),  # Full name
+        'first_name': entry.get('athlete_first_name', ''),
+        'last_name': entry.get('athlete_last_name', ''),
+        'age': entry.get('entry_race_age', ''),
+        'gender': entry.get('athlete_sex', ''),
+        'city': entry.get('location_city', ''),
+        'state': entry.get('location_region', ''),
+        'country': entry.get('location_country', ''),
+        'division': entry.get('bracket_name', ''),  # Age group/division
+        'race_name': entry.get('race_name', ''),
+        'reg_choice': entry.get('reg_choice_name', ''),  # Race category
+        'wave': entry.get('wave_name', ''),
+        'team_name': entry.get('team_name', ''),
+        'entry_status': entry.get('entry_status', ''),
+        'entry_type': entry.get('entry_type', ''),
+        'entry_id': entry.get('entry_id', ''),
+        'athlete_id': entry.get('athlete_id', ''),
+        'tag': entry.get('entry_tag', '')  # Chip assigned at packet pickup
     }
 
-    # Fetch first page to get total pages
-    data, headers = fetch_roster_page(event_id, credentials, page=1)
-    if not data:
-        return False
-    
-    # Get pagination info from headers
-    total_pages = int(headers.get('X-Ctlive-Page-Count', 1))
-    total_rows = int(headers.get('X-Ctlive-Row-Count', 0))
-    login_progress['total_entries'] = total_rows
-    print(f"Total entries to fetch: {total_rows} across {total_pages} pages")
-    
-    # Process first page
-    for entry in data['event_entry']:
+def merge_roster_entries(entries):
+    """Add a page of API entries to roster_data"""
+    global race_name
+    for entry in entries:
         # Store all relevant runner information
         bib = entry.get('entry_bib')
         if not bib:  # If no bib, use entry_id as fallback
             bib = entry.get('entry_id')
             
         if bib:
-            roster_data[bib] = {
-                'name': entry.get('entry_name', ''),  # Full name
-                'first_name': entry.get('athlete_first_name', ''),
-                'last_name': entry.get('athlete_last_name', ''),
-                'age': entry.get('entry_race_age', ''),
-                'gender': entry.get('athlete_sex', ''),
-                'city': entry.get('location_city', ''),
-                'state': entry.get('location_region', ''),
-                'country': entry.get('location_country', ''),
-                'division': entry.get('bracket_name', ''),  # Age group/division
-                'race_name': entry.get('race_name', ''),
-                'reg_choice': entry.get('reg_choice_name', ''),  # Race category
-                'wave': entry.get('wave_name', ''),
-                'team_name': entry.get('team_name', ''),
-                'entry_status': entry.get('entry_status', ''),
-                'entry_type': entry.get('entry_type', ''),
-                'entry_id': entry.get('entry_id', ''),
-                'athlete_id': entry.get('athlete_id', '')
-            }
+            roster_data[bib] = build_runner_record(entry)
             # Store race name (we'll get it from the first entry)
             if race_name is None:
                 race_name = entry.get('race_name', '')
             login_progress['loaded_entries'] += 1
+
+def fetch_complete_roster(event_id, credentials, workers=None, page_size=None):
+    """Fetch all pages of roster data
+
+    Pages after the first are downloaded by a bounded pool of workers sharing
+    one keep-alive session and merged into roster_data as they complete.
+    """
+    global roster_data, race_name, login_progress
+    roster_data = RosterTable()
+    race_name = None
+    if workers is None:
+        workers = API_CONFIG.get('FETCH_WORKERS', 8)
+    if page_size is None:
+        page_size = API_CONFIG.get('PAGE_SIZE', 100)
+
+    # Reset progress tracking
+    login_progress = {
+        'total_entries': 0,
+        'loaded_entries': 0,
+        'complete': False
+    }
+
+    session = create_roster_session(workers)
+    try:
+        # Fetch first page to get total pages
+        data, headers = fetch_roster_page(event_id, credentials, page=1,
+                                          session=session, page_size=page_size)
+        if not data:
+            return False
+        
+        # Get pagination info from headers
+        total_pages = int(headers.get('X-Ctlive-Page-Count', 1))
+        total_rows = int(headers.get('X-Ctlive-Row-Count', 0))
+        login_progress['total_entries'] = total_rows
+        roster_log.info("Total entries to fetch: %d across %d pages", total_rows, total_pages)
+        
+        # Process first page
+        merge_roster_entries(data['event_entry'])
+        
+        # Fetch remaining pages
+        failed_pages = []
+        if workers <= 1:
+            for page in range(2, total_pages + 1):
+                roster_log.debug("Fetching page %d of %d", page, total_pages)
+                data, _ = fetch_roster_page(event_id, credentials, page,
+                                            session=session, page_size=page_size)
+                if data:
+                    merge_roster_entries(data['event_entry'])
+                else:
+                    failed_pages.append(page)
+        elif total_pages > 1:
+            roster_log.info("Fetching pages 2..%d with %d workers", total_pages, workers)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(fetch_roster_page, event_id, credentials, page,
+                                session=session, page_size=page_size): page
+                    for page in range(2, total_pages + 1)
+                }
+                # Merge on this thread so roster_data only has one writer
+                for future in as_completed(futures):
+                    data, _ = future.result()
+                    if data:
+                        merge_roster_entries(data['event_entry'])
+                    else:
+                        failed_pages.append(futures[future])
+
+        # One more pass once the burst is over; a roster with pages missing
+        # would be saved and only ever refreshed from, so it isn't accepted
+        for page in sorted(failed_pages):
+            roster_log.info("Fetching failed roster page %d again", page)
+            data, _ = fetch_roster_page(event_id, credentials, page,
+                                        session=session, page_size=page_size)
+            if data:
+                merge_roster_entries(data['event_entry'])
+                failed_pages.remove(page)
+    finally:
+        session.close()
     
-    # Fetch remaining pages
-    for page in range(2, total_pages + 1):
-        print(f"Fetching page {page} of {total_pages}")
-        data, _ = fetch_roster_page(event_id, credentials, page)
-        if data:
-            for entry in data['event_entry']:
-                bib = entry.get('entry_bib')
-                if not bib:  # If no bib, use entry_id as fallback
-                    bib = entry.get('entry_id')
-                    
-                if bib:
-                    roster_data[bib] = {
-                        'name': entry.get('entry_name', ''),
-                        'first_name': entry.get('athlete_first_name', ''),
-                        'last_name': entry.get('athlete_last_name', ''),
-                        'age': entry.get('entry_race_age', ''),
-                        'gender': entry.get('athlete_sex', ''),
-                        'city': entry.get('location_city', ''),
-                        'state': entry.get('location_region', ''),
-                        'country': entry.get('location_country', ''),
-                        'division': entry.get('bracket_name', ''),
-                        'race_name': entry.get('race_name', ''),
-                        'reg_choice': entry.get('reg_choice_name', ''),
-                        'wave': entry.get('wave_name', ''),
-                        'team_name': entry.get('team_name', ''),
-                        'entry_status': entry.get('entry_status', ''),
-                        'entry_type': entry.get('entry_type', ''),
-                        'entry_id': entry.get('entry_id', ''),
-                        'athlete_id': entry.get('athlete_id', '')
-                    }
-                    login_progress['loaded_entries'] += 1
-    
-    print(f"Total runners loaded: {len(roster_data)}")
+    if failed_pages:
+        roster_log.error("Failed to fetch roster pages %s; the roster is incomplete", sorted(failed_pages))
+        login_progress['failed_pages'] = sorted(failed_pages)
+        return False
+    roster_log.info("Total runners loaded: %d", len(roster_data))
     if len(roster_data) != total_rows:
-        print(f"Warning: Expected {total_rows} entries but loaded {len(roster_data)}")
+        roster_log.warning("Expected %d entries but loaded %d", total_rows, len(roster_data))
 
     login_progress['complete'] = True
 
     return True
 
+def load_roster_snapshot(event_id):
+    """Load the saved roster for an event into roster_data if one exists"""
+    global roster_data, race_name, roster_synced_at, login_progress
+    started = time.time()
+    snapshot = roster_store.load_roster(event_id)
+    if snapshot is None:
+        return False
+
+    records, race_name, roster_synced_at = snapshot
+    roster_data = RosterTable.from_records(records)
+    login_progress = {
+        'total_entries': len(roster_data),
+        'loaded_entries': len(roster_data),
+        'complete': True
+    }
+    roster_log.info("Loaded %d runners for event %s from snapshot in %.3fs",
+                   len(roster_data), event_id, time.time() - started)
+    return True
+
+def save_roster_snapshot(event_id, synced_at):
+    """Persist the freshly downloaded roster for fast restarts"""
+    global roster_synced_at
+    roster_synced_at = synced_at
+    try:
+        roster_store.save_roster(event_id, roster_data, race_name, synced_at)
+    except Exception as e:
+        roster_log.error("Failed to save roster snapshot: %s", e)
+
+def fetch_roster_changes(event_id, credentials, since):
+    """Fetch the entries modified since the given epoch time"""
+    changed = {}
+    session = create_roster_session()
+    try:
+        page = 1
+        while True:
+            data, headers = fetch_roster_page(
+                event_id, credentials, page, session=session,
+                extra_params={'modified_after': int(since)}
+            )
+            if not data:
+                return None
+            for entry in data['event_entry']:
+                bib = entry.get('entry_bib') or entry.get('entry_id')
+                if bib:
+                    changed[bib] = build_runner_record(entry)
+            if page >= int(headers.get('X-Ctlive-Page-Count', 1)):
+                return changed
+            page += 1
+    finally:
+        session.close()
+
+def apply_roster_changes(changed):
+    """Swap in a roster with changed entries applied, returning bibs that moved away"""
+    global roster_data
+    changed_entries = {record['entry_id']: bib for bib, record in changed.items() if record['entry_id']}
+    updated = roster_data.copy()
+    removed = []
+    # An entry that now appears under a different bib was a bib swap
+    for entry_id, new_bib in changed_entries.items():
+        bib = roster_data.bib_for_entry(entry_id)
+        if bib is not None and bib != new_bib:
+            del updated[bib]
+            removed.append(bib)
+    updated.update(changed)
+    # Readers see either the old or the new table, never a partial update
+    roster_data = updated
+    return removed
+
+def refresh_roster(event_id, credentials):
+    """Pull changed entries since the last sync and apply them to the live roster"""
+    global roster_synced_at
+    started = time.time()
+    since = (roster_synced_at or 0) - API_CONFIG.get('REFRESH_OVERLAP', 60)
+    changed = fetch_roster_changes(event_id, credentials, since)
+    if changed is None:
+        roster_log.warning("Roster refresh for event %s failed; will retry", event_id)
+        return False
+    if event_id != current_event_id:
+        return False
+
+    fetched = len(changed)
+    if fetched and fetched >= len(roster_data) and event_id not in full_refresh_warned:
+        full_refresh_warned.add(event_id)
+        roster_log.warning("Roster API returned all %d entries for a modified_after query; "
+                           "refreshes are downloading the whole roster", fetched)
+    # Only entries that differ from the live roster are applied, so an API that
+    # ignores modified_after costs a download but no rebuild or republish
+    changed = {bib: record for bib, record in changed.items() if roster_data.get(bib) != record}
+    removed = apply_roster_changes(changed) if changed else []
+    roster_synced_at = started
+    try:
+        roster_store.apply_changes(event_id, changed, removed, synced_at=started)
+    except Exception as e:
+        roster_log.error("Failed to update roster snapshot: %s", e)
+    if changed:
+        roster_log.info("Roster refresh applied %d changed entries, %d bib swaps", len(changed), len(removed))
+        publish_roster()
+    return True
+
+def start_roster_refresher(event_id, credentials, immediate=False):
+    """Run refresh_roster periodically in the background for the current event"""
+    global refresh_stop
+    refresh_stop.set()
+    stop = refresh_stop = threading.Event()
+    interval = API_CONFIG.get('REFRESH_INTERVAL', 60)
+
+    def run():
+        if immediate:
+            refresh_roster(event_id, credentials)
+        while not stop.wait(interval):
+            refresh_roster(event_id, credentials)
+
+    threading.Thread(target=run, daemon=True, name='roster-refresh').start()
+
+def restore_last_roster():
+    """Reload the last event's roster on startup so displays work immediately"""
+    global current_event_id
+    event_id = roster_store.last_event_id()
+    if event_id and load_roster_snapshot(event_id):
+        current_event_id = event_id
+        publish_roster()
+        open_journal(event_id)
+        start_listeners()
+        # Login credentials aren't stored, so refreshing needs the default
+        # account; otherwise it starts with the next login
+        if API_CONFIG.get('DEFAULT_USER_ID') and API_CONFIG.get('DEFAULT_PASSWORD'):
+            start_roster_refresher(event_id, {}, immediate=True)
+        else:
+            roster_log.info("Restored event %s; roster refresh starts at the next login "
+                            "(no DEFAULT_USER_ID/DEFAULT_PASSWORD in API_CONFIG)", event_id)
+        return True
+    return False
+
 def generate_auth_seed():
     """Generate a random authentication seed"""
     return secrets.token_hex(16)
@@ -245,36 +761,195 @@ def calculate_hmac(seed, password, method='sha1'):
         return hmac.new(password.encode(), seed.encode(), hashlib.md5).hexdigest()
     return None
 
+# Settings requested from every timing box during the handshake
+TIMING_SETTINGS = (
+    "location=multi",
+    "guntimes=true",
+    "newlocations=true",
+    "authentication=none",
+    "stream-mode=push",
+    "time-format=iso"
+)
+
+def connection_source(address, greeting):
+    """Identify a timing box across reconnects by host and client name"""
+    client_name = greeting.split(PROTOCOL_CONFIG['FIELD_SEPARATOR'])[0] if greeting else ''
+    return f"{address[0]}/{client_name}"
+
+# Serializes the stateful part of handle_timing_line across threads
+ingest_lock = Lock()
+
+def handle_timing_line(line, source=None):
+    """Run one line from a timing connection through the display pipeline"""
+    started = time.perf_counter()
+    ingest_lines.labels(source).inc()
+    last_line_at[source] = time.monotonic()
+    if line.startswith(TAG_OBSERVATION_PREFIX):
+        # Raw observations are reduced first; only the crossing comes back here
+        if not tag_reducer.observe_line(line):
+            parse_failures.inc()
+        return
+    # Crossings from the tag reducer's thread and threaded-mode connections
+    # share the dedupe, sequence and results state with the ingest loop
+    with ingest_lock:
+        outcome = ERROR
+        bib = None
+        try:
+            data = parse_timing_line(line)
+            if data is None:
+                parse_failures.inc()
+                outcome = INVALID
+                return
+            if data['bib'] == 'guntime':
+                results.record_gun(data['time'])
+                outcome = GUN
+                return
+            sequence = sequences.observe(source, data['location'], data['sequence'], read_fingerprint(data))
+            if sequence == SEQUENCE_DUPLICATE:
+                outcome = DUPLICATE
+                return
+            resolved = roster_data.resolve(data['bib'], data['tagcode'])
+            bib = resolved[0]
+            if not read_dedupe.accept(bib or data['bib'], data['location']):
+                outcome = DUPLICATE
+                return
+            processed_data = build_display_data(data, resolved)
+            if processed_data:
+                outcome = ACCEPTED
+                if sequence == SEQUENCE_FILLED:
+                    # Late or resent read; screens may choose not to feature it
+                    processed_data['backfilled'] = True
+                publish_display(processed_data)
+                if bib in VIP_BIBS:
+                    alert_bus.post('vip', bib, f"VIP {processed_data['name']} ({bib}) at {data['location']}",
+                                   bib=bib, location=data['location'])
+            else:
+                outcome = UNKNOWN_BIB
+        except Exception as e:
+            ingest_errors.inc()
+            ingest_log.error("Error processing timing data: %s; line: %r", e, line)
+        finally:
+            journal = read_journal
+            if journal is not None:
+                journal.append(time.time(), source, line, outcome, bib)
+            line_seconds.observe(time.perf_counter() - started)
+
+def handle_tag_crossing(tag, location, at, rssi, reads):
+    """Feed a crossing resolved from tag observations through the read pipeline
+
+    It is written as a CT01_33 line so the journal and its replay treat it
+    like any other read; the tag index maps the chip to its bib.
+    """
+    bib, _ = roster_data.resolve(tag, tag)
+    clock = datetime.fromtimestamp(at).strftime('%H:%M:%S.%f')[:11]
+    line = PROTOCOL_CONFIG['FIELD_SEPARATOR'].join(
+        (PROTOCOL_CONFIG['FORMAT_ID'], '', location, bib or tag, clock, '0', tag, '1'))
+    ingest_log.debug("Tag %s crossed %s at %s (peak %.1f dB over %d reads)", tag, location, clock, rssi, reads)
+    handle_timing_line(line, TAG_CROSSING_SOURCE)
+
+REPLAY_BATCH = 1000
+
+def replay_journal(journal):
+    """Rebuild dedupe, sequence and results state from the journal after a restart
+
+    The ingest lock is taken a batch at a time so live reads keep flowing.
+    Replayed reads don't ask boxes to resend, raise alerts or send
+    leaderboard deltas; screens are told to reload the boards at the end.
+    """
+    started = time.time()
+    mono_offset = time.monotonic() - started
+    replayed = 0
+    records = iter(journal.replay())
+    with results.quiet():
+        while True:
+            batch = list(itertools.islice(records, REPLAY_BATCH))
+            if not batch:
+                break
+            with ingest_lock:
+                for arrival, source, line, outcome, bib in batch:
+                    replayed += replay_read(arrival + mono_offset, source, line, outcome, bib)
+    ingest_log.info("Replayed %d journaled reads in %.2fs", replayed, time.time() - started)
+    return replayed
+
+def replay_read(at, source, line, outcome, bib):
+    """Apply one journaled read to the ingest state; `at` is on the monotonic clock"""
+    data = parse_timing_line(line)
+    if data is None:
+        return 0
+    if outcome == GUN:
+        results.record_gun(data['time'])
+    elif outcome in (ACCEPTED, DUPLICATE, UNKNOWN_BIB):
+        sequences.observe(source, data['location'], data['sequence'], read_fingerprint(data), replaying=True)
+        read_dedupe.seed(bib or data['bib'], data['location'], now=at, accepted=outcome != DUPLICATE)
+        if outcome == ACCEPTED:
+            resolved_bib, runner = roster_data.resolve(bib or data['bib'], data['tagcode'])
+            if runner is not None:
+                results.record(resolved_bib, runner, data['location'], data['time'], data['lap'])
+    return 1
+
+def open_journal(event_id):
+    """Start journaling reads for an event, first replaying what it already has"""
+    global read_journal
+    root = SERVER_CONFIG.get('JOURNAL_DIR', os.path.join(app.root_path, 'journal'))
+    if not root:
+        return None
+    directory = os.path.join(root, ''.join(c for c in str(event_id) if c.isalnum() or c in '_-'))
+    with journal_lock:
+        if read_journal is not None:
+            if read_journal.directory == directory:
+                return read_journal
+            read_journal.close()
+            read_journal = None
+        journal = ReadJournal(
+            directory,
+            segment_bytes=SERVER_CONFIG.get('JOURNAL_SEGMENT_BYTES', 64 * 2**20),
+            rotate_seconds=SERVER_CONFIG.get('JOURNAL_ROTATE_SECONDS', 3600),
+            fsync=SERVER_CONFIG.get('JOURNAL_FSYNC', True)
+        )
+        replay_journal(journal)
+        read_journal = journal.start()
+        return read_journal
+
+def close_journal():
+    global read_journal
+    with journal_lock:
+        if read_journal is not None:
+            read_journal.close()
+            read_journal = None
+
+atexit.register(close_journal)
+
 class TimingHandler(socketserver.StreamRequestHandler):
     def write_command(self, *fields):
         """Write a command to the socket with proper formatting"""
         command = PROTOCOL_CONFIG['FIELD_SEPARATOR'].join(map(str, fields))
-        print(">>", command)
+        protocol_log.debug(">> %s", command)
         self.wfile.write((command + PROTOCOL_CONFIG['LINE_TERMINATOR']).encode())
 
     def read_command(self):
         """Read a command from the socket"""
         command = self.rfile.readline().strip().decode()
         if command:
-            print("<<", command)
+            protocol_log.debug("<< %s", command)
         return command
 
     def handle(self):
-        print("-- Client connected --")
+        ingest_log.info("-- Client connected: %s --", self.client_address)
 
         # Consume the greeting
         greeting = self.read_command()
+        source = connection_source(self.client_address, greeting)
+        try:
+            self.serve_timing(source)
+        finally:
+            timing_disconnected(source, self.write_command)
+        ingest_log.info("-- Client disconnected: %s --", self.client_address)
+
+    def serve_timing(self, source):
 
         # Send our response with settings
-        settings = (
-            "location=multi",
-            "guntimes=true", 
-            "newlocations=true",
-            "authentication=none",
-            "stream-mode=push",
-            "time-format=iso"
-        )
-        
+        settings = TIMING_SETTINGS
+
         # Send initial greeting with settings count
         self.write_command("RaceDisplay", "Version 1.0 Level 2024.02", len(settings))
         
@@ -286,8 +961,9 @@ class TimingHandler(socketserver.StreamRequestHandler):
         self.write_command("geteventinfo")
         self.write_command("getlocations")
         
-        # Start the data feed
+        # Start the data feed, then ask for anything missed while disconnected
         self.write_command("start")
+        timing_connected(source, self.write_command)
 
         # Process incoming data
         while True:
@@ -316,26 +992,44 @@ class TimingHandler(socketserver.StreamRequestHandler):
                     elif ack_type == 'start':
                         # Accept start acknowledgment
                         continue
+                    elif ack_type == BACKFILL_COMMAND:
+                        # The resent reads follow as ordinary lines
+                        continue
 
             # Process timing data
-            processed_data = process_timing_data(line)
-            if processed_data:
-                data_queue.put(processed_data)
-
-        print("-- Client disconnected --")
+            handle_timing_line(line, source)
 
 def monitor_data_feed():
-    """Start the TCP server"""
-    print(f"Starting TCP server on {PROTOCOL_CONFIG['HOST']}:{PROTOCOL_CONFIG['PORT']}")
+    """Start the TCP server
+
+    PROTOCOL_CONFIG['SERVER_MODE'] selects the asyncio server (default) or the
+    thread-per-connection 'threaded' server.
+    """
+    mode = PROTOCOL_CONFIG.get('SERVER_MODE', 'asyncio')
+    ingest_log.info("Starting %s TCP server on %s:%s", mode, PROTOCOL_CONFIG['HOST'], PROTOCOL_CONFIG['PORT'])
     try:
-        server = socketserver.ThreadingTCPServer(
-            (PROTOCOL_CONFIG['HOST'], PROTOCOL_CONFIG['PORT']), 
-            TimingHandler
-        )
-        print(f"Server listening on port {PROTOCOL_CONFIG['PORT']}")
+        if mode == 'threaded':
+            server = socketserver.ThreadingTCPServer(
+                (PROTOCOL_CONFIG['HOST'], PROTOCOL_CONFIG['PORT']), 
+                TimingHandler
+            )
+            ingest_log.info("Server listening on port %s", PROTOCOL_CONFIG['PORT'])
+        else:
+            server = AsyncTimingServer(
+                PROTOCOL_CONFIG['HOST'],
+                PROTOCOL_CONFIG['PORT'],
+                TIMING_SETTINGS,
+                handle_timing_line,
+                separator=PROTOCOL_CONFIG['FIELD_SEPARATOR'],
+                terminator=PROTOCOL_CONFIG['LINE_TERMINATOR'],
+                source_for=connection_source,
+                on_connect=timing_connected,
+                on_disconnect=timing_disconnected,
+                acks=(BACKFILL_COMMAND,) if BACKFILL_COMMAND else ()
+            )
         server.serve_forever()
     except Exception as e:
-        print(f"Error in TCP server: {e}")
+        ingest_log.error("Error in TCP server: %s", e)
         raise
 
 def start_listeners():
@@ -344,7 +1038,7 @@ def start_listeners():
     
     with listener_lock:
         if listeners_started:
-            print("Listener already running")
+            ingest_log.info("Listener already running")
             return True
             
         try:
@@ -352,75 +1046,258 @@ def start_listeners():
             tcp_thread = threading.Thread(target=monitor_data_feed)
             tcp_thread.daemon = False  # Make it a non-daemon thread
             tcp_thread.start()
-            print("TCP server thread started")
+            ingest_log.info("TCP server thread started")
             
             listeners_started = True
             return True
             
         except Exception as e:
-            print(f"Failed to start listener: {e}")
+            ingest_log.error("Failed to start listener: %s", e)
             return False
 
+def parse_timing_line(line):
+    """Split a CT01_33 line into its fields, returning None for anything else:
+    format_id~sequence~location~bib~time~gator~tagcode~lap
+    Example: CT01_33~1~start~9478~14:02:15.31~0~0F2A38~1
+    """
+    parts = line.split(PROTOCOL_CONFIG['FIELD_SEPARATOR'])
+    if len(parts) < 8 or parts[0] != PROTOCOL_CONFIG['FORMAT_ID']:
+        return None
+    return {
+        'format': parts[0],
+        'sequence': parts[1],
+        'location': parts[2],
+        'bib': parts[3],
+        'time': parts[4],
+        'gator': parts[5],
+        # Matched against the roster's chips as is, so normalized here once
+        'tagcode': normalize_tag(parts[6]),
+        'lap': parts[7]
+    }
+
+def build_display_data(data, resolved=None):
+    """Join a parsed read with the roster, returning the display payload
+
+    resolved is the (bib, runner) pair from roster_data.resolve() when the
+    caller has already looked the read up.
+    """
+    bib, runner = resolved or roster_data.resolve(data['bib'], data.get('tagcode'))
+    if runner is None:
+        unknown_bibs.inc()
+        unknown_bib_log.warning("Bib %s not found in roster (%d runners loaded)", data['bib'], len(roster_data))
+        alert_bus.post('unknown_bib', data['bib'], f"Unknown bib {data['bib']} at {data['location']}",
+                       bib=data['bib'], location=data['location'])
+        return None
+
+    # Runner fields come straight from the roster columns
+    processed_data = runner.payload()
+    processed_data.update(results.record(bib, runner, data['location'], data['time'], data['lap']))
+    processed_data.update(
+        message=random.choice(RANDOM_MESSAGES),
+        timestamp=data['time'],
+        location=data['location'],
+        lap=data['lap'],
+        bib=bib
+    )
+    ingest_log.debug("Runner found: %s", processed_data)
+    return processed_data
+
 def process_timing_data(line):
     """Process timing data in CT01_33 format:
     format_id~sequence~location~bib~time~gator~tagcode~lap
     Example: CT01_33~1~start~9478~14:02:15.31~0~0F2A38~1
     """
-    print(f"Processing line: {line}")
     try:
-        parts = line.split(PROTOCOL_CONFIG['FIELD_SEPARATOR'])
-        print(f"Split parts: {parts}")
-        
-        if len(parts) >= 8 and parts[0] == PROTOCOL_CONFIG['FORMAT_ID']:
-            data = {
-                'format': parts[0],
-                'sequence': parts[1],
-                'location': parts[2],
-                'bib': parts[3],
-                'time': parts[4],
-                'gator': parts[5],
-                'tagcode': parts[6],
-                'lap': parts[7]
-            }
-            print(f"Parsed data: {data}")
-            
-            if data['bib'] == 'guntime':
-                print("Skipping guntime event")
-                return None
-                
-            if data['bib'] in roster_data:
-                print(f"Found bib {data['bib']} in roster")
-                runner_data = roster_data[data['bib']]
-                processed_data = {
-                    'name': runner_data['name'],  # Use full name from entry_name
-                    'first_name': runner_data['first_name'],
-                    'last_name': runner_data['last_name'],
-                    'age': runner_data['age'],
-                    'gender': runner_data['gender'],
-                    'city': runner_data['city'],
-                    'state': runner_data['state'],
-                    'country': runner_data['country'],
-                    'division': runner_data['division'],
-                    'race_name': runner_data['race_name'],
-                    'reg_choice': runner_data['reg_choice'],
-                    'wave': runner_data['wave'],
-                    'team_name': runner_data['team_name'],
-                    'message': random.choice(RANDOM_MESSAGES),
-                    'timestamp': data['time'],
-                    'location': data['location'],
-                    'lap': data['lap'],
-                    'bib': data['bib']
-                }
-                print(f"Runner found: {processed_data}")
-                return processed_data
-            else:
-                print(f"Bib {data['bib']} not found in roster. Available bibs: {list(roster_data.keys())[:5]}...")
-                
+        data = parse_timing_line(line)
+        if data is None:
+            return None
+        ingest_log.debug("Parsed data: %s", data)
+
+        if data['bib'] == 'guntime':
+            ingest_log.debug("Skipping guntime event")
+            return None
+
+        return build_display_data(data)
+
     except Exception as e:
-        print(f"Error processing timing data: {e}")
-        print(f"Line causing error: {line}")
+        ingest_log.error("Error processing timing data: %s; line: %r", e, line)
     return None
 
+def register_gauges():
+    """Gauges computed from live state when /metrics is scraped"""
+    metrics.gauge_callback(
+        'race_display_reads_dropped_total', 'Reads dropped before display',
+        lambda: [(('duplicate_window',), read_dedupe.stats['duplicate_window']),
+                 (('replayed_sequence',), sequences.stats[SEQUENCE_DUPLICATE])]
+        + ([(('pacing_skipped',), display_scheduler.stats['skipped'])] if display_scheduler else []),
+        labelnames=['reason'], kind='counter')
+    metrics.gauge_callback(
+        'race_display_display_backlog', 'Reads waiting in the display pacing queue',
+        lambda: display_scheduler.backlog() if display_scheduler else 0)
+    metrics.gauge_callback(
+        'race_display_ingest_last_line_age_seconds', 'Seconds since each timing connection last sent a line',
+        lambda: [((source,), round(time.monotonic() - at, 3)) for source, at in list(last_line_at.items())],
+        labelnames=['source'])
+    metrics.gauge_callback(
+        'race_display_sse_subscribers', 'Connected /stream clients', lambda: len(data_hub) + len(leaderboard_hub))
+    metrics.gauge_callback(
+        'race_display_sse_pending', 'Events buffered for each /stream client',
+        lambda: [((sub.name,), sub.pending()) for sub in data_hub.subscribers() + leaderboard_hub.subscribers()],
+        labelnames=['subscriber'])
+    metrics.gauge_callback(
+        'race_display_sse_delivered_total', 'Events delivered to each /stream client',
+        lambda: [((sub.name,), sub.delivered) for sub in data_hub.subscribers() + leaderboard_hub.subscribers()],
+        labelnames=['subscriber'], kind='counter')
+    metrics.gauge_callback(
+        'race_display_sse_dropped_total', 'Events dropped because a /stream client fell behind',
+        lambda: [((sub.name,), sub.dropped) for sub in data_hub.subscribers() + leaderboard_hub.subscribers()],
+        labelnames=['subscriber'], kind='counter')
+    metrics.gauge_callback(
+        'race_display_sse_replayed_total', 'Events resent to /stream clients resuming with Last-Event-ID',
+        lambda: data_hub.replayed, kind='counter')
+    metrics.gauge_callback(
+        'race_display_sse_filtered_total', 'Events not queued for a client because its filter excluded them',
+        lambda: data_hub.filtered_out, kind='counter')
+    metrics.gauge_callback(
+        'race_display_results_runners', 'Runners with at least one read in the results engine',
+        lambda: len(results))
+    metrics.gauge_callback(
+        'race_display_tag_observations_total', 'Raw TO~ tag observations and the crossings resolved from them',
+        lambda: [((kind,), tag_reducer.stats[kind]) for kind in ('observations', 'crossings', 'invalid')],
+        labelnames=['kind'], kind='counter')
+    metrics.gauge_callback(
+        'race_display_alerts_total', 'Operator alerts by what happened to them',
+        lambda: [((outcome,), count) for outcome, count in alert_bus.stats.items()],
+        labelnames=['outcome'], kind='counter')
+    metrics.gauge_callback(
+        'race_display_journal_pending', 'Reads queued for the journal writer',
+        lambda: read_journal.pending() if read_journal else 0)
+    metrics.gauge_callback(
+        'race_display_journal_written_total', 'Reads written to the journal since it was opened',
+        lambda: read_journal.stats['written'] if read_journal else 0, kind='counter')
+    metrics.gauge_callback(
+        'race_display_sequence_reads_total', 'Reads by how their sequence number compared to the last one',
+        lambda: [((status,), sequences.stats[status]) for status in ('in_order', 'gap', 'filled', 'reset')],
+        labelnames=['status'], kind='counter')
+    metrics.gauge_callback(
+        'race_display_sequence_missing', 'Reads known to be missing from timing connections',
+        lambda: sequences.stats['missing'])
+    metrics.gauge_callback(
+        'race_display_roster_entries', 'Runners in the live roster', lambda: len(roster_data))
+    metrics.gauge_callback(
+        'race_display_roster_age_seconds', 'Seconds since the roster was last synced with the API',
+        lambda: round(time.time() - roster_synced_at, 1) if roster_synced_at else -1)
+
+register_gauges()
+alert_bus.start()
+
+if PROCESS_ROLE == 'web':
+    @app.before_request
+    def forward_to_ingest():
+        """Hand control requests to the ingest process and relay its answer"""
+        if request.path not in INGEST_ROUTES:
+            return None
+        host, port = INGEST_CONTROL
+        try:
+            upstream = requests.request(
+                request.method, f'http://{host}:{port}{request.path}',
+                params=request.args, data=request.get_data(),
+                headers={'Content-Type': request.content_type} if request.content_type else None,
+                # Logging in can download a whole roster
+                timeout=SERVER_CONFIG.get('INGEST_CONTROL_TIMEOUT', 300)
+            )
+        except requests.RequestException as e:
+            return jsonify({'error': f'Ingest process unavailable: {e}'}), 502
+        return Response(upstream.content, upstream.status_code,
+                        content_type=upstream.headers.get('Content-Type'))
+
+@app.route('/metrics')
+def get_metrics():
+    """Expose ingest, stream and roster metrics in the Prometheus text format"""
+    return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/ingest-stats')
+def get_ingest_stats():
+    """Return counters for reads dropped before reaching the displays"""
+    stats = {'dedupe': dict(read_dedupe.stats), 'dedupe_keys': len(read_dedupe)}
+    stats['sequences'] = dict(sequences.stats)
+    stats['missing'] = [
+        {'source': source, 'location': location, 'ranges': gaps}
+        for (source, location), gaps in sequences.gaps().items()
+    ]
+    if display_scheduler:
+        stats['pacing'] = dict(display_scheduler.stats, backlog=display_scheduler.backlog())
+    return jsonify(stats)
+
+@app.route('/api/results')
+def get_results():
+    """Query live results
+
+    ?bib=123 returns one runner's splits with current places. Otherwise
+    ?race=<race_name>&location=finish&category=overall|gender:F|division:M40-44
+    &offset=0&limit=25 returns a page of standings; with no race the races and
+    locations that have results are listed.
+    """
+    bib = request.args.get('bib')
+    if bib:
+        resolved, _ = roster_data.resolve(bib)
+        result = results.result(resolved or bib)
+        if result is None:
+            return jsonify({'error': 'No results for bib'}), 404
+        return jsonify(result)
+    race = request.args.get('race')
+    if race is None:
+        return jsonify({'races': results.races(), 'runners': len(results)})
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(1000, max(1, int(request.args.get('limit', 25))))
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    return jsonify(results.standings(
+        race,
+        request.args.get('location', FINISH_LOCATIONS[0]),
+        request.args.get('category', 'overall'),
+        offset,
+        limit
+    ))
+
+@app.route('/api/journal')
+def get_journal():
+    """Journaled reads in a time range: ?start=<epoch>&end=<epoch>&limit=1000"""
+    journal = read_journal
+    if journal is None:
+        return jsonify({'error': 'No journal open'}), 404
+    try:
+        start = float(request.args['start']) if 'start' in request.args else None
+        end = float(request.args['end']) if 'end' in request.args else None
+        limit = min(10000, max(1, int(request.args.get('limit', 1000))))
+    except ValueError:
+        return jsonify({'error': 'start, end and limit must be numbers'}), 400
+    keys = ('arrival', 'source', 'line', 'outcome', 'bib')
+    reads = [dict(zip(keys, record)) for record in itertools.islice(journal.scan(start, end), limit)]
+    return jsonify({'reads': reads, 'count': len(reads)})
+
+@app.route('/api/leaderboard')
+def get_leaderboard():
+    """Top of one board: ?race=10K&category=division:M40-44&location=finish&limit=10
+
+    The response's version matches the deltas on /stream/leaderboard, so a
+    screen can load this and then apply only deltas with a higher version.
+    """
+    race = request.args.get('race')
+    if race is None:
+        return jsonify({'error': 'race is required', 'races': results.races()}), 400
+    try:
+        limit = min(1000, max(1, int(request.args.get('limit', results.board_size))))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify(results.leaderboard(
+        race,
+        request.args.get('location', FINISH_LOCATIONS[0]),
+        request.args.get('category', 'overall'),
+        limit
+    ))
+
 @app.route('/old')
 def old_index():
     default_credentials = {
@@ -470,8 +1347,7 @@ def test_connection():
             'size': 1  # Just request 1 entry to minimize data transfer
         }
         
-        print(f"Testing connection to: {url}")
-        print(f"With parameters: {params}")
+        logger.info("Testing connection to: %s", url)
         
         response = requests.get(url, params=params, timeout=10)
         
@@ -525,6 +1401,14 @@ def login():
         }
         
         global current_event_id
+        if current_event_id != credentials['event_id']:
+            # Results, sequence numbers, recent reads and who has finished
+            # belong to one event
+            results.reset()
+            sequences.reset()
+            read_dedupe.reset()
+            if display_scheduler is not None:
+                display_scheduler.reset()
         current_event_id = credentials['event_id']
         
         response = {
@@ -534,10 +1418,25 @@ def login():
             "total_stages": 4
         }
         
-        # Fetch roster data
-        if fetch_complete_roster(current_event_id, credentials):
+        # Use the saved snapshot if we have one and catch up in the background,
+        # otherwise download the whole roster. full_sync=1 always downloads it.
+        full_sync = request.form.get('full_sync', '').lower() in ('1', 'true', 'on')
+        from_snapshot = not full_sync and load_roster_snapshot(current_event_id)
+        if from_snapshot:
+            roster_loaded = True
+        else:
+            started = time.time()
+            roster_loaded = fetch_complete_roster(current_event_id, credentials)
+            if roster_loaded:
+                save_roster_snapshot(current_event_id, started)
+
+        if roster_loaded:
+            publish_roster()
+            open_journal(current_event_id)
+            start_roster_refresher(current_event_id, credentials, immediate=from_snapshot)
             response.update({
                 "status": "Roster loaded successfully",
+                "from_snapshot": from_snapshot,
                 "stage": 2,
                 "race_name": race_name,
                 "runners_loaded": len(roster_data),
@@ -573,17 +1472,69 @@ def get_login_progress():
     """Return current roster loading progress"""
     return jsonify(login_progress)
 
+def stream_fields(args):
+    """Work out which payload fields a stream client wants
+
+    ?fields=name,city,bib lists them directly; ?template=<name> uses the
+    fields of a saved template. Without either the full payload is sent.
+    """
+    if args.get('fields'):
+        return projection_key(f.strip() for f in args['fields'].split(',') if f.strip())
+    if args.get('template'):
+        safe = ''.join(c for c in args['template'] if c.isalnum() or c in ('_', '-')).rstrip()
+        template = template_cache.get(safe)
+        if template is not None:
+            fields = set(template.fields)
+            if 'runner_names' in fields:
+                # Batch frames build runner_names from each runner's name
+                fields.add('name')
+            return projection_key(fields)
+    return None
+
 @app.route('/stream')
 def stream():
+    return event_stream(data_hub)
+
+@app.route('/stream/alerts')
+def stream_alerts():
+    """Operator alerts; each carries a `sound` URL for the browser to play"""
+    return event_stream(alerts_hub)
+
+@app.route('/alerts/beep.mp3')
+def alert_sound():
+    return send_from_directory(app.root_path, 'beep.mp3')
+
+@app.route('/stream/leaderboard')
+def stream_leaderboard():
+    """Leaderboard deltas, e.g. ?race_name=10K&category=division:M40-44"""
+    return event_stream(leaderboard_hub)
+
+def event_stream(hub):
+    """SSE response for a hub, honouring projection, filters and Last-Event-ID"""
+    client = f"{request.remote_addr}#{next(stream_ids)}"
+    fields = stream_fields(request.args)
+    try:
+        stream_filter = filter_from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    # Browsers send the last id they saw when EventSource reconnects
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+
     def generate():
-        while True:
-            try:
-                # Try to get data from the queue, timeout after 1 second
-                data = data_queue.get(timeout=1)
-                yield f"data: {json.dumps(data)}\n\n"
-            except queue.Empty:
-                # Send keepalive message if no data
-                yield f"data: {json.dumps({'keepalive': True})}\n\n"
+        subscriber = hub.subscribe(client, last_event_id, stream_filter)
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    # Wait for the next read, timeout after 1 second
+                    event = subscriber.get(timeout=1)
+                    yield f"id: {event.id}\ndata: {event.encode(fields)}\n\n"
+                except queue.Empty:
+                    # Comment lines keep the connection open without an event
+                    yield ": keepalive\n\n"
+        finally:
+            # Client went away; stop buffering reads for it
+            hub.unsubscribe(subscriber)
     
     response = Response(generate(), mimetype='text/event-stream')
     response.headers['Cache-Control'] = 'no-cache'
@@ -591,6 +1542,28 @@ def stream():
     response.headers['Access-Control-Allow-Origin'] = '*'
     return response
 
+if Sock is not None:
+    app.config.setdefault('SOCK_SERVER_OPTIONS', {'ping_interval': 25})
+    sock = Sock(app)
+
+    @sock.route('/ws')
+    def ws_stream(ws):
+        """Batched alternative to /stream; see ws_stream.WebSocketSession"""
+        try:
+            stream_filter = filter_from_args(request.args)
+        except ValueError as e:
+            ws.close(reason=1008, message=f'Invalid filter: {e}')
+            return
+        session = WebSocketSession(
+            ws, data_hub, f"{request.remote_addr}#ws{next(stream_ids)}",
+            fields=stream_fields(request.args),
+            last_event_id=request.args.get('last_event_id'),
+            encoding=request.args.get('encoding', 'json'),
+            window=SERVER_CONFIG.get('WS_BATCH_WINDOW', 0.075),
+            stream_filter=stream_filter
+        )
+        session.run()
+
 def is_valid_url(url):
     """Validate URL format and security"""
     try:
@@ -747,8 +1720,7 @@ def manage_templates():
         if not name or not html:
             return jsonify({'error': 'Missing name or html'}), 400
         safe = ''.join(c for c in name if c.isalnum() or c in ('_', '-')).rstrip()
-        with open(os.path.join(TEMPLATE_DIR, f'{safe}.html'), 'w', encoding='utf-8') as fp:
-            fp.write(html)
+        template_cache.save(safe, html)
         return jsonify({'success': True})
 
     templates = [f[:-5] for f in os.listdir(TEMPLATE_DIR) if f.endswith('.html')]
@@ -757,20 +1729,41 @@ def manage_templates():
 
 @app.route('/api/templates/<name>', methods=['GET'])
 def get_template(name):
-    """Retrieve a saved template"""
+    """Retrieve a saved template with its placeholder slots"""
     safe = ''.join(c for c in name if c.isalnum() or c in ('_', '-')).rstrip()
-    path = os.path.join(TEMPLATE_DIR, f'{safe}.html')
-    if not os.path.exists(path):
+    template = template_cache.get(safe)
+    if template is None:
         return jsonify({'error': 'Template not found'}), 404
-    with open(path, 'r', encoding='utf-8') as fp:
-        html = fp.read()
-    return jsonify({'html': html})
+    response = jsonify(template.to_json())
+    response.set_etag(template.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def start_process_role():
+    """Start what this process's role needs; returns the (host, port) to serve HTTP on"""
+    if PROCESS_ROLE == 'web':
+        start_bus_subscriber()
+        return SERVER_CONFIG['HOST'], SERVER_CONFIG['PORT']
+    if PROCESS_ROLE == 'ingest':
+        start_event_bus()
+    if SERVER_CONFIG.get('RESTORE_ON_START', True):
+        restore_last_roster()
+    if PROCESS_ROLE == 'ingest':
+        # Only answers the control routes the workers forward
+        return INGEST_CONTROL
+    return SERVER_CONFIG['HOST'], SERVER_CONFIG['PORT']
 
 if __name__ == '__main__':
-    app.run(
-        debug=SERVER_CONFIG['DEBUG'],
-        host=SERVER_CONFIG['HOST'],
-        port=SERVER_CONFIG['PORT'],
-        use_reloader=False,
-        threaded=True
-    )
+    host, port = start_process_role()
+    listen_fd = os.environ.get('RACE_DISPLAY_FD')
+    if listen_fd:
+        # serve.py binds the port once and every worker accepts on it
+        make_server(host, port, app, threaded=True, fd=int(listen_fd)).serve_forever()
+    else:
+        app.run(
+            debug=SERVER_CONFIG['DEBUG'],
+            host=host,
+            port=port,
+            use_reloader=False,
+            threaded=True
+        )
@@ -0,0 +1,276 @@
+"""End-to-end ingest-to-screen benchmark.
+
+Drives the real code paths: roster download from a local stub API, CT01_33
+parsing in process_timing_data, and TCP handshake -> broadcast -> /stream
+fan-out to K SSE clients. Results are printed and saved as JSON so runs can be
+compared across releases.
+
+Usage: python benchmarks/ingest_bench.py [--roster-sizes 10000,50000,100000]
+           [--clients 1,10] [--reads 5000] [--rate 1000] [--server asyncio|threaded]
+           [--output bench_results.json]
+
+Needs the same config.py as app.py.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import resource
+import socket
+import socketserver
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from werkzeug.serving import make_server
+
+import app
+import roster_stub
+from ingest_async import AsyncTimingServer
+
+
+def rss_mib():
+    """Current resident set size in MiB (Linux), falling back to the peak"""
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(latencies_ms):
+    if not latencies_ms:
+        return {'p50': None, 'p99': None, 'max': None, 'mean': None}
+    ordered = sorted(latencies_ms)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+    return {
+        'p50': round(pick(50), 4),
+        'p99': round(pick(99), 4),
+        'max': round(ordered[-1], 4),
+        'mean': round(statistics.fmean(ordered), 4)
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def timing_line(sequence, bib, location='finish'):
+    clock = time.strftime('%H:%M:%S') + f'.{sequence % 100:02d}'
+    return f"CT01_33~{sequence}~{location}~{bib}~{clock}~0~TAG{bib}~1"
+
+
+def load_roster(size):
+    """Download a synthetic roster through fetch_complete_roster and the stub API"""
+    stub = roster_stub.start_stub(entries=size)
+    app.API_CONFIG['BASE_URL'] = f"http://127.0.0.1:{stub.server_address[1]}/api"
+    started = time.perf_counter()
+    ok = app.fetch_complete_roster('bench', {'user_id': 'bench', 'user_pass': 'bench'})
+    elapsed = time.perf_counter() - started
+    stub.shutdown()
+    stub.server_close()
+    if not ok or len(app.roster_data) != size:
+        raise RuntimeError(f"Roster load failed: {len(app.roster_data)} of {size} entries")
+    return elapsed
+
+
+def bench_parse(size, reads):
+    """Time process_timing_data on a mix of known and unknown bibs"""
+    lines = [timing_line(i, (i * 7919) % size + 1 if i % 10 else size + i) for i in range(reads)]
+    latencies = []
+    started = time.perf_counter()
+    for line in lines:
+        t0 = time.perf_counter()
+        app.process_timing_data(line)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    return {'reads': reads, 'reads_per_s': round(reads / elapsed, 1), 'latency_ms': summarize(latencies)}
+
+
+class SSEClient(threading.Thread):
+    def __init__(self, port):
+        super().__init__(daemon=True)
+        self.port = port
+        self.received = {}
+        self.ready = threading.Event()
+        self.conn = None
+
+    def close(self):
+        if self.conn and self.conn.sock:
+            self.conn.sock.shutdown(socket.SHUT_RDWR)
+
+    def run(self):
+        conn = self.conn = http.client.HTTPConnection('127.0.0.1', self.port)
+        conn.request('GET', '/stream')
+        response = conn.getresponse()
+        self.ready.set()
+        while True:
+            try:
+                line = response.readline()
+            except (OSError, ValueError, http.client.HTTPException):
+                return
+            if not line:
+                return
+            if line.startswith(b'data:'):
+                now = time.perf_counter()
+                data = json.loads(line[5:])
+                for runner in data.get('runners', [data]):
+                    if 'bib' in runner:
+                        self.received.setdefault(runner['bib'], now)
+
+
+def start_timing_server(mode):
+    port = free_port()
+    if mode == 'threaded':
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', port), app.TimingHandler)
+        server.daemon_threads = True
+    else:
+        server = AsyncTimingServer(
+            '127.0.0.1', port, app.TIMING_SETTINGS, app.handle_timing_line,
+            separator=app.PROTOCOL_CONFIG['FIELD_SEPARATOR'],
+            terminator=app.PROTOCOL_CONFIG['LINE_TERMINATOR'],
+            source_for=app.connection_source
+        )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return port
+
+
+def connect_reader(port, name):
+    """Open a timing connection and complete the client side of the handshake"""
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    rfile = sock.makefile('rb')
+    sock.sendall(f"{name}~1.0~CTP01\r\n".encode())
+    settings = int(rfile.readline().decode().strip().split('~')[2])
+    for _ in range(settings):
+        rfile.readline()
+        sock.sendall(b"ack~init\r\n")
+    for _ in range(3):
+        rfile.readline()
+    return sock
+
+
+def bench_end_to_end(size, clients, reads, rate, timing_port, web_port):
+    """Send reads over TCP at `rate` per second (0 = unpaced) and time their
+    arrival at every SSE client"""
+    sse = [SSEClient(web_port) for _ in range(clients)]
+    for client in sse:
+        client.start()
+    for client in sse:
+        client.ready.wait(5)
+    # Let the stream generators subscribe before the first read
+    deadline = time.time() + 5
+    while len(app.data_hub) < clients and time.time() < deadline:
+        time.sleep(0.01)
+
+    sock = connect_reader(timing_port, f"bench-{size}-{clients}")
+    sent = {}
+    bibs = [str(i % size + 1) for i in range(reads)]
+    started = time.perf_counter()
+    for sequence, bib in enumerate(bibs, 1):
+        if rate:
+            delay = started + sequence / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        sent[bib] = time.perf_counter()
+        sock.sendall((timing_line(sequence, bib) + '\r\n').encode())
+    send_elapsed = time.perf_counter() - started
+
+    expected = len(sent)
+    deadline = time.time() + 30
+    while time.time() < deadline and any(len(c.received) < expected for c in sse):
+        time.sleep(0.05)
+    sock.close()
+    for client in sse:
+        client.close()
+
+    latencies = [(client.received[bib] - at) * 1000
+                 for client in sse for bib, at in sent.items() if bib in client.received]
+    last = max((max(c.received.values()) for c in sse if c.received), default=started)
+    delivered = sum(len(c.received) for c in sse)
+    return {
+        'clients': clients,
+        'reads_sent': reads,
+        'target_rate': rate,
+        'send_reads_per_s': round(reads / send_elapsed, 1),
+        'deliveries': delivered,
+        'expected_deliveries': expected * clients,
+        'delivered_reads_per_s': round(delivered / clients / (last - started), 1) if last > started else None,
+        'latency_ms': summarize(latencies),
+        'rss_mib': round(rss_mib(), 1)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest-to-screen benchmark')
+    parser.add_argument('--roster-sizes', default='10000,50000,100000')
+    parser.add_argument('--clients', default='1,10')
+    parser.add_argument('--reads', type=int, default=5000)
+    parser.add_argument('--rate', type=float, default=1000.0, help='reads per second sent, 0 = unpaced')
+    parser.add_argument('--server', choices=('asyncio', 'threaded'), default='asyncio')
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    logging.getLogger('race_display.ingest').setLevel('ERROR')
+    logging.getLogger('race_display.roster').setLevel('WARNING')
+    # Every benchmark read should reach the screens
+    app.read_dedupe.window = 0
+
+    timing_port = start_timing_server(args.server)
+    web_port = free_port()
+    web = make_server('127.0.0.1', web_port, app.app, threaded=True)
+    threading.Thread(target=web.serve_forever, daemon=True).start()
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'server': args.server,
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'runs': []
+    }
+    for size in (int(s) for s in args.roster_sizes.split(',')):
+        run = {'roster_size': size, 'roster_load_s': round(load_roster(size), 3), 'rss_mib': round(rss_mib(), 1)}
+        run['parse'] = bench_parse(size, args.reads)
+        run['end_to_end'] = []
+        for clients in (int(c) for c in args.clients.split(',')):
+            app.read_dedupe.reset()
+            run['end_to_end'].append(bench_end_to_end(size, clients, args.reads, args.rate, timing_port, web_port))
+            # Wait for the previous clients' generators to unsubscribe
+            deadline = time.time() + 5
+            while len(app.data_hub) and time.time() < deadline:
+                time.sleep(0.05)
+        results['runs'].append(run)
+        print(json.dumps(run, indent=2))
+
+    with open(args.output, 'w', encoding='utf-8') as fp:
+        json.dump(results, fp, indent=2)
+    print(f"Saved results to {args.output}")
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Compare roster memory use for dict-per-runner vs the columnar RosterTable.
+
+Usage: python benchmarks/roster_memory.py [--entries 50000]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roster_stub import make_roster
+from roster_table import RosterTable, RUNNER_FIELDS
+
+# Mirrors build_runner_record in app.py
+ENTRY_KEYS = {
+    'name': 'entry_name', 'first_name': 'athlete_first_name', 'last_name': 'athlete_last_name',
+    'age': 'entry_race_age', 'gender': 'athlete_sex', 'city': 'location_city',
+    'state': 'location_region', 'country': 'location_country', 'division': 'bracket_name',
+    'race_name': 'race_name', 'reg_choice': 'reg_choice_name', 'wave': 'wave_name',
+    'team_name': 'team_name', 'entry_status': 'entry_status', 'entry_type': 'entry_type',
+    'entry_id': 'entry_id', 'athlete_id': 'athlete_id', 'tag': 'entry_tag'
+}
+
+
+def api_pages(entries):
+    """Round-trip the synthetic roster through JSON so every string is a fresh object"""
+    return json.loads(json.dumps(make_roster(entries)))
+
+
+def measure(build, entries):
+    """Return the roster and the bytes it keeps alive once the pages are freed"""
+    gc.collect()
+    tracemalloc.start()
+    pages = api_pages(entries)
+    roster = build(pages)
+    del pages
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return roster, current
+
+
+def build_dicts(pages):
+    roster = {}
+    for entry in pages:
+        roster[entry['entry_bib']] = {field: entry.get(key, '') for field, key in ENTRY_KEYS.items()}
+    return roster
+
+
+def build_table(pages):
+    roster = RosterTable()
+    for entry in pages:
+        roster[entry['entry_bib']] = {field: entry.get(key, '') for field, key in ENTRY_KEYS.items()}
+    return roster
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=50000)
+    args = parser.parse_args()
+
+    dicts, dict_bytes = measure(build_dicts, args.entries)
+    table, table_bytes = measure(build_table, args.entries)
+    assert all(dict(table[bib]) == dicts[bib] for bib in list(dicts)[:100])
+    assert len(RUNNER_FIELDS) == len(ENTRY_KEYS)
+
+    print(f"Entries:            {args.entries}")
+    print(f"dict per runner:    {dict_bytes / 2**20:8.1f} MiB")
+    print(f"RosterTable:        {table_bytes / 2**20:8.1f} MiB")
+    print(f"Reduction:          {1 - table_bytes / dict_bytes:8.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""Load test: many concurrent /stream subscribers against one server process.
+
+Starts the app in a child process pinned to one CPU, through serve_gevent.main()
+or, for comparison, Werkzeug's thread-per-connection server, with reads coming
+in over the default timing server. It then opens N SSE connections from a single-threaded selector
+client, so the load generator needs neither threads nor much memory. It
+measures what the idle connections cost the server (RSS, threads, CPU) and
+then sends reads over a timing connection, timing their delivery to every
+subscriber. It exits non-zero if any subscriber misses a read.
+
+Usage: python benchmarks/sse_load.py [--clients 1000] [--http gevent|threaded]
+           [--reads 200] [--rate 5] [--idle 10] [--cpu 0] [--output sse_load.json]
+
+Needs the same config.py as app.py and, for --http gevent, gevent (requirements.txt).
+"""
+import argparse
+import json
+import os
+import resource
+import selectors
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(args):
+    """Child process: the app with a synthetic roster, pinned to one CPU
+
+    Runs the same entry points as production: serve_gevent.main() (or, for
+    comparison, Werkzeug's threaded server as app.py runs it), with reads
+    coming in through the configured timing server (asyncio by default).
+    """
+    sys.path.insert(0, ROOT)
+    # One process doing everything, not a serve.py worker
+    os.environ['RACE_DISPLAY_ROLE'] = 'all'
+    os.environ.pop('RACE_DISPLAY_FD', None)
+    if args.http == 'gevent':
+        # Monkey-patches on import, before the app is imported
+        import serve_gevent
+    if hasattr(os, 'sched_setaffinity') and args.cpu is not None:
+        os.sched_setaffinity(0, {args.cpu})
+    import logging
+
+    import app
+    from roster_stub import make_roster
+
+    logging.getLogger('race_display.ingest').setLevel('ERROR')
+    logging.getLogger('werkzeug').setLevel('WARNING')
+    app.PROTOCOL_CONFIG.update(HOST='127.0.0.1', PORT=args.timing_port)
+    app.SERVER_CONFIG.update(HOST='127.0.0.1', PORT=args.port, LISTEN_BACKLOG=4096,
+                             RESTORE_ON_START=False)
+    app.merge_roster_entries(make_roster(args.runners))
+    # Every read should reach every screen
+    app.read_dedupe.window = 0
+    app.start_listeners()
+
+    if args.http == 'gevent':
+        serve_gevent.main()
+    else:
+        from werkzeug.serving import make_server
+        host, port = app.start_process_role()
+        server = make_server(host, port, app.app, threaded=True)
+        server.socket.listen(4096)
+        server.serve_forever()
+
+
+def wait_for_port(port, child, timeout=60):
+    """Block until the child's HTTP server accepts connections"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if child.poll() is not None:
+            raise RuntimeError(f"Server exited with {child.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not listen on {port}")
+
+
+def proc_status(pid):
+    """(RSS MiB, threads, CPU seconds) of a process from /proc"""
+    fields = {}
+    with open(f'/proc/{pid}/status') as fp:
+        for line in fp:
+            key, _, value = line.partition(':')
+            fields[key] = value.split()
+    with open(f'/proc/{pid}/stat') as fp:
+        stat = fp.read().rsplit(')', 1)[1].split()
+    cpu = (int(stat[11]) + int(stat[12])) / os.sysconf('SC_CLK_TCK')
+    return int(fields['VmRSS'][0]) / 1024, int(fields['Threads'][0]), cpu
+
+
+def summarize(latencies_ms):
+    if not latencies_ms:
+        return {'p50': None, 'p99': None, 'max': None, 'mean': None}
+    ordered = sorted(latencies_ms)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+    return {
+        'p50': round(pick(50), 2),
+        'p99': round(pick(99), 2),
+        'max': round(ordered[-1], 2),
+        'mean': round(statistics.fmean(ordered), 2)
+    }
+
+
+def subscribers(port):
+    """Stream subscribers according to the server's /metrics"""
+    with socket.create_connection(('127.0.0.1', port), timeout=10) as sock:
+        sock.sendall(b'GET /metrics HTTP/1.0\r\nHost: localhost\r\n\r\n')
+        data = b''
+        while chunk := sock.recv(65536):
+            data += chunk
+    for line in data.decode().splitlines():
+        if line.startswith('race_display_sse_subscribers '):
+            return int(float(line.split()[1]))
+    return 0
+
+
+class StreamClients:
+    """N SSE connections multiplexed on one selector"""
+
+    def __init__(self, port, count, path):
+        self.selector = selectors.DefaultSelector()
+        self.buffers = {}
+        self.received = {}
+        request = f'GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n'.encode()
+        for number in range(count):
+            sock = socket.create_connection(('127.0.0.1', port))
+            sock.sendall(request)
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, number)
+            self.buffers[number] = b''
+            self.received[number] = {}
+
+    def poll(self, timeout):
+        for key, _ in self.selector.select(timeout):
+            number = key.data
+            try:
+                chunk = key.fileobj.recv(65536)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                self.selector.unregister(key.fileobj)
+                continue
+            now = time.perf_counter()
+            data = self.buffers[number] + chunk
+            # Keep a trailing partial line for the next read
+            *lines, self.buffers[number] = data.split(b'\n')
+            for line in lines:
+                if line.startswith(b'data: '):
+                    bib = json.loads(line[6:]).get('bib')
+                    self.received[number].setdefault(bib, now)
+
+    def close(self):
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+
+
+def connect_reader(port, name='load-test'):
+    """Open a timing connection and complete the client side of the handshake"""
+    deadline = time.time() + 30
+    while True:
+        try:
+            sock = socket.create_connection(('127.0.0.1', port))
+            break
+        except ConnectionRefusedError:
+            # The timing server starts on its own thread
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    rfile = sock.makefile('rb')
+    sock.sendall(f"{name}~1.0~CTP01\r\n".encode())
+    settings = int(rfile.readline().decode().strip().split('~')[2])
+    for _ in range(settings + 3):
+        rfile.readline()
+    return sock
+
+
+def run(args):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < args.clients + 256:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, args.clients + 256), hard))
+
+    port, timing_port = free_port(), free_port()
+    child = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', '--http', args.http,
+         '--port', str(port), '--timing-port', str(timing_port), '--runners', str(args.runners),
+         *(['--cpu', str(args.cpu)] if args.cpu is not None else [])]
+    )
+    clients = None
+    try:
+        wait_for_port(port, child)
+        rss_start, threads_start, _ = proc_status(child.pid)
+
+        started = time.perf_counter()
+        clients = StreamClients(port, args.clients, args.path)
+        deadline = time.time() + 60
+        while subscribers(port) < args.clients and time.time() < deadline:
+            clients.poll(0.1)
+        connect_s = time.perf_counter() - started
+        connected = subscribers(port)
+
+        # Idle: only keepalives flowing
+        _, _, cpu_before = proc_status(child.pid)
+        idle_started = time.perf_counter()
+        while time.perf_counter() - idle_started < args.idle:
+            clients.poll(0.2)
+        rss_idle, threads_idle, cpu_after = proc_status(child.pid)
+        idle_cpu = (cpu_after - cpu_before) / (time.perf_counter() - idle_started)
+
+        # Broadcast: reads at a steady rate, every subscriber should get each one
+        reader = connect_reader(timing_port)
+        sent = {}
+        cpu_before = cpu_after
+        broadcast_started = time.perf_counter()
+        for sequence in range(1, args.reads + 1):
+            due = broadcast_started + sequence / args.rate
+            while (wait := due - time.perf_counter()) > 0:
+                clients.poll(wait)
+            bib = str(sequence % args.runners + 1)
+            sent[bib] = time.perf_counter()
+            clock = time.strftime('%H:%M:%S')
+            reader.sendall(f'CT01_33~{sequence}~finish~{bib}~{clock}.00~0~TAG{bib}~1\r\n'.encode())
+        deadline = time.perf_counter() + 30
+        while time.perf_counter() < deadline and any(
+                len(received) < len(sent) for received in clients.received.values()):
+            clients.poll(0.1)
+        broadcast_s = time.perf_counter() - broadcast_started
+        rss_end, threads_end, cpu_after = proc_status(child.pid)
+        reader.close()
+
+        latencies = [(at - sent[bib]) * 1000
+                     for received in clients.received.values()
+                     for bib, at in received.items() if bib in sent]
+        deliveries = sum(len(received) for received in clients.received.values())
+        result = {
+            'http': args.http,
+            'clients': args.clients,
+            'connected': connected,
+            'connect_s': round(connect_s, 2),
+            'server_cpu_pinned': args.cpu,
+            'cpus_available': os.cpu_count(),
+            'rss_mib': {'start': round(rss_start, 1), 'idle': round(rss_idle, 1), 'end': round(rss_end, 1)},
+            'kib_per_idle_client': round((rss_idle - rss_start) * 1024 / max(1, connected), 1),
+            'threads': {'start': threads_start, 'idle': threads_idle},
+            'idle_cpu_pct': round(idle_cpu * 100, 1),
+            'reads_sent': len(sent),
+            'rate': args.rate,
+            'deliveries': deliveries,
+            'expected_deliveries': len(sent) * args.clients,
+            'broadcast_cpu_pct': round((cpu_after - cpu_before) / broadcast_s * 100, 1),
+            'latency_ms': summarize(latencies),
+        }
+    finally:
+        if clients is not None:
+            clients.close()
+        child.terminate()
+        child.wait(10)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent /stream subscriber load test')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--http', choices=('gevent', 'threaded'), default='gevent')
+    parser.add_argument('--reads', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=5.0, help='reads per second')
+    parser.add_argument('--idle', type=float, default=10.0, help='seconds to measure idle connections')
+    parser.add_argument('--runners', type=int, default=5000)
+    parser.add_argument('--path', default='/stream', help='stream URL, e.g. /stream?template=finish')
+    parser.add_argument('--cpu', type=int, default=0, help='CPU to pin the server to')
+    parser.add_argument('--output', default='sse_load.json')
+    # Internal: run as the server child
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--timing-port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    result = run(args)
+    print(json.dumps(result, indent=2))
+    with open(args.output, 'w', encoding='utf-8') as fp:
+        json.dump(result, fp, indent=2)
+    if result['deliveries'] < result['expected_deliveries']:
+        print(f"FAIL: {result['expected_deliveries'] - result['deliveries']} deliveries missing")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+
+# Keys every projection keeps so clients can tell frames and runners apart
+ALWAYS_FIELDS = frozenset(('bib', 'type'))
+
+# Frame types about the stream itself, which every subscriber gets unfiltered
+CONTROL_TYPES = frozenset(('leaderboard_reset',))
+
+
+def projection_key(fields):
+    """Normalize a field list so equivalent projections share one cache entry"""
+    if not fields:
+        return None
+    return tuple(sorted(set(fields) | ALWAYS_FIELDS))
+
+
+def project(data, fields):
+    """Keep only the requested fields, including inside batch frames"""
+    if 'runners' in data:
+        projected = {k: v for k, v in data.items() if k != 'runners' and k in fields}
+        projected['runners'] = [project(runner, fields) for runner in data['runners']]
+        return projected
+    return {k: data[k] for k in fields if k in data}
+
+
+class StreamEvent:
+    """One published payload, JSON-encoded at most once per distinct projection"""
+
+    __slots__ = ('id', 'seq', 'data', '_encoded', '_filtered')
+
+    def __init__(self, data, seq=0, id=None):
+        self.seq = seq
+        self.id = id
+        self.data = data
+        self._encoded = {}
+        self._filtered = None
+
+    def filtered(self, stream_filter):
+        """Return the event as a subscriber with this filter sees it, or None
+
+        Batch frames keep only the runners that match. The result is cached
+        per distinct filter, so subscribers sharing one evaluate it once.
+        """
+        if stream_filter is None or self.data.get('type') in CONTROL_TYPES:
+            return self
+        if self._filtered is None:
+            self._filtered = {}
+        elif stream_filter.key in self._filtered:
+            return self._filtered[stream_filter.key]
+        runners = self.data.get('runners')
+        if runners is None:
+            result = self if stream_filter(self.data) else None
+        else:
+            matching = [runner for runner in runners if stream_filter(runner)]
+            if len(matching) == len(runners):
+                result = self
+            elif matching:
+                result = StreamEvent(dict(self.data, runners=matching), self.seq, self.id)
+            else:
+                result = None
+        self._filtered[stream_filter.key] = result
+        return result
+
+    def view(self, fields=None):
+        """Return the payload restricted to a projection key"""
+        return self.data if fields is None else project(self.data, fields)
+
+    def encode(self, fields=None):
+        """Return the JSON text for a projection key from projection_key()"""
+        text = self._encoded.get(fields)
+        if text is None:
+            # Two subscribers racing here both produce the same string
+            text = json.dumps(self.view(fields))
+            self._encoded[fields] = text
+        return text
+
+
+class Subscriber:
+    """A single stream consumer with its own bounded ring buffer.
+
+    When the buffer is full the oldest entry is discarded so a slow display
+    never holds up the publisher.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, maxlen=256, name=None, stream_filter=None):
+        self.id = next(self._ids)
+        self.name = name or f'subscriber-{self.id}'
+        # Replaced, never mutated, so the publisher can read it without a lock
+        self.filter = stream_filter
+        self._buffer = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.delivered = 0
+        self.closed = False
+
+    def put(self, item):
+        """Append an item, dropping the oldest one if the buffer is full"""
+        with self._cond:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the next item, raising queue.Empty after timeout seconds"""
+        with self._cond:
+            if not self._buffer and not self._cond.wait_for(
+                lambda: self._buffer or self.closed, timeout
+            ):
+                raise queue.Empty
+            if not self._buffer:
+                raise queue.Empty
+            self.delivered += 1
+            return self._buffer.popleft()
+
+    def pending(self):
+        """Number of items waiting to be delivered"""
+        return len(self._buffer)
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class BroadcastHub:
+    """Fan every published item out to all current subscribers
+
+    Events are numbered `<boot>-<seq>` and the last `replay_size` are kept so
+    a client reconnecting with the id of the last event it saw can be sent
+    exactly what it missed. The boot prefix changes on every restart, so ids
+    from an earlier run are recognised and not replayed against new events.
+
+    on_publish, if set, is called with each new event under the publish lock,
+    which is how the ingest process mirrors a hub to the web workers. A
+    mirror publishes with the source's seq after restart() with its boot, so
+    ids match across processes.
+    """
+
+    def __init__(self, buffer_size=256, replay_size=1024):
+        self.buffer_size = buffer_size
+        self.boot = format(int(time.time()), 'x')
+        self._seq = 0
+        self._history = deque(maxlen=replay_size)
+        self._subscribers = ()
+        self._lock = threading.Lock()
+        self.replayed = 0
+        self.filtered_out = 0
+        self.on_publish = None
+
+    def subscribe(self, name=None, last_event_id=None, stream_filter=None, buffer_size=None):
+        """Add a subscriber, first queueing any events after last_event_id"""
+        subscriber = Subscriber(buffer_size or self.buffer_size, name, stream_filter)
+        with self._lock:
+            # Snapshot and join under the publish lock so nothing is missed or doubled
+            for event in self._missed(last_event_id):
+                event = event.filtered(stream_filter)
+                if event is not None:
+                    subscriber.put(event)
+                    self.replayed += 1
+            self._subscribers = self._subscribers + (subscriber,)
+        return subscriber
+
+    def _missed(self, last_event_id):
+        if not last_event_id or not self._history:
+            return ()
+        boot, _, seq = last_event_id.partition('-')
+        if boot != self.boot or not seq.isdigit():
+            return ()
+        seq = int(seq)
+        if seq >= self._history[-1].seq:
+            return ()
+        # Ids are contiguous, so the missed events start at a known offset
+        start = max(0, seq - self._history[0].seq + 1)
+        return list(itertools.islice(self._history, start, None))
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscriber)
+        subscriber.close()
+
+    def restart(self, boot):
+        """Continue another hub's numbering; history from the old boot is dropped"""
+        with self._lock:
+            if boot != self.boot:
+                self.boot = boot
+                self._seq = 0
+                self._history.clear()
+
+    def publish(self, data, seq=None):
+        """Deliver a payload to every subscriber without blocking on any of them
+
+        seq is only given when mirroring another hub; events at or below the
+        current seq are already here and are ignored (None is returned).
+        """
+        with self._lock:
+            # Numbering, logging and delivery happen together so every
+            # subscriber sees ids in order; put() never waits on a reader
+            if seq is None:
+                self._seq += 1
+            elif seq <= self._seq:
+                return None
+            else:
+                if seq != self._seq + 1:
+                    # _missed() relies on the history being contiguous
+                    self._history.clear()
+                self._seq = seq
+            event = StreamEvent(data, self._seq, f'{self.boot}-{self._seq}')
+            self._history.append(event)
+            if self.on_publish is not None:
+                self.on_publish(event)
+            for subscriber in self._subscribers:
+                wanted = event.filtered(subscriber.filter)
+                if wanted is not None:
+                    subscriber.put(wanted)
+                else:
+                    self.filtered_out += 1
+        return event
+
+    def last_event_id(self):
+        return self._history[-1].id if self._history else None
+
+    def history_size(self):
+        return len(self._history)
+
+    def subscribers(self):
+        return self._subscribers
+
+    def __len__(self):
+        return len(self._subscribers)
@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import logging
+import threading
+
+stream_log = logging.getLogger('race_display.stream')
+
+# Lower values are shown first
+PRIORITY_VIP = 0
+PRIORITY_FIRST_FINISH = 1
+PRIORITY_REPEAT_FINISH = 2
+PRIORITY_SPLIT = 3
+
+
+class PresentationScheduler:
+    """Pace runner payloads onto the displays from its own thread
+
+    Ingest calls submit(), which only pushes onto a priority heap. A worker
+    thread publishes the best waiting payload, then holds it on screen for
+    `dwell` seconds. When more than `max_backlog` payloads are waiting the
+    least important ones are skipped so the screens stay close to live, and
+    with `batch_size` > 1 a deep backlog is shown several runners per frame.
+    """
+
+    def __init__(self, publish, dwell=3.0, max_backlog=20, batch_size=0,
+                 finish_locations=('finish',), vip_bibs=(), vip_teams=()):
+        self.publish = publish
+        self.dwell = dwell
+        self.max_backlog = max_backlog
+        self.batch_size = batch_size
+        self.finish_locations = frozenset(loc.lower() for loc in finish_locations)
+        self.vip_bibs = frozenset(vip_bibs)
+        self.vip_teams = frozenset(vip_teams)
+        self.stats = {'submitted': 0, 'shown': 0, 'skipped': 0, 'batches': 0}
+        self._heap = []
+        self._order = itertools.count()
+        self._finished = set()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    def is_finish(self, payload):
+        return str(payload.get('location', '')).lower() in self.finish_locations
+
+    def priority(self, payload):
+        """Rank a payload: VIPs, then first finishes, repeat finishes, splits
+
+        A finish only counts as shown once it has been published, so a
+        first finish that was skipped doesn't demote the next one.
+        """
+        if payload.get('bib') in self.vip_bibs or (
+                self.vip_teams and payload.get('team_name') in self.vip_teams):
+            return PRIORITY_VIP
+        if self.is_finish(payload):
+            if payload.get('bib') in self._finished:
+                return PRIORITY_REPEAT_FINISH
+            return PRIORITY_FIRST_FINISH
+        return PRIORITY_SPLIT
+
+    def submit(self, payload):
+        """Queue a payload for display without waiting on the pacing thread"""
+        with self._cond:
+            heapq.heappush(self._heap, (self.priority(payload), next(self._order), payload))
+            self.stats['submitted'] += 1
+            if len(self._heap) > self.max_backlog:
+                self._skip_ahead()
+            self._cond.notify()
+
+    def _skip_ahead(self):
+        # Drop the oldest of the least important payloads until under the limit
+        excess = len(self._heap) - self.max_backlog
+        victims = heapq.nsmallest(excess, self._heap, key=lambda item: (-item[0], item[1]))
+        dropped = {id(item) for item in victims}
+        self._heap = [item for item in self._heap if id(item) not in dropped]
+        heapq.heapify(self._heap)
+        self.stats['skipped'] += excess
+        stream_log.info("Display backlog over %d; skipped %d reads", self.max_backlog, excess)
+
+    def backlog(self):
+        return len(self._heap)
+
+    def _next_frame(self):
+        """Block until something is waiting, then pop one payload or a batch"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._heap or self._stop)
+            if self._stop:
+                return None
+            if self.batch_size > 1 and len(self._heap) >= self.batch_size:
+                runners = [heapq.heappop(self._heap)[2] for _ in range(self.batch_size)]
+                self.stats['batches'] += 1
+                frame = {'type': 'batch', 'runners': runners}
+            else:
+                runners = [heapq.heappop(self._heap)[2]]
+                frame = runners[0]
+            self.stats['shown'] += len(runners)
+            self._finished.update(runner.get('bib') for runner in runners if self.is_finish(runner))
+            return frame
+
+    def run(self):
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                return
+            self.publish(frame)
+            # Hold the frame on screen; stop() wakes us early
+            with self._cond:
+                self._cond.wait_for(lambda: self._stop, self.dwell)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True, name='display-pacing')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def reset(self):
+        """Forget who has finished, e.g. when switching events"""
+        with self._cond:
+            self._heap.clear()
+            self._finished.clear()
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+from collections import deque
+
+from broadcast import Subscriber
+
+bus_log = logging.getLogger('race_display.bus')
+
+# Every frame is a 4-byte big-endian length and a JSON [channel, seq, payload]
+FRAME_HEADER = struct.Struct('!I')
+HELLO = 'hello'
+
+
+def encode_frame(channel, seq, payload):
+    body = json.dumps([channel, seq, payload], separators=(',', ':')).encode('utf-8')
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+class EventBusPublisher:
+    """Unix-socket fan-out from the ingest process to the web workers
+
+    publish() encodes a frame once and appends it to each connected worker's
+    bounded buffer (a broadcast.Subscriber), so a stalled worker never holds
+    up ingest; a sender thread per worker does the socket writes. A worker
+    whose buffer overflows is disconnected rather than sent a stream with
+    frames missing: it reconnects and rebuilds from the retained frames.
+
+    Channels set up with retain() keep their recent frames. A worker that
+    connects is sent a hello, then everything retained (oldest channel
+    first), then live frames; retain(channel) with no limit keeps a channel
+    until clear(), which is how a late worker rebuilds the results.
+    """
+
+    def __init__(self, path, buffer_size=10000, hello=None):
+        self.path = path
+        self.buffer_size = buffer_size
+        # Sent first on every connection, e.g. the boot ids of mirrored hubs
+        self.hello = hello or {}
+        self.stats = {'published': 0, 'connections': 0, 'overflows': 0}
+        self._seqs = {}
+        self._retained = {}
+        self._workers = ()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def retain(self, channel, maxlen=None):
+        self._retained[channel] = deque(maxlen=maxlen)
+
+    def clear(self, channel):
+        with self._lock:
+            self._retained[channel].clear()
+
+    def publish(self, channel, payload, seq=None):
+        """Queue a frame for every worker; never blocks on a socket"""
+        with self._lock:
+            if seq is None:
+                seq = self._seqs[channel] = self._seqs.get(channel, 0) + 1
+            frame = encode_frame(channel, seq, payload)
+            retained = self._retained.get(channel)
+            if retained is not None:
+                retained.append(frame)
+            for worker in self._workers:
+                worker.put(frame)
+            self.stats['published'] += 1
+
+    def workers(self):
+        return self._workers
+
+    def start(self):
+        if os.path.exists(self.path):
+            # Left behind by an earlier run
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        threading.Thread(target=self._accept, daemon=True, name='bus-accept').start()
+        bus_log.info("Event bus listening on %s", self.path)
+        return self
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            worker = Subscriber(self.buffer_size, name=f'worker-{self.stats["connections"] + 1}')
+            with self._lock:
+                # Snapshot and join together so no frame is missed or doubled
+                backlog = [encode_frame(HELLO, 0, self.hello)]
+                for retained in self._retained.values():
+                    backlog.extend(retained)
+                self._workers = self._workers + (worker,)
+                self.stats['connections'] += 1
+            threading.Thread(target=self._send, args=(conn, worker, backlog),
+                             daemon=True, name=worker.name).start()
+
+    def _send(self, conn, worker, backlog):
+        bus_log.info("Web worker connected (%s), sending %d retained frames", worker.name, len(backlog))
+        try:
+            conn.sendall(b''.join(backlog))
+            while True:
+                if worker.dropped:
+                    # Frames are gone; make it start over from the retained state
+                    self.stats['overflows'] += 1
+                    bus_log.warning("Web worker %s fell %d frames behind; disconnecting it to resync",
+                                    worker.name, worker.dropped)
+                    return
+                try:
+                    frame = worker.get(timeout=1)
+                except queue.Empty:
+                    continue
+                conn.sendall(frame)
+        except OSError as e:
+            bus_log.info("Web worker %s disconnected: %s", worker.name, e)
+        finally:
+            with self._lock:
+                self._workers = tuple(w for w in self._workers if w is not worker)
+            worker.close()
+            conn.close()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class EventBusSubscriber:
+    """Web worker end of the bus: calls handlers[channel](seq, payload) per frame
+
+    Runs on its own thread and reconnects every `retry` seconds while the
+    ingest process is down. handlers[HELLO] is called at the start of every
+    connection, before the retained frames, so state rebuilt from them can
+    be reset there.
+    """
+
+    def __init__(self, path, handlers, retry=1.0):
+        self.path = path
+        self.handlers = handlers
+        self.retry = retry
+        self.connected = False
+        self.stats = {'frames': 0, 'connects': 0}
+        self._stop = threading.Event()
+
+    def _read_frames(self, stream):
+        while True:
+            header = stream.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            body = stream.read(FRAME_HEADER.unpack(header)[0])
+            channel, seq, payload = json.loads(body)
+            handler = self.handlers.get(channel)
+            self.stats['frames'] += 1
+            if handler is None:
+                continue
+            try:
+                handler(seq, payload)
+            except Exception:
+                bus_log.exception("Error handling %s frame", channel)
+
+    def _run(self):
+        warned = False
+        while not self._stop.is_set():
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                    conn.connect(self.path)
+                    self.connected = True
+                    warned = False
+                    self.stats['connects'] += 1
+                    bus_log.info("Connected to event bus %s", self.path)
+                    with conn.makefile('rb') as stream:
+                        self._read_frames(stream)
+                bus_log.warning("Event bus closed; reconnecting")
+            except OSError as e:
+                if not warned:
+                    bus_log.warning("Event bus %s unavailable, retrying: %s", self.path, e)
+                    warned = True
+            self.connected = False
+            self._stop.wait(self.retry)
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name='bus-subscriber').start()
+        return self
+
+    def stop(self):
+        self._stop.set()
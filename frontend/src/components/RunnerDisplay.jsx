@@ -2,15 +2,77 @@ import React, { useEffect, useRef, useState } from 'react';
 import { Link } from 'react-router-dom';
 import './RunnerDisplay.css';
 
+// Shown when no templates are saved; slots as /api/templates/<name> compiles them
+const DEFAULT_TEMPLATE = {
+  html: '<div class="text-center p-4">\n  <h1 data-placeholder="name">{{name}}</h1>\n  <h3 data-placeholder="city">{{city}}</h3>\n  <p data-placeholder="message">{{message}}</p>\n</div>',
+  slots: [
+    { field: 'name', index: 0, target: 'text' },
+    { field: 'city', index: 1, target: 'text' },
+    { field: 'message', index: 2, target: 'text' },
+  ],
+};
+
+const PAGE_PARAMS = new URLSearchParams(window.location.search);
+
+// Opt in to the batched WebSocket transport with ?transport=ws on the page URL
+const USE_WEBSOCKET = PAGE_PARAMS.get('transport') === 'ws';
+
+// Stream filters given on the page URL, e.g. ?location=finish&race_name=10K
+const FILTER_PARAMS = ['location', 'race_name', 'wave', 'division', 'bib'];
+
+function streamParams(template) {
+  const params = new URLSearchParams({ template });
+  FILTER_PARAMS.forEach(name => PAGE_PARAMS.getAll(name).forEach(v => params.append(name, v)));
+  return params;
+}
+
+// Receive /ws frames, acking each one so a reconnect resumes after it
+function openWebSocket(template, onData) {
+  let ws;
+  let lastId = null;
+  let closed = false;
+  let retry;
+  const connect = () => {
+    const params = streamParams(template);
+    if (lastId) params.set('last_event_id', lastId);
+    const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    ws = new WebSocket(`${proto}://${window.location.host}/ws?${params}`);
+    ws.onmessage = (e) => {
+      try {
+        const frame = JSON.parse(e.data);
+        frame.rows.forEach(row => {
+          const data = {};
+          frame.fields.forEach((field, i) => {
+            if (row[i] !== null) data[field] = row[i];
+          });
+          onData(data);
+        });
+        lastId = frame.ids[frame.ids.length - 1];
+        ws.send(JSON.stringify({ ack: lastId }));
+      } catch {}
+    };
+    ws.onclose = () => {
+      if (!closed) retry = setTimeout(connect, 2000);
+    };
+  };
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    ws.close();
+  };
+}
+
 export default function RunnerDisplay() {
   const [runner, setRunner] = useState(null);
   const [templates, setTemplates] = useState([]); // list of template names
   const [selected, setSelected] = useState('');
-  const [templateHTML, setTemplateHTML] = useState('');
+  const [template, setTemplate] = useState({ html: '', slots: [] });
   const [showSettings, setShowSettings] = useState(false);
   const displayRef = useRef(null);
   const customMessages = useRef([]);
   const customIndex = useRef(0);
+  const slots = useRef([]); // the server's slots resolved to nodes once per template
 
   // Load templates from the server
   useEffect(() => {
@@ -21,9 +83,7 @@ export default function RunnerDisplay() {
         if (data.length === 0) {
           setTemplates(['Default']);
           setSelected('Default');
-          setTemplateHTML(
-            '<div class="text-center p-4">\n  <h1 data-placeholder="name">{{name}}</h1>\n  <h3 data-placeholder="city">{{city}}</h3>\n  <p data-placeholder="message">{{message}}</p>\n</div>'
-          );
+          setTemplate(DEFAULT_TEMPLATE);
         } else {
           setTemplates(data);
           setSelected(data[0]);
@@ -42,7 +102,7 @@ export default function RunnerDisplay() {
       try {
         const response = await fetch(`/api/templates/${selected}`);
         const data = await response.json();
-        setTemplateHTML(data.html || '');
+        setTemplate({ html: data.html || '', slots: data.slots || [] });
       } catch (err) {
         console.error('Failed to load template:', err);
       }
@@ -50,10 +110,18 @@ export default function RunnerDisplay() {
     fetchTemplate();
   }, [selected]);
 
-  // Apply template HTML to the DOM
+  // Apply template HTML to the DOM and find the nodes for the compiled slots
   useEffect(() => {
     if (displayRef.current) {
-      displayRef.current.innerHTML = templateHTML;
+      displayRef.current.innerHTML = template.html;
+      const el = displayRef.current;
+      const placeholders = el.querySelectorAll('[data-placeholder]');
+      slots.current = template.slots
+        .map(slot => ({
+          ...slot,
+          node: slot.class ? el.querySelector('.' + slot.class) : placeholders[slot.index],
+        }))
+        .filter(slot => slot.node);
       const node = displayRef.current.querySelector('[data-placeholder="custom_message"]');
       if (node) {
         const msgs = node.getAttribute('data-messages') || '';
@@ -64,26 +132,20 @@ export default function RunnerDisplay() {
         customIndex.current = 0;
       }
     }
-  }, [templateHTML]);
+  }, [template]);
 
   // Update runner info in template
   useEffect(() => {
     if (!runner || !displayRef.current) return;
-    const el = displayRef.current;
-    const set = (cls, value) => {
-      const node = el.querySelector('.' + cls);
-      if (node) node.textContent = value || '';
-    };
-    set('runner-name', runner.name);
-    set('runner-city', runner.city);
-    set('runner-message', runner.message);
-    set('bib-number', runner.bib);
+    slots.current.forEach(({ node, field, target, class: byClass }) => {
+      if (byClass) {
+        node.textContent = runner[field] || '';
+        return;
+      }
 
-    // Update GrapesJS placeholders
-    el.querySelectorAll('[data-placeholder]').forEach(node => {
-      const key = node.getAttribute('data-placeholder');
-      let value = runner[key];
-      if (key === 'custom_message') {
+      // GrapesJS placeholders
+      let value = runner[field];
+      if (field === 'custom_message') {
         if (customMessages.current.length) {
           value = customMessages.current[customIndex.current % customMessages.current.length];
           customIndex.current += 1;
@@ -92,25 +154,49 @@ export default function RunnerDisplay() {
         }
       }
       if (value !== undefined) {
-        if (node.tagName === 'IMG') {
+        if (target === 'src') {
           node.src = value;
         } else {
           node.textContent = value || '';
         }
       }
     });
-  }, [runner, templateHTML]);
+  }, [runner, template]);
+
+  // Stream timing data, trimmed server-side to the fields the template uses
+  useEffect(() => {
+    if (!selected) return;
+    const show = (data) => {
+      if (data.type === 'batch') {
+        // Several runners crossed at once; show the first and list them all
+        setRunner({ ...data.runners[0], runner_names: data.runners.map(r => r.name).join(', ') });
+      } else {
+        setRunner(data);
+      }
+    };
+    if (USE_WEBSOCKET) return openWebSocket(selected, show);
+    const es = new EventSource(`/stream?${streamParams(selected)}`);
+    es.onmessage = (e) => {
+      try {
+        show(JSON.parse(e.data));
+      } catch {}
+    };
+    // Leave the EventSource open on errors: it reconnects by itself and sends
+    // Last-Event-ID so the server replays whatever crossed in the meantime
+    return () => es.close();
+  }, [selected]);
 
-  // Stream timing data
+  // Operator alerts (VIPs, unknown bibs, silent readers) with ?alerts=1
   useEffect(() => {
-    const es = new EventSource('/stream');
+    if (!PAGE_PARAMS.get('alerts')) return;
+    const es = new EventSource('/stream/alerts');
     es.onmessage = (e) => {
       try {
-        const data = JSON.parse(e.data);
-        if (!data.keepalive) setRunner(data);
+        const alert = JSON.parse(e.data);
+        console.info(`[${alert.kind}] ${alert.message}`);
+        if (alert.sound) new Audio(alert.sound).play().catch(() => {});
       } catch {}
     };
-    es.onerror = () => es.close();
     return () => es.close();
   }, []);
 
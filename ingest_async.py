@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import threading
+
+ingest_log = logging.getLogger('race_display.ingest')
+protocol_log = logging.getLogger('race_display.protocol')
+
+# Acknowledgements to our handshake commands that carry no timing data
+HANDSHAKE_ACKS = frozenset(('init', 'geteventinfo', 'getlocations', 'start'))
+
+
+class AsyncTimingServer:
+    """Single-threaded asyncio server speaking the CT01_33 push protocol
+
+    Each timing connection is a coroutine rather than an OS thread. Lines are
+    parsed from the stream reader's buffer and handed to on_line on the event
+    loop; while on_line is busy the reader stops draining the socket, so a
+    burst pushes back on the timing box through TCP flow control.
+
+    on_connect(source, send) is called once the feed has started, with a
+    send(*fields) that queues a command on the connection from any thread,
+    and on_disconnect(source, send) when it closes. Acks to the commands in
+    `acks` (e.g. a backfill command sent through send) are consumed like the
+    handshake's.
+
+    serve_forever() runs the server in the calling thread. start() runs it on
+    a background thread instead and returns the address it bound, which is
+    how to find the port when given port 0; stop() shuts it down.
+    """
+
+    def __init__(self, host, port, settings, on_line, separator='~', terminator='\r\n',
+                 server_name='RaceDisplay', server_version='Version 1.0 Level 2024.02',
+                 max_line=64 * 1024, source_for=None, on_connect=None, on_disconnect=None,
+                 acks=()):
+        self.host = host
+        self.port = port
+        self.settings = settings
+        self.on_line = on_line
+        self.separator = separator
+        self.terminator = terminator
+        self.server_name = server_name
+        self.server_version = server_version
+        self.max_line = max_line
+        # Maps (peer address, greeting) to the source id passed to on_line
+        self.source_for = source_for or (lambda peer, greeting: f"{peer[0]}/{greeting}")
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.acks = HANDSHAKE_ACKS.union(acks)
+        self.connections = 0
+        self.address = None
+        self._server = None
+        self._task = None
+        self._loop = None
+        self._thread = None
+        self._error = None
+        self._ready = threading.Event()
+
+    def write_command(self, writer, *fields):
+        """Queue a command on the connection's write buffer"""
+        command = self.separator.join(map(str, fields))
+        protocol_log.debug(">> %s", command)
+        writer.write((command + self.terminator).encode())
+
+    def command_sender(self, writer):
+        """send(*fields) for a connection that is safe to call off the event loop
+
+        StreamWriter isn't thread-safe, so calls from other threads (a gap
+        found while the journal replays on a login thread) are handed to the
+        loop.
+        """
+        loop = asyncio.get_running_loop()
+
+        def send(*fields):
+            try:
+                on_loop = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                on_loop = False
+            if on_loop:
+                self.write_command(writer, *fields)
+                return
+            try:
+                loop.call_soon_threadsafe(self.write_command, writer, *fields)
+            except RuntimeError:
+                raise ConnectionError("Timing server event loop has stopped") from None
+
+        return send
+
+    async def read_command(self, reader):
+        """Read one line, returning '' when the peer goes away"""
+        try:
+            raw = await reader.readline()
+        except ValueError:
+            # readline discards the buffered data when a line exceeds the limit
+            ingest_log.warning("Dropping over-long line from timing connection")
+            return None
+        except ConnectionError:
+            return ''
+        command = raw.strip().decode(errors='replace')
+        if command:
+            protocol_log.debug("<< %s", command)
+        elif raw:
+            return None
+        return command
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        self.connections += 1
+        ingest_log.info("-- Client connected: %s --", peer)
+        source = send = None
+        try:
+            # Consume the greeting
+            greeting = await self.read_command(reader)
+            source = self.source_for(peer, greeting or '')
+
+            # Greeting with settings count, each setting, then event info and start
+            self.write_command(writer, self.server_name, self.server_version, len(self.settings))
+            for setting in self.settings:
+                self.write_command(writer, setting)
+            self.write_command(writer, "geteventinfo")
+            self.write_command(writer, "getlocations")
+            self.write_command(writer, "start")
+            if self.on_connect is not None:
+                send = self.command_sender(writer)
+                self.on_connect(source, send)
+            await writer.drain()
+
+            while True:
+                line = await self.read_command(reader)
+                if line is None:
+                    # Blank or oversized line; keep the connection
+                    continue
+                if not line:
+                    break
+
+                if line == 'ping':
+                    self.write_command(writer, "ack", "ping")
+                    await writer.drain()
+                    continue
+
+                if line.startswith('ack' + self.separator):
+                    parts = line.split(self.separator)
+                    if parts[1] in self.acks:
+                        continue
+
+                try:
+                    self.on_line(line, source)
+                except Exception:
+                    ingest_log.exception("Error handling timing line %r", line)
+        finally:
+            if send is not None and self.on_disconnect is not None:
+                self.on_disconnect(source, send)
+            self.connections -= 1
+            ingest_log.info("-- Client disconnected: %s --", peer)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self):
+        self._server = await asyncio.start_server(
+            self.handle_client, self.host, self.port, limit=self.max_line
+        )
+        self.address = self._server.sockets[0].getsockname()[:2]
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._ready.set()
+        ingest_log.info("Server listening on port %s (asyncio)", self.address[1])
+        async with self._server:
+            await self._server.serve_forever()
+
+    def serve_forever(self):
+        """Run the server on a fresh event loop in the calling thread"""
+        asyncio.run(self.serve())
+
+    def _run(self):
+        try:
+            self.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+
+    def start(self, timeout=10):
+        """Serve on a background thread; returns the (host, port) bound once listening"""
+        self._thread = threading.Thread(target=self._run, daemon=True, name='timing-server')
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Timing server did not start")
+        if self._error is not None:
+            raise self._error
+        return self.address
+
+    def stop(self, timeout=5):
+        """Stop a server started with start(), closing its connections"""
+        if self._task is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+            except RuntimeError:
+                # The loop has already finished
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout)
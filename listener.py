@@ -1,10 +1,25 @@
+import shutil
 import socket
+import subprocess
 import sys
 from datetime import datetime
-import os
+
+_sound = None
+# afplay only exists on macOS; elsewhere the listener runs without sound
+AFPLAY = shutil.which("afplay")
 
 def play_system_sound():
-    os.system("afplay /System/Library/Sounds/Glass.aiff")  # or Ping.aiff, Tink.aiff, etc.
+    """Start the sound in the background; skip it if the last one is still playing"""
+    global _sound
+    if AFPLAY is None or (_sound is not None and _sound.poll() is None):
+        return
+    try:
+        _sound = subprocess.Popen(
+            [AFPLAY, "/System/Library/Sounds/Glass.aiff"],  # or Ping.aiff, Tink.aiff, etc.
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    except OSError as e:
+        print(f"Error playing sound: {e}", flush=True)
 
 def create_listener():
     HOST = '0.0.0.0'
@@ -13,8 +28,11 @@ def create_listener():
     print(f"Starting TCP listener on {HOST}:{PORT}", flush=True)
     
     # Test the sound
-    print("Testing sound...", flush=True)
-    play_system_sound()
+    if AFPLAY is None:
+        print("afplay not found; tag detections will be silent", flush=True)
+    else:
+        print("Testing sound...", flush=True)
+        play_system_sound()
     
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -0,0 +1,98 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# Log arguments that can't change between the call and the listener thread
+IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread
+
+    The stock handler formats every record on the calling thread before
+    queueing it. Deferring that keeps string formatting off the timing
+    threads for the usual case of string and number arguments. A record
+    with any other argument (a dict, a list, a RunnerView) is rendered
+    here instead, so it shows the object as it was when it was logged.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        # A lone dict argument becomes record.args itself
+        if not isinstance(record.msg, str) or isinstance(args, dict) or (
+                args and not all(isinstance(arg, IMMUTABLE_ARGS) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def configure_logging(level=logging.INFO, levels=None):
+    """Send all log records through a queue drained by a background thread
+
+    levels maps logger names to level names, e.g. {'race_display.ingest': 'WARNING'}.
+    """
+    log_queue = queue.SimpleQueue()
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(log_queue, console, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    for name, name_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(name_level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class RateLimitedLogger:
+    """Log the first `burst` messages per interval, then only every Nth one
+
+    Sampled messages report how many were suppressed since the last one
+    that got through.
+    """
+
+    def __init__(self, logger, burst=10, interval=60.0, sample_every=100):
+        if sample_every < 1:
+            raise ValueError(f"sample_every must be at least 1, not {sample_every!r}")
+        self.logger = logger
+        self.burst = burst
+        self.interval = interval
+        self.sample_every = sample_every
+        self.suppressed = 0
+        self._window_start = time.monotonic()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def log(self, level, msg, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.interval:
+                self._window_start = now
+                self._count = 0
+            self._count += 1
+            if self._count > self.burst and self._count % self.sample_every:
+                self.suppressed += 1
+                return
+            suppressed, self.suppressed = self.suppressed, 0
+        if suppressed:
+            self.logger.log(level, msg + ' (%d similar messages suppressed)', *args, suppressed)
+        else:
+            self.logger.log(level, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
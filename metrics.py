@@ -0,0 +1,216 @@
+import bisect
+import queue
+import threading
+import weakref
+
+
+class _ThreadToken:
+    """Held only by a thread's local storage, so it dies with the thread"""
+
+    __slots__ = ('__weakref__',)
+
+
+class _ShardedValue:
+    """Numbers updated without locking by giving each thread its own cell
+
+    Writers only touch their own thread's cell, so increments never contend;
+    readers add all cells up when the metrics are scraped. When a thread (or
+    greenlet) ends, a finalizer on its local storage queues its cell, and the
+    cell is folded into a base total the next time cells are added or read,
+    so threads per connection don't leave cells behind.
+    """
+
+    def __init__(self, width):
+        self._width = width
+        self._base = [0] * width
+        self._cells = {}  # id(cell) -> cell
+        # Finalizers can run at any allocation, so they only enqueue
+        self._retired = queue.SimpleQueue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0] * self._width
+            token = _ThreadToken()
+            weakref.finalize(token, self._retired.put, cell)
+            with self._lock:
+                self._fold()
+                self._cells[id(cell)] = cell
+            self._local.token = token
+            self._local.cell = cell
+            return cell
+
+    def _fold(self):
+        base = self._base
+        while True:
+            try:
+                cell = self._retired.get_nowait()
+            except queue.Empty:
+                return
+            del self._cells[id(cell)]
+            for i, value in enumerate(cell):
+                base[i] += value
+
+    def totals(self):
+        with self._lock:
+            self._fold()
+            cells = [self._base, *self._cells.values()]
+        return [sum(values) for values in zip(*cells)]
+
+    def __len__(self):
+        """Live cells, for tests and debugging"""
+        with self._lock:
+            self._fold()
+            return len(self._cells)
+
+
+class _CounterChild:
+    __slots__ = ('_value',)
+
+    def __init__(self):
+        self._value = _ShardedValue(1)
+
+    def inc(self, amount=1):
+        self._value.cell()[0] += amount
+
+    def get(self):
+        return self._value.totals()[0]
+
+
+class _HistogramChild:
+    __slots__ = ('_bounds', '_value')
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        # One slot per bucket, one for +Inf, then the running sum
+        self._value = _ShardedValue(len(bounds) + 2)
+
+    def observe(self, amount):
+        cell = self._value.cell()
+        cell[bisect.bisect_left(self._bounds, amount)] += 1
+        cell[-1] += amount
+
+    def get(self):
+        return self._value.totals()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Return the child for a label combination, creating it on first use"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def collect(self):
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            lines.append(f'{self.name}{self._label_text(values)} {child.get()}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, amount):
+        self.labels().observe(amount)
+
+    def collect(self):
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            totals = child.get()
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), totals):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self._label_text(values, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{self._label_text(values)} {totals[-1]}')
+            lines.append(f'{self.name}_count{self._label_text(values)} {cumulative}')
+        return lines
+
+
+class GaugeCallback(_Metric):
+    """Gauge (or counter) whose samples are computed at scrape time
+
+    callback returns a number, or an iterable of (label values, number).
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=(), kind='gauge'):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def collect(self):
+        lines = self.header()
+        result = self.callback()
+        samples = [((), result)] if isinstance(result, (int, float)) else result
+        for values, value in samples:
+            lines.append(f'{self.name}{self._label_text(values)} {value}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def gauge_callback(self, *args, **kwargs):
+        return self.register(GaugeCallback(*args, **kwargs))
+
+    def exposition(self):
+        """Render every metric in the Prometheus text format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReadDeduplicator:
+    """Drop repeated chip reads before they reach the displays
+
+    A read is a duplicate if the same bib was already accepted at the same
+    location within `window` seconds. Reads a timing box replays after
+    reconnecting are caught earlier by their sequence numbers (see
+    sequence_tracker). The table is ordered oldest first, so expired entries
+    are evicted from the front, and it is capped at `max_keys`.
+    """
+
+    def __init__(self, window=10.0, max_keys=50000, clock=time.monotonic):
+        self.window = window
+        self.max_keys = max_keys
+        self.clock = clock
+        self._accepted = OrderedDict()   # (bib, location) -> time accepted
+        self._lock = threading.Lock()
+        self.stats = {
+            'accepted': 0,
+            'duplicate_window': 0,
+            'evicted': 0
+        }
+
+    def accept(self, bib, location, now=None):
+        """Return True if the read should be shown, recording it if so"""
+        if now is None:
+            now = self.clock()
+        stats = self.stats
+        with self._lock:
+            self._expire(now)
+            key = (bib, location)
+            last = self._accepted.get(key)
+            if last is not None and now - last < self.window:
+                stats['duplicate_window'] += 1
+                return False
+
+            self._accepted[key] = now
+            self._accepted.move_to_end(key)
+            if len(self._accepted) > self.max_keys:
+                self._accepted.popitem(last=False)
+                stats['evicted'] += 1
+            stats['accepted'] += 1
+            return True
+
+    def seed(self, bib, location, now=None, accepted=True):
+        """Record an earlier read without counting it, e.g. when replaying a journal"""
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            if accepted:
+                key = (bib, location)
+                self._accepted[key] = now
+                self._accepted.move_to_end(key)
+                if len(self._accepted) > self.max_keys:
+                    self._accepted.popitem(last=False)
+
+    def _expire(self, now):
+        accepted = self._accepted
+        while accepted:
+            key, seen = next(iter(accepted.items()))
+            if now - seen < self.window:
+                break
+            del accepted[key]
+
+    def reset(self):
+        with self._lock:
+            self._accepted.clear()
+
+    def __len__(self):
+        return len(self._accepted)
@@ -0,0 +1,194 @@
+import bisect
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+
+journal_log = logging.getLogger('race_display.journal')
+
+# Read outcomes recorded with each line
+ACCEPTED = 'a'
+DUPLICATE = 'd'
+UNKNOWN_BIB = 'u'
+INVALID = 'p'
+GUN = 'g'
+ERROR = 'e'
+
+# Index entries are (arrival time, byte offset) pairs
+INDEX_ENTRY = struct.Struct('<dQ')
+
+
+class ReadJournal:
+    """Append-only log of every timing line, written by a background thread
+
+    append() only queues the record. The writer thread takes everything that
+    has queued up, writes it, and fsyncs once per batch (group commit), so
+    ingest never waits on the disk and a burst of reads costs one fsync.
+
+    Each record is a JSON array line: [arrival epoch seconds, source, raw
+    line, outcome, resolved bib]. Segments are `<n>.log` in the journal
+    directory, rotated by size or age, and a new one is started on every
+    open so a torn last line after a crash is never appended to. Each segment
+    has an `.idx` sidecar of fixed-size (time, offset) entries written every
+    `index_every` records, which scan() uses to seek to a time range.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 2**20, rotate_seconds=3600,
+                 index_every=128, max_batch=1000, fsync=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.rotate_seconds = rotate_seconds
+        self.index_every = index_every
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.stats = {'written': 0, 'batches': 0, 'segments': 0}
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._log = None
+        self._index = None
+        self._opened_at = 0
+        self._since_index = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, arrival, source, line, outcome, bib=None):
+        """Queue one read for the writer; never blocks"""
+        self._queue.put((arrival, source, line, outcome, bib))
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def segments(self):
+        """Segment numbers present on disk, oldest first"""
+        numbers = []
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext == '.log' and stem.isdigit():
+                numbers.append(int(stem))
+        return sorted(numbers)
+
+    def _path(self, number, ext='.log'):
+        return os.path.join(self.directory, f'{number:08d}{ext}')
+
+    def _rotate(self):
+        self._close_segment()
+        existing = self.segments()
+        number = existing[-1] + 1 if existing else 1
+        self._log = open(self._path(number), 'ab')
+        self._index = open(self._path(number, '.idx'), 'ab')
+        self._opened_at = time.monotonic()
+        self._since_index = 0
+        self.stats['segments'] += 1
+
+    def _close_segment(self):
+        for fp in (self._log, self._index):
+            if fp is not None:
+                fp.flush()
+                if self.fsync:
+                    os.fsync(fp.fileno())
+                fp.close()
+        self._log = self._index = None
+
+    def _write_batch(self, batch):
+        if (self._log is None or self._log.tell() >= self.segment_bytes
+                or time.monotonic() - self._opened_at >= self.rotate_seconds):
+            self._rotate()
+        log = self._log
+        for record in batch:
+            if self._since_index == 0:
+                self._index.write(INDEX_ENTRY.pack(record[0], log.tell()))
+            self._since_index = (self._since_index + 1) % self.index_every
+            log.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+        log.flush()
+        self._index.flush()
+        if self.fsync:
+            os.fsync(log.fileno())
+        self.stats['written'] += len(batch)
+        self.stats['batches'] += 1
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            batch = [record]
+            stop = False
+            # Everything that queued up while the last batch was being synced
+            while len(batch) < self.max_batch:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            try:
+                self._write_batch(batch)
+            except OSError as e:
+                journal_log.error("Journal write failed, %d reads not saved: %s", len(batch), e)
+            if stop:
+                break
+        self._close_segment()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name='read-journal')
+        self._thread.start()
+        return self
+
+    def close(self, timeout=5):
+        """Write out everything queued and close the current segment"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _read_index(self, number):
+        try:
+            with open(self._path(number, '.idx'), 'rb') as fp:
+                data = fp.read()
+        except FileNotFoundError:
+            return []
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        return list(INDEX_ENTRY.iter_unpack(data[:usable]))
+
+    def _records(self, number, offset=0):
+        with open(self._path(number), 'rb') as fp:
+            fp.seek(offset)
+            for raw in fp:
+                try:
+                    yield json.loads(raw)
+                except ValueError:
+                    # Torn write from a crash; nothing after it in this segment
+                    journal_log.warning("Skipping damaged journal record in segment %d", number)
+                    return
+
+    def replay(self):
+        """Yield every record on disk, oldest first"""
+        for number in self.segments():
+            yield from self._records(number)
+
+    def scan(self, start=None, end=None):
+        """Yield records whose arrival time is within [start, end]"""
+        numbers = self.segments()
+        indexes = [self._read_index(number) for number in numbers]
+        for position, number in enumerate(numbers):
+            index = indexes[position]
+            if start is not None:
+                # Skip segments that end before the range starts
+                following = next((idx[0][0] for idx in indexes[position + 1:] if idx), None)
+                if following is not None and following < start:
+                    continue
+            offset = 0
+            if start is not None and index:
+                at = bisect.bisect_right(index, (start, float('inf'))) - 1
+                if at > 0:
+                    offset = index[at][1]
+            for record in self._records(number, offset):
+                arrival = record[0]
+                if end is not None and arrival > end:
+                    return
+                if start is None or arrival >= start:
+                    yield record
@@ -0,0 +1,225 @@
+import argparse
+import http.client
+import json
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+
+def load_capture(path, readers=1):
+    """Read a capture file into {reader: [(arrival, line), ...]}
+
+    Each line is `arrival<TAB>raw line` or `arrival<TAB>reader<TAB>raw line`,
+    with arrival in epoch seconds. Without a reader column lines are spread
+    over `readers` simulated readers by timing location.
+    """
+    streams = defaultdict(list)
+    with open(path, 'r', encoding='utf-8') as fp:
+        for row in fp:
+            row = row.rstrip('\r\n')
+            if not row or row.startswith('#'):
+                continue
+            fields = row.split('\t')
+            if len(fields) >= 3:
+                arrival, reader, line = fields[0], fields[1], fields[2]
+            else:
+                arrival, line = fields[0], fields[1]
+                parts = line.split('~')
+                location = parts[2] if len(parts) > 2 else ''
+                reader = f'reader{zlib.crc32(location.encode()) % readers + 1}'
+            streams[reader].append((float(arrival), line))
+    for lines in streams.values():
+        lines.sort(key=lambda item: item[0])
+    return streams
+
+
+def generate_capture(path, reads, rate, bibs, locations):
+    """Write a synthetic capture with `reads` lines arriving at `rate` per second"""
+    start = time.time()
+    sequences = defaultdict(int)
+    with open(path, 'w', encoding='utf-8') as fp:
+        for i in range(reads):
+            arrival = start + i / rate
+            location = random.choice(locations)
+            sequences[location] += 1
+            clock = time.strftime('%H:%M:%S', time.localtime(arrival)) + f'.{int(arrival % 1 * 100):02d}'
+            bib = random.randint(1, bibs)
+            fp.write(f"{arrival:.3f}\tCT01_33~{sequences[location]}~{location}~{bib}~{clock}~0~TAG{bib}~1\n")
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ReplayReader(threading.Thread):
+    """One simulated timing box: handshake, then paced writes of its lines"""
+
+    def __init__(self, name, lines, host, port, speed, start_at, sent):
+        super().__init__(daemon=True, name=name)
+        self.lines = lines
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.start_at = start_at
+        self.sent = sent
+        self.written = 0
+        self.first_write = None
+        self.last_write = None
+        self.error = None
+
+    def handshake(self, sock, rfile):
+        sock.sendall(f"{self.name}~1.0~CTP01\r\n".encode())
+        header = rfile.readline().decode().strip()
+        settings = int(header.split('~')[2])
+        for _ in range(settings):
+            rfile.readline()
+            sock.sendall(b"ack~init\r\n")
+        # geteventinfo, getlocations, start
+        for _ in range(3):
+            rfile.readline()
+
+    def run(self):
+        try:
+            with socket.create_connection((self.host, self.port)) as sock:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                rfile = sock.makefile('rb')
+                self.handshake(sock, rfile)
+                first = self.lines[0][0]
+                for arrival, line in self.lines:
+                    if self.speed:
+                        delay = self.start_at + (arrival - first) / self.speed - time.time()
+                        if delay > 0:
+                            time.sleep(delay)
+                    parts = line.split('~')
+                    if len(parts) >= 5:
+                        self.sent[(parts[3], parts[4])] = time.perf_counter()
+                    sock.sendall((line + '\r\n').encode())
+                    self.last_write = time.perf_counter()
+                    if self.first_write is None:
+                        self.first_write = self.last_write
+                    self.written += 1
+                # Give the server a moment before the connection closes
+                time.sleep(0.5)
+        except Exception as e:
+            self.error = e
+
+
+class StreamWatcher(threading.Thread):
+    """Subscribe to /stream and time when each read is delivered"""
+
+    def __init__(self, host, port):
+        super().__init__(daemon=True, name='sse-watcher')
+        self.host = host
+        self.port = port
+        self.delivered = {}
+        self.ready = threading.Event()
+
+    def run(self):
+        conn = http.client.HTTPConnection(self.host, self.port)
+        try:
+            conn.request('GET', '/stream', headers={'Accept': 'text/event-stream'})
+            response = conn.getresponse()
+        except OSError:
+            return
+        self.ready.set()
+        while True:
+            line = response.readline()
+            if not line:
+                return
+            if not line.startswith(b'data:'):
+                continue
+            received = time.perf_counter()
+            data = json.loads(line[5:])
+            for runner in data.get('runners', [data]):
+                if 'bib' in runner:
+                    self.delivered.setdefault((runner['bib'], runner.get('timestamp')), received)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded CT01_33 capture against the timing port')
+    parser.add_argument('capture', help='capture file (arrival<TAB>[reader<TAB>]line)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=61611, help='timing port')
+    parser.add_argument('--web-port', type=int, default=5000, help='Flask port serving /stream')
+    parser.add_argument('--speed', type=float, default=1.0, help='time compression, 1 = real time')
+    parser.add_argument('--max', action='store_true', help='send as fast as possible')
+    parser.add_argument('--readers', type=int, default=1, help='readers to spread an untagged capture over')
+    parser.add_argument('--no-latency', action='store_true', help='do not subscribe to /stream')
+    parser.add_argument('--json', help='also write the report to this file')
+    parser.add_argument('--generate', type=int, metavar='READS',
+                        help='write a synthetic capture of READS lines to the capture path and exit')
+    parser.add_argument('--rate', type=float, default=20.0, help='reads per second for --generate')
+    parser.add_argument('--bibs', type=int, default=1000, help='bib range for --generate')
+    parser.add_argument('--locations', default='start,split1,finish', help='locations for --generate')
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_capture(args.capture, args.generate, args.rate, args.bibs, args.locations.split(','))
+        print(f"Wrote {args.generate} reads to {args.capture}")
+        return
+
+    streams = load_capture(args.capture, args.readers)
+    total = sum(len(lines) for lines in streams.values())
+    speed = 0 if args.max else args.speed
+    print(f"Replaying {total} reads from {len(streams)} readers "
+          f"({'max throughput' if args.max else f'{args.speed}x'})")
+
+    watcher = None
+    if not args.no_latency:
+        watcher = StreamWatcher(args.host, args.web_port)
+        watcher.start()
+        if not watcher.ready.wait(5):
+            sys.exit(f"Could not subscribe to http://{args.host}:{args.web_port}/stream")
+
+    # Unique reader names so the server doesn't treat a second run as a replay
+    run_id = f"{int(time.time()) % 100000}"
+    sent = {}
+    start_at = time.time() + 0.5
+    readers = [ReplayReader(f"{name}-{run_id}", lines, args.host, args.port, speed, start_at, sent)
+               for name, lines in sorted(streams.items())]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    writes = [reader for reader in readers if reader.first_write is not None]
+    elapsed = (max(r.last_write for r in writes) - min(r.first_write for r in writes)) if writes else 0
+    if watcher:
+        time.sleep(1.0)
+
+    written = sum(reader.written for reader in readers)
+    report = {
+        'reads_sent': written,
+        'readers': len(readers),
+        'elapsed_s': round(elapsed, 3),
+        'send_rate': round(written / elapsed, 1) if elapsed else None,
+        'errors': [f"{reader.name}: {reader.error}" for reader in readers if reader.error],
+    }
+    if watcher:
+        latencies = [(watcher.delivered[key] - at) * 1000 for key, at in sent.items() if key in watcher.delivered]
+        report.update({
+            'delivered': len(latencies),
+            'latency_ms': {
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p99': percentile(latencies, 99),
+                'max': max(latencies) if latencies else None,
+                'mean': statistics.fmean(latencies) if latencies else None,
+            }
+        })
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
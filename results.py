@@ -0,0 +1,320 @@
+import bisect
+import threading
+from contextlib import contextmanager
+
+DAY = 24 * 60 * 60
+
+# Sent on on_leaderboard when versions start over; screens reload the boards
+LEADERBOARD_RESET = {'type': 'leaderboard_reset'}
+
+
+def clock_seconds(text):
+    """Seconds since midnight for a reader time like 14:02:15.31, or None"""
+    try:
+        parts = [float(part) for part in text.split(':')]
+    except (AttributeError, ValueError):
+        return None
+    if not 1 <= len(parts) <= 3:
+        return None
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds
+
+
+def format_duration(seconds):
+    """H:MM:SS, or M:SS under an hour"""
+    if seconds is None:
+        return ''
+    whole = int(seconds)
+    hours, rest = divmod(whole, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{secs:02d}'
+    return f'{minutes}:{secs:02d}'
+
+
+class RunnerResult:
+    """Everything the engine knows about one runner's race"""
+
+    __slots__ = ('bib', 'name', 'race', 'gender', 'division', 'start', 'gun', 'splits')
+
+    def __init__(self, bib, name, race, gender, division):
+        self.bib = bib
+        self.name = name
+        self.race = race
+        self.gender = gender
+        self.division = division
+        self.start = None
+        self.gun = None
+        # location key -> (clock seconds, gun elapsed, chip elapsed)
+        self.splits = {}
+
+
+class ResultsEngine:
+    """Split times, pace and placements computed as reads arrive
+
+    Each (race, location, category) keeps a list of (ranked elapsed, bib)
+    kept sorted by bisect insertion, so a runner's place is a bisect and the top of a
+    category is a slice; nobody is re-sorted when a read comes in. Categories
+    are 'overall', 'gender:<g>' and 'division:<d>'.
+
+    Gun times come from guntime reads: a runner is timed from the last gun
+    at or before their first start-mat read (or their crossing, if they never
+    crossed the start mat), which handles wave starts. Chip time runs from the
+    start-mat read and falls back to gun time. Places rank by `rank_by`.
+
+    When a crossing lands in the top `board_size` of a category,
+    `on_leaderboard` is called with a delta: insert `row` at `place`, move
+    the rows below down one place and keep the first `size` rows. Each board's `version` goes up with every
+    delta, so a client holding a leaderboard() snapshot can skip deltas it
+    already has. Versions start over on reset(), which sends LEADERBOARD_RESET
+    so clients drop their boards and load them again. Inside quiet(), e.g.
+    while rebuilding from a journal, no deltas are sent and LEADERBOARD_RESET
+    follows at the end.
+
+    `on_change`, if set, is called under the lock with every read that adds
+    a start or split, every new gun and every reset, as a JSON-able list.
+    Repeat crossings change nothing and are not passed on, so the changes
+    since the last reset are at most one per runner and split. Another
+    engine given the same changes in the same order through apply() ends up
+    identical, versions included, which is how web workers mirror the ingest
+    process's results.
+    """
+
+    def __init__(self, start_locations=('start',), finish_locations=('finish',),
+                 rank_by='chip', distances=None, unit='mi', board_size=10, on_leaderboard=None,
+                 on_change=None):
+        self.start_locations = frozenset(loc.lower() for loc in start_locations)
+        self.finish_locations = frozenset(loc.lower() for loc in finish_locations)
+        self.rank_by = rank_by
+        self.distances = dict(distances or {})
+        self.unit = unit
+        self.board_size = board_size
+        self.on_leaderboard = on_leaderboard
+        self.on_change = on_change
+        self._guns = []
+        self._runners = {}
+        self._standings = {}
+        self._versions = {}
+        self._quiet = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._guns = []
+            self._runners = {}
+            self._standings = {}
+            self._versions = {}
+            if self.on_change is not None:
+                self.on_change(['reset'])
+            if self.on_leaderboard is not None and not self._quiet:
+                self.on_leaderboard(LEADERBOARD_RESET)
+
+    @contextmanager
+    def quiet(self):
+        """Hold back leaderboard deltas, then tell clients to reload the boards"""
+        with self._lock:
+            self._quiet += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._quiet -= 1
+                if self.on_leaderboard is not None and not self._quiet:
+                    self.on_leaderboard(LEADERBOARD_RESET)
+
+    def apply(self, change):
+        """Replay a change another engine passed to its on_change"""
+        kind = change[0]
+        if kind == 'read':
+            self.record(*change[1:])
+        elif kind == 'gun':
+            self.record_gun(change[1])
+        elif kind == 'reset':
+            self.reset()
+
+    def record_gun(self, time_text):
+        seconds = clock_seconds(time_text)
+        if seconds is None:
+            return
+        with self._lock:
+            if seconds not in self._guns:
+                if self.on_change is not None:
+                    self.on_change(['gun', time_text])
+                bisect.insort(self._guns, seconds)
+
+    def _gun_for(self, reference):
+        index = bisect.bisect_right(self._guns, reference) - 1
+        return self._guns[index] if index >= 0 else None
+
+    @staticmethod
+    def _elapsed(at, since):
+        if since is None:
+            return None
+        # Reader clocks are time of day; a race can run past midnight
+        return (at - since) % DAY
+
+    def categories(self, result):
+        return (
+            'overall',
+            f'gender:{result.gender}',
+            f'division:{result.division}',
+        )
+
+    def record(self, bib, runner, location, time_text, lap='1'):
+        """Add a crossing and return the fields it adds to the display payload"""
+        seconds = clock_seconds(time_text)
+        if seconds is None:
+            return {}
+        location_key = location.lower()
+        with self._lock:
+            result = self._runners.get(bib)
+            if result is None:
+                result = self._runners[bib] = RunnerResult(
+                    bib, runner.get('name', ''), runner.get('race_name', ''),
+                    runner.get('gender', ''), runner.get('division', ''))
+            if location_key in self.start_locations:
+                if result.start is None:
+                    self._changed(bib, runner, location, time_text, lap)
+                    result.start = seconds
+                    result.gun = self._gun_for(seconds)
+                return {}
+            if lap and lap not in ('0', '1'):
+                location_key = f'{location_key}#{lap}'
+            if location_key not in result.splits:
+                self._changed(bib, runner, location, time_text, lap)
+                gun = result.gun if result.gun is not None else self._gun_for(seconds)
+                gun_elapsed = self._elapsed(seconds, gun)
+                chip_elapsed = self._elapsed(seconds, result.start) if result.start is not None else gun_elapsed
+                result.splits[location_key] = (seconds, gun_elapsed, chip_elapsed)
+                ranked = self._ranked(gun_elapsed, chip_elapsed)
+                if ranked is not None:
+                    for category in self.categories(result):
+                        board = (result.race, location_key, category)
+                        standings = self._standings.setdefault(board, [])
+                        index = bisect.bisect_left(standings, (ranked, bib))
+                        standings.insert(index, (ranked, bib))
+                        if index < self.board_size:
+                            delta = self._delta(board, index, result)
+                            if self.on_leaderboard is not None and not self._quiet:
+                                # Sent under the lock so each board's deltas go out in
+                                # version order; the callback must not block
+                                self.on_leaderboard(delta)
+            return self._split_fields(result, location_key)
+
+    def _changed(self, bib, runner, location, time_text, lap):
+        if self.on_change is not None:
+            runner_fields = {field: runner.get(field, '') for field in ('name', 'race_name', 'gender', 'division')}
+            self.on_change(['read', bib, runner_fields, location, time_text, lap])
+
+    def _board_row(self, result, location_key, place):
+        _, gun_elapsed, chip_elapsed = result.splits[location_key]
+        return {
+            'place': place,
+            'bib': result.bib,
+            'name': result.name,
+            'gender': result.gender,
+            'division': result.division,
+            'gun_time': format_duration(gun_elapsed),
+            'chip_time': format_duration(chip_elapsed),
+        }
+
+    def _delta(self, board, index, result):
+        version = self._versions[board] = self._versions.get(board, 0) + 1
+        race, location_key, category = board
+        return {
+            'type': 'leaderboard',
+            'race_name': race,
+            'location': location_key,
+            'category': category,
+            'version': version,
+            'place': index + 1,
+            'size': self.board_size,
+            'row': self._board_row(result, location_key, index + 1),
+        }
+
+    def leaderboard(self, race, location, category='overall', limit=None):
+        """The current top of one board, read straight off its sorted list"""
+        board = (race, location.lower(), category)
+        limit = limit or self.board_size
+        with self._lock:
+            standings = self._standings.get(board, ())
+            leaders = [
+                self._board_row(self._runners[bib], board[1], place)
+                for place, (_, bib) in enumerate(standings[:limit], 1)
+            ]
+            return {
+                'race_name': race,
+                'location': board[1],
+                'category': category,
+                'version': self._versions.get(board, 0),
+                'total': len(standings),
+                'leaders': leaders,
+            }
+
+    def _ranked(self, gun_elapsed, chip_elapsed):
+        if self.rank_by == 'gun' and gun_elapsed is not None:
+            return gun_elapsed
+        return chip_elapsed
+
+    def _place(self, result, location_key, category, ranked):
+        standings = self._standings.get((result.race, location_key, category), ())
+        return bisect.bisect_left(standings, (ranked, result.bib)) + 1, len(standings)
+
+    def _split_fields(self, result, location_key):
+        _, gun_elapsed, chip_elapsed = result.splits[location_key]
+        fields = {
+            'gun_time': format_duration(gun_elapsed),
+            'chip_time': format_duration(chip_elapsed),
+        }
+        base = location_key.partition('#')[0]
+        distance = self.distances.get(result.race)
+        if distance and base in self.finish_locations and chip_elapsed is not None:
+            fields['pace'] = f'{format_duration(chip_elapsed / distance)}/{self.unit}'
+        ranked = self._ranked(gun_elapsed, chip_elapsed)
+        if ranked is not None:
+            for name, category in zip(('overall', 'gender', 'division'), self.categories(result)):
+                place, total = self._place(result, location_key, category, ranked)
+                fields[f'place_{name}'] = place
+                fields[f'{name}_count'] = total
+        return fields
+
+    def result(self, bib):
+        """Every crossing for one runner with current places, or None"""
+        with self._lock:
+            result = self._runners.get(bib)
+            if result is None:
+                return None
+            return {
+                'bib': bib,
+                'race_name': result.race,
+                'gender': result.gender,
+                'division': result.division,
+                'splits': {key: self._split_fields(result, key) for key in result.splits},
+            }
+
+    def standings(self, race, location, category='overall', offset=0, limit=25):
+        """A page of one category's standings, fastest first"""
+        key = (race, location.lower(), category)
+        with self._lock:
+            page = self._standings.get(key, [])[offset:offset + limit]
+            total = len(self._standings.get(key, ()))
+            rows = []
+            for place, (_, bib) in enumerate(page, offset + 1):
+                fields = self._split_fields(self._runners[bib], key[1])
+                fields.update(bib=bib, place=place)
+                rows.append(fields)
+        return {'race_name': race, 'location': key[1], 'category': category, 'total': total, 'results': rows}
+
+    def races(self):
+        """{race: [locations with results]} for building queries"""
+        with self._lock:
+            races = {}
+            for race, location, category in self._standings:
+                if category == 'overall':
+                    races.setdefault(race, []).append(location)
+        return races
+
+    def __len__(self):
+        return len(self._runners)
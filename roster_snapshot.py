@@ -0,0 +1,178 @@
+import json
+import mmap
+import os
+import struct
+
+from roster_table import RUNNER_FIELDS, normalize_bib, normalize_tag
+
+# magic, rows, keys, offset of the key section, length of the field list
+HEADER = struct.Struct('<8sIIQI')
+MAGIC = b'RDROST01'
+OFFSET = struct.Struct('<Q')
+SPAN = struct.Struct('<QQ')
+ROW = struct.Struct('<I')
+
+# Lookup keys are a kind byte followed by the value, mirroring RosterTable.resolve()
+BIB, TAG, ENTRY, NORMALIZED = b'b', b't', b'e', b'n'
+
+
+def write_roster_snapshot(path, table):
+    """Write a RosterTable where MappedRoster can open it without parsing it
+
+    Layout: header, the field names as JSON, row offsets (rows + 1), rows as
+    JSON [bib, value, ...] in field order, key offsets (keys + 1), the row
+    number of each key, then the sorted keys.
+    The file is written beside `path` and renamed over it, so a worker that
+    already has the old file mapped keeps reading a consistent copy.
+    """
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    fields = encode(RUNNER_FIELDS).encode('utf-8')
+    rows = []
+    keys = {}
+    for bib, runner in table.items():
+        record = runner.payload(RUNNER_FIELDS)
+        row = len(rows)
+        rows.append(encode([bib, *record.values()]).encode('utf-8'))
+        keys[BIB + bib.encode('utf-8')] = row
+        if record.get('tag'):
+            keys[TAG + normalize_tag(record['tag']).encode('utf-8')] = row
+        if record.get('entry_id') and record['entry_id'] != bib:
+            keys[ENTRY + record['entry_id'].encode('utf-8')] = row
+        normalized = normalize_bib(bib)
+        if normalized != bib:
+            keys[NORMALIZED + normalized.encode('utf-8')] = row
+    ordered = sorted(keys)
+
+    keys_at = HEADER.size + len(fields) + OFFSET.size * (len(rows) + 1) + sum(map(len, rows))
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, len(rows), len(ordered), keys_at, len(fields)))
+        fp.write(fields)
+        offset = 0
+        for data in rows:
+            fp.write(OFFSET.pack(offset))
+            offset += len(data)
+        fp.write(OFFSET.pack(offset))
+        fp.writelines(rows)
+        offset = 0
+        for key in ordered:
+            fp.write(OFFSET.pack(offset))
+            offset += len(key)
+        fp.write(OFFSET.pack(offset))
+        fp.writelines(ROW.pack(keys[key]) for key in ordered)
+        fp.writelines(ordered)
+    os.replace(tmp, path)
+    return len(rows)
+
+
+class _Mapped:
+    """One mapped snapshot file; replaced as a whole when the file changes"""
+
+    __slots__ = ('map', 'identity', 'fields', 'rows', 'keys', 'offsets_at', 'rows_at',
+                 'keys_at', 'key_rows_at', 'key_blob_at')
+
+    def __init__(self, fp, identity):
+        self.identity = identity
+        self.map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.rows, self.keys, self.keys_at, fields_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError("Not a roster snapshot")
+        self.offsets_at = HEADER.size + fields_size
+        self.fields = tuple(json.loads(self.map[HEADER.size:self.offsets_at]))
+        self.rows_at = self.offsets_at + OFFSET.size * (self.rows + 1)
+        self.key_rows_at = self.keys_at + OFFSET.size * (self.keys + 1)
+        self.key_blob_at = self.key_rows_at + ROW.size * self.keys
+
+    def row(self, number):
+        """(bib, record) for a row number"""
+        start, end = SPAN.unpack_from(self.map, self.offsets_at + OFFSET.size * number)
+        bib, *values = json.loads(self.map[self.rows_at + start:self.rows_at + end])
+        return bib, dict(zip(self.fields, values))
+
+    def find(self, key):
+        """Row number for a lookup key, by binary search over the mapped keys"""
+        data = self.map
+        lo, hi = 0, self.keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end = SPAN.unpack_from(data, self.keys_at + OFFSET.size * mid)
+            if data[self.key_blob_at + start:self.key_blob_at + end] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.keys:
+            start, end = SPAN.unpack_from(data, self.keys_at + OFFSET.size * lo)
+            if data[self.key_blob_at + start:self.key_blob_at + end] == key:
+                return ROW.unpack_from(data, self.key_rows_at + ROW.size * lo)[0]
+        return None
+
+
+class MappedRoster:
+    """Read-only roster for web workers, backed by an mmap'd snapshot
+
+    Opening it costs a stat and an mmap however big the roster is; pages are
+    read from the OS page cache, which every worker shares, as runners are
+    looked up. refresh() maps the file again if the ingest process has
+    replaced it. Lookups match RosterTable.resolve() and return plain dicts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mapped = None
+        self.refresh()
+
+    def refresh(self):
+        """Pick up a new snapshot file; returns True if it changed"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            changed = self._mapped is not None
+            self._mapped = None
+            return changed
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._mapped is not None and self._mapped.identity == identity:
+            return False
+        with open(self.path, 'rb') as fp:
+            # The old mapping is left for the garbage collector so a
+            # lookup still using it isn't cut off
+            self._mapped = _Mapped(fp, identity)
+        return True
+
+    def _lookup(self, kind, value):
+        mapped = self._mapped
+        if mapped is None:
+            return None
+        row = mapped.find(kind + value.encode('utf-8'))
+        return None if row is None else mapped.row(row)
+
+    def resolve(self, bib, tag=None):
+        found = None
+        if tag:
+            found = self._lookup(TAG, tag)
+        if found is None:
+            found = self._lookup(BIB, bib) or self._lookup(ENTRY, bib)
+        if found is None:
+            normalized = normalize_bib(bib)
+            found = self._lookup(NORMALIZED, normalized) or self._lookup(BIB, normalized)
+        return found or (None, None)
+
+    def get(self, bib, default=None):
+        found = self._lookup(BIB, bib)
+        return default if found is None else found[1]
+
+    def __getitem__(self, bib):
+        found = self._lookup(BIB, bib)
+        if found is None:
+            raise KeyError(bib)
+        return found[1]
+
+    def __contains__(self, bib):
+        return self._lookup(BIB, bib) is not None
+
+    def __len__(self):
+        return self._mapped.rows if self._mapped is not None else 0
+
+    def items(self):
+        mapped = self._mapped
+        for number in range(mapped.rows if mapped is not None else 0):
+            yield mapped.row(number)
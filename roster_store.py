@@ -0,0 +1,96 @@
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('race_display.roster')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    race_name TEXT,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    event_id TEXT NOT NULL,
+    bib TEXT NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (event_id, bib)
+) WITHOUT ROWID;
+"""
+
+
+class RosterStore:
+    """SQLite snapshot of parsed rosters keyed by event_id"""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection that commits on success and is always closed"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save_roster(self, event_id, roster, race_name=None, synced_at=None):
+        """Replace the stored roster for an event with a full download"""
+        rows = [(event_id, bib, json.dumps(dict(record), separators=(',', ':')))
+                for bib, record in roster.items()]
+        with self._connect() as conn:
+            conn.execute('DELETE FROM entries WHERE event_id = ?', (event_id,))
+            conn.executemany('INSERT INTO entries VALUES (?, ?, ?)', rows)
+            conn.execute(
+                'INSERT OR REPLACE INTO events VALUES (?, ?, ?)',
+                (event_id, race_name, synced_at or time.time())
+            )
+        logger.info("Saved %d roster entries for event %s", len(rows), event_id)
+
+    def apply_changes(self, event_id, changed, removed=(), synced_at=None):
+        """Upsert changed records and drop bibs that no longer exist"""
+        with self._connect() as conn:
+            conn.executemany(
+                'DELETE FROM entries WHERE event_id = ? AND bib = ?',
+                [(event_id, bib) for bib in removed]
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                [(event_id, bib, json.dumps(dict(record), separators=(',', ':')))
+                 for bib, record in changed.items()]
+            )
+            conn.execute(
+                'UPDATE events SET synced_at = ? WHERE event_id = ?',
+                (synced_at or time.time(), event_id)
+            )
+
+    def load_roster(self, event_id):
+        """Return (roster, race_name, synced_at) or None if nothing is stored"""
+        with self._connect() as conn:
+            event = conn.execute(
+                'SELECT race_name, synced_at FROM events WHERE event_id = ?', (event_id,)
+            ).fetchone()
+            if event is None:
+                return None
+            loads = json.loads
+            roster = {
+                bib: loads(record) for bib, record in conn.execute(
+                    'SELECT bib, record FROM entries WHERE event_id = ?', (event_id,)
+                )
+            }
+        return roster, event[0], event[1]
+
+    def last_event_id(self):
+        """Return the most recently synced event, if any"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT event_id FROM events ORDER BY synced_at DESC LIMIT 1'
+            ).fetchone()
+        return row[0] if row else None
@@ -0,0 +1,147 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIRST_NAMES = ['Alex', 'Jordan', 'Sam', 'Taylor', 'Casey', 'Riley', 'Morgan', 'Jamie', 'Avery', 'Quinn']
+LAST_NAMES = ['Smith', 'Garcia', 'Nguyen', 'Johnson', 'Brown', 'Lee', 'Martin', 'Clark', 'Lopez', 'Walker']
+CITIES = [('Boston', 'MA'), ('Denver', 'CO'), ('Austin', 'TX'), ('Portland', 'OR'), ('Chicago', 'IL')]
+RACES = ['Marathon', 'Half Marathon', '10K']
+WAVES = ['Wave A', 'Wave B', 'Wave C']
+
+
+def make_entry(index, rng):
+    """Build one synthetic entry shaped like the ChronoTrack entry API"""
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES)
+    city, state = rng.choice(CITIES)
+    age = rng.randint(18, 75)
+    sex = rng.choice('MF')
+    low = age // 5 * 5
+    return {
+        'entry_id': str(100000 + index),
+        'entry_bib': str(index + 1),
+        'entry_name': f'{first} {last}',
+        'athlete_id': str(500000 + index),
+        'athlete_first_name': first,
+        'athlete_last_name': last,
+        'entry_race_age': str(age),
+        'athlete_sex': sex,
+        'location_city': city,
+        'location_region': state,
+        'location_country': 'USA',
+        'bracket_name': f'{sex}{low}-{low + 4}',
+        'race_name': rng.choice(RACES),
+        'reg_choice_name': 'Open',
+        'wave_name': rng.choice(WAVES),
+        'team_name': '',
+        'entry_status': 'ACTIVE',
+        'entry_type': 'ENTRY',
+        'entry_tag': f'TAG{index + 1}',
+        'entry_modified': time.time(),
+    }
+
+
+def make_roster(entries, seed=1):
+    rng = random.Random(seed)
+    return [make_entry(i, rng) for i in range(entries)]
+
+
+def touch_entry(entry, **changes):
+    """Modify an entry in place so it shows up in modified_after queries"""
+    entry.update(changes)
+    entry['entry_modified'] = time.time()
+
+
+def make_handler(roster, latency=0.0, failure_rate=0.0, failing_pages=(), malformed_pages=(), requested=None):
+    """Create a request handler serving roster pages with artificial latency
+
+    Pages in failing_pages always answer 503 and pages in malformed_pages
+    answer 200 with a body that isn't JSON. Every page asked for is appended
+    to `requested` if given.
+    """
+
+    class RosterHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if not url.path.endswith('/entry'):
+                self.send_error(404)
+                return
+
+            time.sleep(latency)
+            if failure_rate and random.random() < failure_rate:
+                self.send_error(503)
+                return
+
+            page = int(query.get('page', ['1'])[0])
+            size = int(query.get('size', ['100'])[0])
+            if requested is not None:
+                requested.append(page)
+            if page in failing_pages:
+                self.send_error(503)
+                return
+            matching = roster
+            if 'modified_after' in query:
+                since = float(query['modified_after'][0])
+                matching = [e for e in roster if e['entry_modified'] > since]
+            entries = matching[(page - 1) * size:page * size]
+            body = json.dumps({'event_entry': entries}).encode()
+            if page in malformed_pages:
+                body = body[:len(body) // 2]
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('X-Ctlive-Page-Count', str(max(1, -(-len(matching) // size))))
+            self.send_header('X-Ctlive-Row-Count', str(len(matching)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return RosterHandler
+
+
+def start_stub(host='127.0.0.1', port=0, entries=1000, latency=0.0, failure_rate=0.0,
+               failing_pages=(), malformed_pages=()):
+    """Start the stub in a background thread and return the server
+
+    server.roster is the entry list and server.requested the pages asked for.
+    """
+    roster = make_roster(entries)
+    requested = []
+    server = ThreadingHTTPServer((host, port), make_handler(
+        roster, latency, failure_rate, failing_pages, malformed_pages, requested))
+    server.roster = roster
+    server.requested = requested
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stand-in for the roster API with artificial latency')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--entries', type=int, default=30000)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds added to every page')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of pages answered with 503')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        (args.host, args.port),
+        make_handler(make_roster(args.entries), args.latency, args.failure_rate)
+    )
+    print(f"Serving {args.entries} entries on http://{args.host}:{args.port}/api/event/<id>/entry")
+    print(f"Set API_CONFIG['BASE_URL'] = 'http://{args.host}:{args.port}/api' to use it")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
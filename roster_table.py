@@ -0,0 +1,276 @@
+from array import array
+from collections.abc import Mapping
+
+# Fields stored for every runner, in the order build_runner_record produces them
+RUNNER_FIELDS = (
+    'name', 'first_name', 'last_name', 'age', 'gender', 'city', 'state',
+    'country', 'division', 'race_name', 'reg_choice', 'wave', 'team_name',
+    'entry_status', 'entry_type', 'entry_id', 'athlete_id', 'tag'
+)
+
+# Fields that are (nearly) unique per runner and gain nothing from interning
+UNIQUE_FIELDS = frozenset(('name', 'entry_id', 'athlete_id', 'tag'))
+
+# Runner fields copied into every display payload
+DISPLAY_FIELDS = (
+    'name', 'first_name', 'last_name', 'age', 'gender', 'city', 'state',
+    'country', 'division', 'race_name', 'reg_choice', 'wave', 'team_name'
+)
+
+
+def normalize_bib(bib):
+    """Canonical form of a bib for matching: trimmed, upper case, no leading zeros"""
+    bib = str(bib).strip().upper()
+    return bib.lstrip('0') or bib[-1:]
+
+
+def normalize_tag(tag):
+    """Canonical form of a chip code; reads are normalized once, when parsed"""
+    return str(tag).strip().upper()
+
+
+class InternedColumn:
+    """Column of repeated values stored once each and referenced by code"""
+
+    __slots__ = ('values', 'codes', '_index')
+
+    def __init__(self):
+        self.values = []
+        self.codes = array('I')
+        self._index = {}
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def copy(self):
+        column = InternedColumn()
+        column.values = self.values[:]
+        column.codes = array('I', self.codes)
+        column._index = dict(self._index)
+        return column
+
+
+class PlainColumn:
+    """Column of mostly unique values"""
+
+    __slots__ = ('values',)
+
+    def __init__(self):
+        self.values = []
+
+    def append(self, value):
+        self.values.append(value)
+
+    def __getitem__(self, row):
+        return self.values[row]
+
+    def copy(self):
+        column = PlainColumn()
+        column.values = self.values[:]
+        return column
+
+
+class RunnerView(Mapping):
+    """Read-only view of one roster row; nothing is copied until asked for"""
+
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, field):
+        try:
+            column = self._table._columns[field]
+        except KeyError:
+            raise KeyError(field) from None
+        return column[self._row]
+
+    def __iter__(self):
+        return iter(RUNNER_FIELDS)
+
+    def __len__(self):
+        return len(RUNNER_FIELDS)
+
+    def payload(self, fields=DISPLAY_FIELDS):
+        """Build the runner part of an SSE payload straight from the columns"""
+        columns = self._table._columns
+        row = self._row
+        return {field: columns[field][row] for field in fields}
+
+    def __repr__(self):
+        return f'RunnerView({dict(self)!r})'
+
+
+class RosterTable:
+    """Columnar bib -> runner table with deduplicated string columns
+
+    Rows are append-only: replacing a bib appends a new row and then rebinds
+    the bib, so a concurrent reader sees either the old or the new runner.
+    The rows left behind are dropped by copy() once they make up more than
+    COMPACT_RATIO of the table, since the copy is what gets changed and
+    swapped in.
+
+    Alongside the bibs it keeps alias indexes for resolve(): chip tag -> bib,
+    entry_id -> bib, and normalized bib -> bib for bibs that aren't already in
+    normal form. They are maintained as rows change, so lookups never have to
+    scan or rebuild anything.
+    """
+
+    __slots__ = ('_columns', '_rows', '_by_tag', '_by_entry', '_by_norm')
+
+    # Dead rows as a fraction of all rows before copy() compacts
+    COMPACT_RATIO = 0.25
+
+    def __init__(self):
+        self._columns = {
+            field: PlainColumn() if field in UNIQUE_FIELDS else InternedColumn()
+            for field in RUNNER_FIELDS
+        }
+        self._rows = {}
+        self._by_tag = {}
+        self._by_entry = {}
+        self._by_norm = {}
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a table from a bib -> record mapping"""
+        table = cls()
+        table.update(records)
+        return table
+
+    def __setitem__(self, bib, record):
+        row = len(self._columns['name'].values)
+        for field, column in self._columns.items():
+            column.append(record.get(field, ''))
+        old = self._rows.get(bib)
+        self._rows[bib] = row
+        new_keys = self._alias_keys(bib, row)
+        for index, key in new_keys:
+            index[key] = bib
+        if old is not None:
+            # Drop aliases the old record had and the new one doesn't
+            self._unindex(bib, old, keep={(id(index), key) for index, key in new_keys})
+
+    def __getitem__(self, bib):
+        return RunnerView(self, self._rows[bib])
+
+    def __delitem__(self, bib):
+        row = self._rows.pop(bib)
+        self._unindex(bib, row)
+
+    def _alias_keys(self, bib, row):
+        keys = []
+        tag = self._columns['tag'][row]
+        if tag:
+            keys.append((self._by_tag, normalize_tag(tag)))
+        entry_id = self._columns['entry_id'][row]
+        if entry_id and entry_id != bib:
+            keys.append((self._by_entry, entry_id))
+        normalized = normalize_bib(bib)
+        if normalized != bib:
+            keys.append((self._by_norm, normalized))
+        return keys
+
+    def _unindex(self, bib, row, keep=()):
+        for index, key in self._alias_keys(bib, row):
+            if index.get(key) == bib and (id(index), key) not in keep:
+                del index[key]
+
+    def bib_for_entry(self, entry_id):
+        """Return the bib a registration entry is currently under, or None"""
+        bib = self._by_entry.get(entry_id)
+        if bib is None and entry_id in self._rows and self[entry_id]['entry_id'] == entry_id:
+            # Entries without a bib are keyed by their entry_id
+            return entry_id
+        return bib
+
+    def resolve(self, bib, tag=None):
+        """Find the runner for a read, returning (roster bib, runner) or (None, None)
+
+        A chip the roster assigns to a runner wins over the bib the reader
+        sent, so reassigned chips show the right person. The tag is looked up
+        as given, so pass it through normalize_tag() when the read is parsed;
+        roster chips are indexed in that form. Otherwise the bib is
+        tried as is, then as an entry_id, then in normalized form ('0042' for
+        '42'); the normalizing only happens once the exact lookups miss.
+        """
+        if tag:
+            owner = self._by_tag.get(tag)
+            if owner is not None:
+                bib = owner
+        row = self._rows.get(bib)
+        if row is None:
+            owner = self._by_entry.get(bib)
+            if owner is None:
+                normalized = normalize_bib(bib)
+                owner = self._by_norm.get(normalized, normalized)
+            row = self._rows.get(owner)
+            if row is None:
+                return None, None
+            bib = owner
+        return bib, RunnerView(self, row)
+
+    def __contains__(self, bib):
+        return bib in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def get(self, bib, default=None):
+        row = self._rows.get(bib)
+        return default if row is None else RunnerView(self, row)
+
+    def keys(self):
+        return self._rows.keys()
+
+    def items(self):
+        for bib, row in self._rows.items():
+            yield bib, RunnerView(self, row)
+
+    def update(self, records):
+        for bib, record in records.items():
+            self[bib] = record
+
+    @property
+    def dead_rows(self):
+        """Rows no bib points at any more"""
+        return len(self._columns['name'].values) - len(self._rows)
+
+    def copy(self, compact=None):
+        """Return an independent copy that can be modified and swapped in
+
+        compact=None compacts when dead rows pass COMPACT_RATIO; True or
+        False forces it either way.
+        """
+        if compact is None:
+            compact = self.dead_rows > len(self._columns['name'].values) * self.COMPACT_RATIO
+        table = RosterTable.__new__(RosterTable)
+        if compact:
+            table._columns = {
+                field: PlainColumn() if field in UNIQUE_FIELDS else InternedColumn()
+                for field in RUNNER_FIELDS
+            }
+            table._rows = {}
+            pairs = [(table._columns[field], column) for field, column in self._columns.items()]
+            for bib, row in self._rows.items():
+                table._rows[bib] = len(table._rows)
+                for target, column in pairs:
+                    target.append(column[row])
+        else:
+            table._columns = {field: column.copy() for field, column in self._columns.items()}
+            table._rows = dict(self._rows)
+        table._by_tag = dict(self._by_tag)
+        table._by_entry = dict(self._by_entry)
+        table._by_norm = dict(self._by_norm)
+        return table
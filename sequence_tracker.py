@@ -0,0 +1,179 @@
+import bisect
+import threading
+
+# What observe() decided about a read
+IN_ORDER = 'in_order'
+GAP = 'gap'
+FILLED = 'filled'
+DUPLICATE = 'duplicate'
+RESET = 'reset'
+UNTRACKED = 'untracked'
+
+
+class _Stream:
+    """Next expected sequence plus the missing ranges below it
+
+    Missing ranges are kept as two parallel sorted lists of inclusive starts
+    and ends, so a stream with no losses costs two empty lists. `seen` maps
+    recent sequence numbers to a fingerprint of their read, oldest first.
+    """
+
+    __slots__ = ('expected', 'starts', 'ends', 'seen', 'reconnected', 'duplicates')
+
+    def __init__(self):
+        self.expected = None
+        self.starts = []
+        self.ends = []
+        self.seen = {}
+        self.reconnected = False
+        self.duplicates = 0
+
+    def missing(self):
+        return sum(end - start + 1 for start, end in zip(self.starts, self.ends))
+
+
+class SequenceTracker:
+    """Track CT01_33 sequence numbers per (timing box, location)
+
+    The usual case, the next number in order, is a comparison and an
+    increment. Skipping ahead records the skipped range as a gap and calls
+    on_gap(source, location, first, last) so the caller can ask the box to
+    resend it. A number below the expected one fills part of a gap (a
+    backfilled or out-of-order read), repeats a read already seen, or means
+    the box's counter started over. Each stream keeps at most `max_gaps`
+    ranges, forgetting the oldest.
+
+    To tell a repeat from a restart, observe() takes a fingerprint of the
+    read (e.g. its bib and time) and the last `max_seen` are kept per
+    stream. A number seen before with the same fingerprint is a DUPLICATE;
+    with a different one the box restarted (RESET). For numbers too old to
+    have a fingerprint, it is a RESET if the number is 0 or 1, if it is the
+    first read after reconnected() was called for the box, or if it is more
+    than `reset_jump` below the expected number, and a DUPLICATE otherwise.
+    on_reset(source, location, sequence) is called for every RESET, and
+    on_duplicates(source, location, count) once a stream has produced
+    `duplicate_alert` duplicates in a row, so a restart that still slips
+    through is noticed rather than silently dropping reads. With
+    replaying=True, e.g. when rebuilding from a journal, the state is updated
+    the same way but none of the callbacks are made.
+    """
+
+    def __init__(self, max_gaps=1000, on_gap=None, max_seen=10000, reset_jump=10000,
+                 duplicate_alert=20, on_reset=None, on_duplicates=None):
+        self.max_gaps = max_gaps
+        self.on_gap = on_gap
+        self.max_seen = max_seen
+        self.reset_jump = reset_jump
+        self.duplicate_alert = duplicate_alert
+        self.on_reset = on_reset
+        self.on_duplicates = on_duplicates
+        self.stats = {IN_ORDER: 0, GAP: 0, FILLED: 0, DUPLICATE: 0, RESET: 0, 'missing': 0}
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def observe(self, source, location, sequence, fingerprint=None, replaying=False):
+        try:
+            number = int(sequence)
+        except (TypeError, ValueError):
+            return UNTRACKED
+        key = (source, location)
+        gap = duplicates = None
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = self._streams[key] = _Stream()
+            status = self._observe(stream, number, fingerprint)
+            if status == GAP:
+                gap = (stream.starts[-1], stream.ends[-1])
+            if status == DUPLICATE:
+                stream.duplicates += 1
+                if stream.duplicates == self.duplicate_alert:
+                    duplicates = stream.duplicates
+            else:
+                stream.duplicates = 0
+                if status != FILLED:
+                    stream.reconnected = False
+                if fingerprint is not None:
+                    self._remember(stream, number, fingerprint)
+            self.stats[status] += 1
+        if replaying:
+            return status
+        if gap is not None and self.on_gap is not None:
+            self.on_gap(source, location, *gap)
+        if status == RESET and self.on_reset is not None:
+            self.on_reset(source, location, number)
+        if duplicates is not None and self.on_duplicates is not None:
+            self.on_duplicates(source, location, duplicates)
+        return status
+
+    def _remember(self, stream, number, fingerprint):
+        seen = stream.seen
+        seen[number] = fingerprint
+        if len(seen) > self.max_seen:
+            del seen[next(iter(seen))]
+
+    def _observe(self, stream, number, fingerprint):
+        expected = stream.expected
+        if expected is None or number == expected:
+            stream.expected = number + 1
+            return IN_ORDER
+        if number > expected:
+            stream.starts.append(expected)
+            stream.ends.append(number - 1)
+            self.stats['missing'] += number - expected
+            if len(stream.starts) > self.max_gaps:
+                self.stats['missing'] -= stream.ends[0] - stream.starts[0] + 1
+                del stream.starts[0], stream.ends[0]
+            stream.expected = number + 1
+            return GAP
+        index = bisect.bisect_right(stream.starts, number) - 1
+        if index < 0 or number > stream.ends[index]:
+            if self._restarted(stream, number, fingerprint):
+                self.stats['missing'] -= stream.missing()
+                stream.starts.clear()
+                stream.ends.clear()
+                stream.seen.clear()
+                stream.expected = number + 1
+                return RESET
+            return DUPLICATE
+        start, end = stream.starts[index], stream.ends[index]
+        if start == end:
+            del stream.starts[index], stream.ends[index]
+        elif number == start:
+            stream.starts[index] = start + 1
+        elif number == end:
+            stream.ends[index] = end - 1
+        else:
+            stream.ends[index] = number - 1
+            stream.starts.insert(index + 1, number + 1)
+            stream.ends.insert(index + 1, end)
+        self.stats['missing'] -= 1
+        return FILLED
+
+    def _restarted(self, stream, number, fingerprint):
+        """Whether a number already behind us starts a new count rather than repeating one"""
+        known = stream.seen.get(number)
+        if known is not None and fingerprint is not None:
+            return known != fingerprint
+        return number <= 1 or stream.reconnected or stream.expected - number > self.reset_jump
+
+    def reconnected(self, source):
+        """A box connected again; it may have restarted while it was away"""
+        with self._lock:
+            for (stream_source, _), stream in self._streams.items():
+                if stream_source == source:
+                    stream.reconnected = True
+
+    def gaps(self, source=None):
+        """{(source, location): [(first, last), ...]} for streams with reads missing"""
+        with self._lock:
+            return {
+                key: list(zip(stream.starts, stream.ends))
+                for key, stream in self._streams.items()
+                if stream.starts and (source is None or key[0] == source)
+            }
+
+    def reset(self):
+        with self._lock:
+            self._streams.clear()
+            self.stats['missing'] = 0
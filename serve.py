@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Run race_display as one ingest process and several web worker processes
+
+The ingest process owns the timing port, roster, journal and results and
+publishes every display event over a Unix-socket bus (SERVER_CONFIG
+['EVENT_BUS']). The web workers accept connections on one shared listening
+socket, serve /stream, /ws and the APIs from what the bus delivers, and map
+the roster snapshot the ingest process writes. A worker or the ingest
+process that exits is started again.
+
+    python serve.py --workers 4
+    python serve.py --workers 4 --http gevent   # greenlet per connection, see serve_gevent.py
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from config import SERVER_CONFIG
+
+log = logging.getLogger('race_display.serve')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Web worker entry point for each HTTP server
+WEB_ENTRY = {
+    'werkzeug': os.path.join(HERE, 'app.py'),
+    'gevent': os.path.join(HERE, 'serve_gevent.py'),
+}
+
+
+def listen(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def spawn(role, listener=None, http='werkzeug'):
+    env = dict(os.environ, RACE_DISPLAY_ROLE=role)
+    pass_fds = ()
+    if listener is not None:
+        env['RACE_DISPLAY_FD'] = str(listener.fileno())
+        pass_fds = (listener.fileno(),)
+    # The ingest process only serves the control routes, so it keeps Werkzeug
+    entry = WEB_ENTRY[http] if role == 'web' else WEB_ENTRY['werkzeug']
+    return subprocess.Popen([sys.executable, entry], env=env, pass_fds=pass_fds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=SERVER_CONFIG.get('WEB_WORKERS', os.cpu_count() or 2),
+                        help='web worker processes')
+    parser.add_argument('--host', default=SERVER_CONFIG['HOST'])
+    parser.add_argument('--port', type=int, default=SERVER_CONFIG['PORT'])
+    parser.add_argument('--http', choices=sorted(WEB_ENTRY), default=SERVER_CONFIG.get('HTTP_SERVER', 'werkzeug'),
+                        help='HTTP server for the web workers')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    listener = listen(args.host, args.port)
+    children = {'ingest': spawn('ingest')}
+    for number in range(args.workers):
+        children[f'web-{number + 1}'] = spawn('web', listener, args.http)
+    log.info("Serving on %s:%s with %d %s web workers", args.host, args.port, args.workers, args.http)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        while not stopping:
+            time.sleep(1)
+            for name, process in list(children.items()):
+                code = process.poll()
+                if code is not None and not stopping:
+                    log.warning("%s exited with %s; restarting", name, code)
+                    children[name] = spawn('ingest') if name == 'ingest' else spawn('web', listener, args.http)
+    finally:
+        for process in children.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in children.values():
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        listener.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Serve race_display with gevent cooperative I/O
+
+Every HTTP connection is a greenlet instead of a Werkzeug thread, so an idle
+/stream client costs a few KiB and no OS thread. Threads, sockets, queues
+and the hubs' condition variables are monkey-patched to cooperate, so the
+app runs unchanged. Needs `pip install gevent`.
+
+    python serve_gevent.py                      # one process, ingest included
+    python serve.py --workers 4 --http gevent   # gevent web workers, ingest apart
+
+In one process the timing ingest shares the event loop with the streams; for
+the largest crowds run it apart with serve.py, which starts workers with this
+module when SERVER_CONFIG['HTTP_SERVER'] or --http is 'gevent'.
+"""
+
+from gevent import monkey
+
+# Before anything imports threading or socket
+monkey.patch_all()
+
+import logging
+import os
+import socket
+
+from gevent.pywsgi import WSGIServer
+
+import app
+
+log = logging.getLogger('race_display.serve')
+
+
+def main():
+    host, port = app.start_process_role()
+    listen_fd = os.environ.get('RACE_DISPLAY_FD')
+    if listen_fd:
+        # Shared listening socket from serve.py
+        listener = socket.socket(fileno=int(listen_fd))
+    else:
+        listener = (host, port)
+    server = WSGIServer(
+        listener, app.app,
+        backlog=app.SERVER_CONFIG.get('LISTEN_BACKLOG', 2048),
+        # Per-request access lines would cost more than the streams themselves
+        log=None, error_log=logging.getLogger('race_display.http')
+    )
+    log.info("Serving HTTP on %s:%s with gevent", host, port)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -251,21 +251,39 @@ function startDisplay() {
     });
 }
 
+// Stream filters given on the page URL, e.g. ?location=finish&race_name=10K
+function streamParams() {
+    const page = new URLSearchParams(window.location.search);
+    const params = new URLSearchParams();
+    ['location', 'race_name', 'wave', 'division', 'bib'].forEach(name => {
+        page.getAll(name).forEach(value => params.append(name, value));
+    });
+    return params;
+}
+
 // Initialize the EventSource for live updates
 function initializeEventSource() {
     if (window.eventSource) {
         window.eventSource.close();
     }
+
+    // ?transport=ws on the page URL switches to the batched WebSocket feed
+    if (new URLSearchParams(window.location.search).get('transport') === 'ws') {
+        initializeWebSocket();
+        return;
+    }
     
     console.log('Initializing event source...');
-    window.eventSource = new EventSource('/stream');
+    window.eventSource = new EventSource(`/stream?${streamParams()}`);
     
     window.eventSource.onmessage = (event) => {
         console.log('Received event:', event.data);
         try {
             const data = JSON.parse(event.data);
             
-            if (!data.keepalive) {
+            if (data.type === 'batch') {
+                updateDisplay(data.runners[0]);
+            } else if (!data.keepalive) {
                 updateDisplay(data);
             }
         } catch (e) {
@@ -278,6 +296,39 @@ function initializeEventSource() {
     };
 }
 
+// Receive batched frames from /ws, acking each so a reconnect resumes after it
+function initializeWebSocket(lastId) {
+    const params = streamParams();
+    if (lastId) params.set('last_event_id', lastId);
+    const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const ws = new WebSocket(`${proto}://${window.location.host}/ws?${params}`);
+    window.eventSource = ws;
+
+    ws.onmessage = (event) => {
+        try {
+            const frame = JSON.parse(event.data);
+            frame.rows.forEach(row => {
+                const data = {};
+                frame.fields.forEach((field, i) => {
+                    if (row[i] !== null) data[field] = row[i];
+                });
+                updateDisplay(data.type === 'batch' ? data.runners[0] : data);
+            });
+            lastId = frame.ids[frame.ids.length - 1];
+            ws.send(JSON.stringify({ ack: lastId }));
+        } catch (e) {
+            console.error('Error processing frame:', e);
+        }
+    };
+
+    ws.onclose = () => {
+        // Only reconnect if this is still the active connection
+        if (window.eventSource === ws) {
+            setTimeout(() => initializeWebSocket(lastId), 2000);
+        }
+    };
+}
+
 // Update the display with the runner data
 function updateDisplay(data) {
     if (!data) return;
@@ -0,0 +1,73 @@
+# Payload fields a subscriber can filter on by value; category applies to
+# leaderboard deltas
+FILTER_FIELDS = ('location', 'race_name', 'wave', 'division', 'category')
+
+
+def parse_bib_ranges(values):
+    """Turn ['100-199', '42'] into [(100, 199), (42, 42)], raising ValueError"""
+    ranges = []
+    for value in values:
+        low, _, high = value.partition('-')
+        low = int(low)
+        high = int(high) if high else low
+        if high < low:
+            raise ValueError(f"Empty bib range {value!r}")
+        ranges.append((low, high))
+    return sorted(ranges)
+
+
+class StreamFilter:
+    """Predicate over runner payloads, compiled once per subscription
+
+    Values within a field are alternatives and fields must all match, so
+    {'location': ['finish'], 'race_name': ['10K', 'Half']} keeps finish reads
+    from either race. Comparisons ignore case. `key` identifies equivalent
+    filters so their results can be shared between subscribers.
+    """
+
+    __slots__ = ('key', '_fields', '_ranges')
+
+    def __init__(self, spec):
+        self._fields = tuple(
+            (field, frozenset(str(v).strip().casefold() for v in spec[field]))
+            for field in FILTER_FIELDS if spec.get(field)
+        )
+        self._ranges = tuple(parse_bib_ranges(spec.get('bib') or ()))
+        self.key = tuple((field, tuple(sorted(values))) for field, values in self._fields) + self._ranges
+
+    def __bool__(self):
+        return bool(self.key)
+
+    def __call__(self, runner):
+        for field, values in self._fields:
+            value = runner.get(field)
+            if value is None or str(value).casefold() not in values:
+                return False
+        if self._ranges:
+            bib = str(runner.get('bib', ''))
+            if not bib.isdigit():
+                return False
+            number = int(bib)
+            return any(low <= number <= high for low, high in self._ranges)
+        return True
+
+
+def compile_filter(spec):
+    """Build a StreamFilter from a {field: [values]} dict, or None if it filters nothing"""
+    if not spec:
+        return None
+    stream_filter = StreamFilter({
+        field: values if isinstance(values, (list, tuple, set)) else [values]
+        for field, values in spec.items()
+    })
+    return stream_filter or None
+
+
+def filter_from_args(args):
+    """Read filters from query arguments, e.g. ?location=finish&bib=1-999,2000-2999"""
+    spec = {}
+    for field in FILTER_FIELDS + ('bib',):
+        values = [v.strip() for arg in args.getlist(field) for v in arg.split(',') if v.strip()]
+        if values:
+            spec[field] = values
+    return compile_filter(spec)
@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from roster_table import normalize_tag
+
+ingest_log = logging.getLogger('race_display.ingest')
+
+# Slots in each tag's running state
+FIRST_ARRIVAL, LAST_ARRIVAL, PEAK_RSSI, PEAK_TIME, FIRST_TIME, LAST_TIME, READS = range(7)
+
+
+def parse_observation(line, separator='~'):
+    """Split a TO line into (tag, timer, reader time, reader, port, rssi, reads), or None
+
+    The tag is normalized like the roster's tag index, so observations of one
+    chip in different case collapse into one burst.
+
+    TO~sequence~tag~timer~event~epoch time~reader~port~rssi~reader seq~type[~read count]
+    """
+    parts = line.split(separator)
+    if len(parts) < 11 or parts[0] != 'TO':
+        return None
+    try:
+        return (
+            normalize_tag(parts[2]), parts[3], float(parts[5]), parts[6], parts[7], float(parts[8]),
+            int(parts[11]) if len(parts) > 11 and parts[11] else 1
+        )
+    except ValueError:
+        return None
+
+
+class TagCrossingReducer:
+    """Reduce raw tag observations to one crossing per tag per pass
+
+    A runner on the mat produces a burst of observations. Each (tag,
+    location) keeps a fixed seven-slot state updated in place; the burst is
+    over once the tag has been quiet for `gap` seconds, or after `max_window`
+    seconds in any case, and on_crossing(tag, location, crossing time, peak
+    rssi, reads) is then called once. The crossing time is the reader time of
+    the strongest observation (mode 'peak'), or of the first or last one.
+
+    States are kept in last-seen order so finished bursts are always at the
+    front; expire() only looks at those.
+    """
+
+    def __init__(self, on_crossing, mode='peak', gap=1.0, max_window=5.0,
+                 locations=None, clock=time.monotonic):
+        if mode not in ('peak', 'first', 'last'):
+            raise ValueError(f"Unknown crossing mode {mode!r}")
+        self.on_crossing = on_crossing
+        self.mode = mode
+        self.gap = gap
+        self.max_window = max_window
+        # Timer (box) name or 'timer:reader' -> timing location
+        self.locations = dict(locations or {})
+        self.clock = clock
+        self.stats = {'observations': 0, 'crossings': 0, 'invalid': 0}
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def location_for(self, timer, reader):
+        locations = self.locations
+        if not locations:
+            return timer
+        return locations.get(f'{timer}:{reader}') or locations.get(timer, timer)
+
+    def observe_line(self, line):
+        observation = parse_observation(line)
+        if observation is None:
+            self.stats['invalid'] += 1
+            return False
+        tag, timer, at, reader, _, rssi, reads = observation
+        self.observe(tag, self.location_for(timer, reader), at, rssi, reads)
+        return True
+
+    def observe(self, tag, location, at, rssi, reads=1, now=None):
+        if now is None:
+            now = self.clock()
+        key = (tag, location)
+        with self._lock:
+            self.stats['observations'] += 1
+            finished = self._expire(now)
+            state = self._open.get(key)
+            if state is not None and now - state[FIRST_ARRIVAL] >= self.max_window:
+                finished.append((key, self._open.pop(key)))
+                state = None
+            if state is None:
+                self._open[key] = [now, now, rssi, at, at, at, reads]
+            else:
+                state[LAST_ARRIVAL] = now
+                state[LAST_TIME] = at
+                state[READS] += reads
+                if rssi > state[PEAK_RSSI]:
+                    state[PEAK_RSSI] = rssi
+                    state[PEAK_TIME] = at
+                self._open.move_to_end(key)
+        self._emit(finished)
+
+    def _expire(self, now):
+        finished = []
+        open_states = self._open
+        while open_states:
+            key, state = next(iter(open_states.items()))
+            if now - state[LAST_ARRIVAL] < self.gap:
+                break
+            del open_states[key]
+            finished.append((key, state))
+        return finished
+
+    def _emit(self, finished):
+        for (tag, location), state in finished:
+            if self.mode == 'peak':
+                at = state[PEAK_TIME]
+            elif self.mode == 'first':
+                at = state[FIRST_TIME]
+            else:
+                at = state[LAST_TIME]
+            self.stats['crossings'] += 1
+            try:
+                self.on_crossing(tag, location, at, state[PEAK_RSSI], state[READS])
+            except Exception:
+                ingest_log.exception("Error handling crossing for tag %s", tag)
+
+    def flush(self, now=None):
+        """Emit every burst that has gone quiet; the background thread calls this"""
+        with self._lock:
+            finished = self._expire(self.clock() if now is None else now)
+        self._emit(finished)
+
+    def pending(self):
+        return len(self._open)
+
+    def start(self):
+        def run():
+            while not self._stop.wait(self.gap / 2):
+                self.flush()
+        threading.Thread(target=run, daemon=True, name='tag-crossings').start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import threading
+
+from bs4 import BeautifulSoup
+
+# Class names the display fills in directly, mapped to the runner field they show
+CLASS_FIELDS = {
+    'runner-name': 'name',
+    'runner-city': 'city',
+    'runner-message': 'message',
+    'bib-number': 'bib',
+}
+
+
+class CompiledTemplate:
+    """A saved template with its placeholder slots worked out once"""
+
+    __slots__ = ('name', 'html', 'etag', 'fields', 'slots', 'mtime')
+
+    def __init__(self, name, html, mtime=None):
+        self.name = name
+        self.html = html
+        self.etag = hashlib.sha1(html.encode('utf-8')).hexdigest()
+        self.mtime = mtime
+        self.slots = compile_slots(html)
+        self.fields = tuple(sorted({slot['field'] for slot in self.slots}))
+
+    def to_json(self):
+        return {'html': self.html, 'fields': list(self.fields), 'slots': self.slots}
+
+
+def compile_slots(html):
+    """List where each runner field goes in the template
+
+    Each slot records the field, the index of its element among the
+    template's [data-placeholder] elements (or the class it is found by) and
+    whether the value is written to the text or the src attribute.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    slots = []
+    for index, node in enumerate(soup.select('[data-placeholder]')):
+        slots.append({
+            'field': node['data-placeholder'],
+            'index': index,
+            'target': 'src' if node.name == 'img' else 'text',
+        })
+    for css_class, field in CLASS_FIELDS.items():
+        if soup.select_one('.' + css_class) is not None:
+            slots.append({'field': field, 'class': css_class, 'target': 'text'})
+    return slots
+
+
+class TemplateCache:
+    """Compiled templates keyed by name, reloaded when the file changes"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.directory, f'{name}.html')
+
+    def get(self, name):
+        """Return the compiled template, or None if it doesn't exist"""
+        path = self.path(name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.invalidate(name)
+            return None
+        cached = self._templates.get(name)
+        if cached is not None and cached.mtime == mtime:
+            return cached
+        with open(path, 'r', encoding='utf-8') as fp:
+            compiled = CompiledTemplate(name, fp.read(), mtime)
+        with self._lock:
+            self._templates[name] = compiled
+        return compiled
+
+    def save(self, name, html):
+        """Write a template and replace its cached compilation"""
+        path = self.path(name)
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write(html)
+        compiled = CompiledTemplate(name, html, os.stat(path).st_mtime_ns)
+        with self._lock:
+            self._templates[name] = compiled
+        return compiled
+
+    def invalidate(self, name):
+        with self._lock:
+            self._templates.pop(name, None)
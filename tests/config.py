@@ -0,0 +1,37 @@
+"""Settings app.py is imported with under pytest"""
+import os
+import tempfile
+
+STATE_DIR = tempfile.mkdtemp(prefix='race_display_tests_')
+
+RANDOM_MESSAGES = ["Go!"]
+
+API_CONFIG = {
+    'BASE_URL': 'http://127.0.0.1:9/api',
+    'FORMAT': 'json',
+    'CLIENT_ID': 'test',
+    'PAGE_SIZE': 100,
+    'PAGE_RETRIES': 2,
+    'RETRY_BACKOFF': 0.01,
+    'FETCH_WORKERS': 4,
+}
+
+PROTOCOL_CONFIG = {
+    'HOST': '127.0.0.1',
+    'PORT': 0,
+    'FIELD_SEPARATOR': '~',
+    'LINE_TERMINATOR': '\r\n',
+    'FORMAT_ID': 'CT01_33',
+}
+
+SERVER_CONFIG = {
+    'HOST': '127.0.0.1',
+    'PORT': 0,
+    'DEBUG': False,
+    'LOG_LEVEL': 'WARNING',
+    'ROSTER_DB': os.path.join(STATE_DIR, 'roster.sqlite3'),
+    'ROSTER_SNAPSHOT': os.path.join(STATE_DIR, 'roster.snapshot'),
+    'EVENT_BUS': os.path.join(STATE_DIR, 'bus.sock'),
+    'JOURNAL_DIR': None,
+    'READER_SILENCE': 0,
+}
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# tests/config.py stands in for the deployment's config.py, so app imports
+# with throwaway paths and no listeners
+sys.path[:0] = [HERE, ROOT]
+
+
+def runner_record(bib, **fields):
+    """A roster record for bib with the usual fields, overridden by fields"""
+    base = {'name': f'Runner {bib}', 'entry_id': f'E{bib}', 'tag': f'TAG{bib}', 'division': 'M40-44'}
+    base.update(fields)
+    return base
+
+
+@pytest.fixture
+def record():
+    return runner_record
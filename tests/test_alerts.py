@@ -0,0 +1,73 @@
+import time
+
+from alerts import Alert, AlertBus, BroadcastSink
+from broadcast import BroadcastHub
+
+
+class Sink:
+    def __init__(self):
+        self.alerts = []
+
+    def send(self, alert):
+        self.alerts.append((alert.kind, alert.key, alert.message, alert.count))
+
+
+class FailingSink:
+    def send(self, alert):
+        raise OSError("webhook down")
+
+
+def test_repeats_are_coalesced_into_one_summary():
+    sink = Sink()
+    bus = AlertBus([sink], coalesce=5.0)
+    for now in (0, 1, 2):
+        bus._handle(Alert('unknown_bib', '999', 'Unknown bib 999'), now)
+    bus._handle(Alert('unknown_bib', '998', 'Unknown bib 998'), 3)
+    assert [alert[1] for alert in sink.alerts] == ['999', '998']
+    assert bus.stats['coalesced'] == 2
+
+    # The window closes with one summary carrying the count; a quiet key sends nothing
+    bus._close_windows(5)
+    assert sink.alerts[-1] == ('unknown_bib', '999', 'Unknown bib 999 (repeated 2 times)', 2)
+    bus._close_windows(8)
+    assert len(sink.alerts) == 3
+    # After the window, the next one goes straight out
+    bus._handle(Alert('unknown_bib', '999', 'Unknown bib 999'), 9)
+    assert sink.alerts[-1][3] == 1
+
+
+def test_each_kind_is_rate_limited():
+    sink = Sink()
+    bus = AlertBus([sink], coalesce=0, per_minute=3)
+    for n in range(5):
+        bus._handle(Alert('unknown_bib', str(n), 'Unknown'), 0)
+    # Another kind has its own bucket
+    bus._handle(Alert('vip', '1', 'VIP'), 0)
+    assert [alert[1] for alert in sink.alerts] == ['0', '1', '2', '1']
+    assert bus.stats['rate_limited'] == 2
+    # Tokens come back at per_minute a minute
+    bus._handle(Alert('unknown_bib', '5', 'Unknown'), 20)
+    assert sink.alerts[-1][1] == '5'
+
+
+def test_a_failing_sink_does_not_stop_the_others():
+    sink = Sink()
+    bus = AlertBus([FailingSink(), sink])
+    bus._handle(Alert('reader_silent', 'box', 'No data from box'), 0)
+    assert sink.alerts == [('reader_silent', 'box', 'No data from box', 1)]
+    assert bus.stats['sink_errors'] == 1
+    assert bus.stats['sent'] == 1
+
+
+def test_worker_delivers_to_the_hub():
+    hub = BroadcastHub()
+    subscriber = hub.subscribe('alerts')
+    bus = AlertBus([BroadcastSink(hub, sound='beep')]).start()
+    try:
+        bus.post('vip', '42', 'VIP Runner 42 at finish', bib='42')
+        payload = subscriber.get(timeout=5).data
+    finally:
+        bus.stop()
+    assert payload['type'] == 'alert'
+    assert (payload['kind'], payload['bib'], payload['sound']) == ('vip', '42', 'beep')
+    assert payload['at'] <= time.time()
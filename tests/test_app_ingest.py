@@ -0,0 +1,185 @@
+import queue
+
+import pytest
+
+import app
+from read_journal import ReadJournal
+from roster_table import RosterTable
+
+
+def line(sequence, bib, clock, location='finish', tag='0', lap='1'):
+    return f'CT01_33~{sequence}~{location}~{bib}~{clock}~0~{tag}~{lap}'
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """The app's ingest pipeline with a small roster and fresh state"""
+    roster = RosterTable.from_records({
+        str(bib): {'name': f'Runner {bib}', 'race_name': '10K', 'gender': 'F',
+                   'division': 'F30-34', 'tag': f'CHIP{bib}', 'entry_id': f'E{bib}'}
+        for bib in range(1, 21)
+    })
+    monkeypatch.setattr(app, 'roster_data', roster)
+    monkeypatch.setattr(app, 'read_journal', None)
+    for state in (app.results, app.sequences, app.read_dedupe):
+        state.reset()
+    subscriber = app.data_hub.subscribe('test')
+    yield subscriber
+    app.data_hub.unsubscribe(subscriber)
+
+
+def published(subscriber):
+    payloads = []
+    while True:
+        try:
+            payloads.append(subscriber.get(timeout=0).data)
+        except queue.Empty:
+            return payloads
+
+
+def test_journal_replay_rebuilds_state(pipeline, tmp_path):
+    journal = ReadJournal(str(tmp_path), fsync=False)
+    app.read_journal = journal.start()
+    app.handle_timing_line(line('', 'guntime', '08:00:00.00'), 'box')
+    app.handle_timing_line(line(1, '5', '08:40:00.00'), 'box')
+    app.handle_timing_line(line(2, '6', '08:45:00.00'), 'box')
+    app.handle_timing_line(line(3, '5', '08:40:01.00'), 'box')
+    app.handle_timing_line(line(4, '999', '08:46:00.00'), 'box')
+    app.read_journal = None
+    journal.close()
+    assert [p['bib'] for p in published(pipeline)] == ['5', '6']
+
+    # A restart: nothing in memory, everything in the journal
+    for state in (app.results, app.sequences, app.read_dedupe):
+        state.reset()
+    board = app.leaderboard_hub.subscribe('board')
+    try:
+        assert app.replay_journal(ReadJournal(str(tmp_path))) == 5
+        # Screens are told to reload rather than sent the old deltas again
+        assert published(board) == [{'type': 'leaderboard_reset'}]
+    finally:
+        app.leaderboard_hub.unsubscribe(board)
+
+    assert app.results.standings('10K', 'finish')['total'] == 2
+    assert app.results.result('6')['splits']['finish']['gun_time'] == '45:00'
+    # Repeats of journaled reads are still recognised
+    app.handle_timing_line(line(2, '6', '08:45:00.00'), 'box')
+    app.handle_timing_line(line(5, '5', '08:40:02.00'), 'box')
+    assert published(pipeline) == []
+    app.handle_timing_line(line(6, '7', '08:50:00.00'), 'box')
+    assert [p['bib'] for p in published(pipeline)] == ['7']
+
+
+def test_chip_in_a_line_is_normalized_when_parsed(pipeline):
+    assert app.parse_timing_line(line(1, '999', '08:40:00.00', tag=' chip5 '))['tagcode'] == 'CHIP5'
+    app.handle_timing_line(line(1, '999', '08:40:00.00', tag='chip5'), 'box')
+    assert [p['bib'] for p in published(pipeline)] == ['5']
+
+
+def observation(tag, epoch, rssi, timer='finish'):
+    return f'TO~1~{tag}~{timer}~E1~{epoch}~1~1~{rssi}~1~1'
+
+
+def test_tag_observations_become_one_crossing(pipeline):
+    epoch = 1700000000.0
+    # The reader reports the chip in lower case; the roster has CHIP7
+    for offset, rssi in ((0, -60), (0.1, -48), (0.2, -55)):
+        app.handle_timing_line(observation(' chip7', epoch + offset, rssi), 'box')
+    app.tag_reducer.flush(now=float('inf'))
+
+    payloads = published(pipeline)
+    assert [(p['bib'], p['location']) for p in payloads] == [('7', 'finish')]
+    assert app.results.result('7') is not None
+
+
+def test_concurrent_callers_accept_each_read_once(pipeline):
+    import threading
+
+    lines = [line('', str(bib), f'08:{bib:02d}:00.00') for bib in range(1, 21)]
+    barrier = threading.Barrier(8)
+
+    def feed(number):
+        barrier.wait()
+        for text in lines:
+            app.handle_timing_line(text, f'box-{number}')
+
+    threads = [threading.Thread(target=feed, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    bibs = [p['bib'] for p in published(pipeline)]
+    assert sorted(bibs, key=int) == [str(bib) for bib in range(1, 21)]
+    assert len(app.results) == 20
+
+
+def test_restarted_box_is_not_mistaken_for_a_replay(pipeline, monkeypatch):
+    alerts = []
+    monkeypatch.setattr(app.alert_bus, 'post', lambda kind, key, message, **data: alerts.append(kind))
+    for sequence, bib in enumerate(range(1, 6), start=1):
+        app.handle_timing_line(line(sequence, str(bib), f'08:40:0{bib}.00'), 'box')
+    # Resending a read already seen is dropped
+    app.handle_timing_line(line(3, '3', '08:40:03.00'), 'box')
+    # After a restart the box counts from 3 again, with new reads
+    app.handle_timing_line(line(3, '8', '08:41:00.00'), 'box')
+    app.handle_timing_line(line(4, '9', '08:41:05.00'), 'box')
+    assert [p['bib'] for p in published(pipeline)] == ['1', '2', '3', '4', '5', '8', '9']
+    assert alerts == ['reader_restart']
+
+
+def test_replay_has_no_live_side_effects(pipeline, monkeypatch, tmp_path):
+    journal = ReadJournal(str(tmp_path), fsync=False)
+    app.read_journal = journal.start()
+    # A gap, then the box restarting its count
+    for sequence, bib in ((1, '1'), (2, '2'), (5, '3'), (1, '4')):
+        app.handle_timing_line(line(sequence, bib, f'08:40:0{bib}.00'), 'box')
+    app.read_journal = None
+    journal.close()
+
+    requests, alerts, locked = [], [], []
+    monkeypatch.setattr(app.sequences, 'on_gap', lambda *gap: requests.append(gap))
+    monkeypatch.setattr(app.alert_bus, 'post', lambda kind, *args, **data: alerts.append(kind))
+    monkeypatch.setattr(app, 'REPLAY_BATCH', 2)
+    replayed = ReadJournal(str(tmp_path))
+    records = replayed.replay
+
+    def watched():
+        for record in records():
+            # Read between batches, with live reads free to run
+            locked.append(app.ingest_lock.locked())
+            yield record
+
+    monkeypatch.setattr(replayed, 'replay', watched)
+    app.sequences.reset()
+    assert app.replay_journal(replayed) == 4
+    assert requests == [] and alerts == []
+    assert locked == [False] * 4
+    # The state is rebuilt all the same: the box is on its second count
+    assert app.sequences.gaps() == {}
+    app.handle_timing_line(line(2, '5', '08:41:00.00'), 'box')
+    assert published(pipeline)[-1]['bib'] == '5'
+
+
+def test_vip_crossing_raises_an_alert(pipeline, monkeypatch):
+    alerts = []
+    monkeypatch.setattr(app, 'VIP_BIBS', frozenset({'7'}))
+    monkeypatch.setattr(app.alert_bus, 'post', lambda kind, key, message, **data: alerts.append((kind, key, data)))
+    app.handle_timing_line(line(1, '6', '08:40:00.00'), 'box')
+    app.handle_timing_line(line(2, '7', '08:40:01.00'), 'box')
+    assert alerts == [('vip', '7', {'bib': '7', 'location': 'finish'})]
+
+
+def test_switching_event_forgets_recent_reads(pipeline, monkeypatch):
+    roster = app.roster_data
+    monkeypatch.setattr(app, 'current_event_id', 'E1')
+    app.handle_timing_line(line(1, '5', '08:40:00.00'), 'box')
+    monkeypatch.setattr(app.read_dedupe, 'window', 3600)
+
+    # Nothing answers on the test API, so only the switch itself happens
+    client = app.app.test_client()
+    client.post('/api/login', data={'user_id': 'u', 'password': 'p', 'event_id': 'E2'})
+    monkeypatch.setattr(app, 'roster_data', roster)
+
+    app.handle_timing_line(line(1, '5', '08:40:00.00'), 'box')
+    assert [p['bib'] for p in published(pipeline)] == ['5', '5']
@@ -0,0 +1,155 @@
+import json
+import queue
+
+import pytest
+
+from broadcast import BroadcastHub, StreamEvent, project, projection_key
+from stream_filter import compile_filter
+
+
+def drain(subscriber):
+    events = []
+    while True:
+        try:
+            events.append(subscriber.get(timeout=0))
+        except queue.Empty:
+            return events
+
+
+def test_control_frames_reach_filtered_subscribers():
+    hub = BroadcastHub()
+    board = hub.subscribe('board', stream_filter=compile_filter({'category': ['overall']}))
+    hub.publish({'type': 'leaderboard', 'category': 'gender:F', 'version': 1})
+    hub.publish({'type': 'leaderboard_reset'})
+    assert [event.data for event in drain(board)] == [{'type': 'leaderboard_reset'}]
+
+
+def test_every_subscriber_gets_each_event_in_order():
+    hub = BroadcastHub()
+    first, second = hub.subscribe('a'), hub.subscribe('b')
+    for n in range(3):
+        hub.publish({'bib': str(n)})
+    for subscriber in (first, second):
+        assert [event.id for event in drain(subscriber)] == [f'{hub.boot}-{n}' for n in (1, 2, 3)]
+
+
+def test_slow_subscriber_drops_its_oldest_without_holding_up_others():
+    hub = BroadcastHub(buffer_size=3)
+    slow, fast = hub.subscribe('slow'), hub.subscribe('fast')
+    received = []
+    for n in range(10):
+        hub.publish({'bib': str(n)})
+        received.extend(event.data['bib'] for event in drain(fast))
+    assert received == [str(n) for n in range(10)]
+    assert [event.data['bib'] for event in drain(slow)] == ['7', '8', '9']
+    assert (slow.dropped, fast.dropped) == (7, 0)
+    assert slow.pending() == 0
+
+
+def test_unsubscribe_removes_and_wakes_the_subscriber():
+    hub = BroadcastHub()
+    subscriber = hub.subscribe('a')
+    other = hub.subscribe('b')
+    assert len(hub) == 2
+    hub.unsubscribe(subscriber)
+    assert hub.subscribers() == (other,)
+    assert subscriber.closed
+    # A reader waiting on a closed subscriber returns instead of hanging
+    with pytest.raises(queue.Empty):
+        subscriber.get(timeout=5)
+    hub.publish({'bib': '1'})
+    assert drain(subscriber) == []
+
+
+def test_stream_client_going_away_unsubscribes():
+    import app
+    before = len(app.data_hub)
+    response = app.app.test_client().get('/stream')
+    assert next(response.response) == b'retry: 2000\n\n'
+    assert len(app.data_hub) == before + 1
+    response.close()
+    assert len(app.data_hub) == before
+
+
+def published_hub(count, replay_size=5):
+    hub = BroadcastHub(replay_size=replay_size)
+    for n in range(1, count + 1):
+        hub.publish({'bib': str(n)})
+    return hub
+
+
+def test_resume_sends_exactly_what_was_missed():
+    hub = published_hub(8)
+    subscriber = hub.subscribe('a', last_event_id=f'{hub.boot}-6')
+    assert [event.seq for event in drain(subscriber)] == [7, 8]
+    assert hub.replayed == 2
+    # Already up to date
+    assert drain(hub.subscribe('b', last_event_id=hub.last_event_id())) == []
+
+
+def test_resume_from_before_the_history_sends_all_of_it():
+    hub = published_hub(20)
+    subscriber = hub.subscribe('a', last_event_id=f'{hub.boot}-3')
+    assert [event.seq for event in drain(subscriber)] == [16, 17, 18, 19, 20]
+
+
+def test_ids_from_another_boot_or_malformed_replay_nothing():
+    hub = published_hub(8)
+    for last_event_id in ('0-5', f'{hub.boot}-x', 'garbage', ''):
+        assert drain(hub.subscribe('a', last_event_id=last_event_id)) == []
+
+
+def test_mirror_restarts_on_a_new_boot():
+    source = published_hub(3)
+    mirror = BroadcastHub(replay_size=5)
+    mirror.restart(source.boot)
+    for n in range(1, 4):
+        mirror.publish({'bib': str(n)}, seq=n)
+    # Frames resent after a reconnect are already here
+    assert mirror.publish({'bib': '3'}, seq=3) is None
+    assert mirror.last_event_id() == source.last_event_id()
+    resumed = mirror.subscribe('a', last_event_id=f'{source.boot}-1')
+    assert [event.seq for event in drain(resumed)] == [2, 3]
+
+    # A bus hello with the same boot keeps the history; a new boot drops it
+    mirror.restart(source.boot)
+    assert mirror.history_size() == 3
+    mirror.restart('newboot')
+    assert mirror.history_size() == 0
+    assert drain(mirror.subscribe('b', last_event_id=f'{source.boot}-1')) == []
+    assert mirror.publish({'bib': '9'}, seq=1).id == 'newboot-1'
+
+
+def test_a_jump_in_mirrored_seqs_is_not_replayed_across():
+    mirror = BroadcastHub(replay_size=10)
+    mirror.publish({'bib': '1'}, seq=1)
+    mirror.publish({'bib': '2'}, seq=2)
+    mirror.publish({'bib': '7'}, seq=7)
+    # The history restarted at 7, so a client at 2 gets what is known after it
+    resumed = mirror.subscribe('a', last_event_id=f'{mirror.boot}-2')
+    assert [event.seq for event in drain(resumed)] == [7]
+
+
+def test_projection_keys_are_normalized():
+    assert projection_key(None) is None
+    assert projection_key([]) is None
+    assert projection_key(['name', 'city', 'name']) == ('bib', 'city', 'name', 'type')
+    assert projection_key(('city', 'name')) == projection_key(['name', 'city', 'bib'])
+
+
+def test_batch_frames_keep_their_type():
+    batch = {'type': 'batch', 'count': 2,
+             'runners': [{'bib': '1', 'name': 'A', 'city': 'X'}, {'bib': '2', 'name': 'B', 'city': 'Y'}]}
+    assert project(batch, projection_key(['name'])) == {
+        'type': 'batch', 'runners': [{'bib': '1', 'name': 'A'}, {'bib': '2', 'name': 'B'}]}
+
+
+def test_each_projection_is_encoded_once():
+    event = StreamEvent({'bib': '1', 'name': 'A', 'city': 'X'})
+    key = projection_key(['name'])
+    text = event.encode(key)
+    assert json.loads(text) == {'bib': '1', 'name': 'A'}
+    # The same object comes back, so subscribers sharing a projection share the work
+    assert event.encode(projection_key(['name'])) is text
+    assert json.loads(event.encode()) == event.data
+    assert set(event._encoded) == {key, None}
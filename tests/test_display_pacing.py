@@ -0,0 +1,79 @@
+from display_pacing import PresentationScheduler
+
+
+def read(bib, location='finish', **fields):
+    return {'bib': bib, 'location': location, **fields}
+
+
+def frames(scheduler):
+    shown = []
+    while scheduler.backlog():
+        shown.append(scheduler._next_frame())
+    return shown
+
+
+def test_priority_order():
+    scheduler = PresentationScheduler(lambda frame: None, vip_bibs=('7',))
+    scheduler.submit(read('1', 'mile5'))
+    scheduler.submit(read('2'))
+    scheduler.submit(read('7', 'mile5'))
+    scheduler.submit(read('3'))
+    assert [frame['bib'] for frame in frames(scheduler)] == ['7', '2', '3', '1']
+
+
+def test_repeat_finish_ranks_below_first_finishes():
+    scheduler = PresentationScheduler(lambda frame: None)
+    scheduler.submit(read('1'))
+    assert frames(scheduler)[0]['bib'] == '1'
+    scheduler.submit(read('1'))
+    scheduler.submit(read('2'))
+    assert [frame['bib'] for frame in frames(scheduler)] == ['2', '1']
+
+
+def test_skipped_finish_is_not_remembered():
+    scheduler = PresentationScheduler(lambda frame: None, max_backlog=2)
+    scheduler.submit(read('1'))
+    scheduler.submit(read('2'))
+    scheduler.submit(read('3'))
+    # The oldest of the least important payloads went
+    assert [frame['bib'] for frame in frames(scheduler)] == ['2', '3']
+    assert scheduler.stats['skipped'] == 1
+
+    scheduler.submit(read('4', 'mile5'))
+    scheduler.submit(read('1'))
+    assert [frame['bib'] for frame in frames(scheduler)] == ['1', '4']
+
+
+def test_backlog_skips_splits_before_finishes():
+    scheduler = PresentationScheduler(lambda frame: None, max_backlog=3)
+    for bib in '123':
+        scheduler.submit(read(bib, 'mile5'))
+    scheduler.submit(read('9'))
+    scheduler.submit(read('8'))
+    assert [frame['bib'] for frame in frames(scheduler)] == ['9', '8', '3']
+    assert scheduler.stats == {'submitted': 5, 'shown': 3, 'skipped': 2, 'batches': 0}
+
+
+def test_batches_when_backlog_is_deep():
+    scheduler = PresentationScheduler(lambda frame: None, batch_size=2)
+    for bib in '123':
+        scheduler.submit(read(bib))
+    batch, single = frames(scheduler)
+    assert batch == {'type': 'batch', 'runners': [read('1'), read('2')]}
+    assert single == read('3')
+    scheduler.submit(read('2'))
+    scheduler.submit(read('4'))
+    assert [frame['bib'] for frame in frames(scheduler)[0]['runners']] == ['4', '2']
+
+
+def test_reset_forgets_the_event():
+    scheduler = PresentationScheduler(lambda frame: None)
+    scheduler.submit(read('1'))
+    frames(scheduler)
+    scheduler.submit(read('5', 'mile5'))
+    scheduler.reset()
+    assert scheduler.backlog() == 0
+    # '1' finished in the last event; here it's a first finish again
+    scheduler.submit(read('1'))
+    scheduler.submit(read('2'))
+    assert [frame['bib'] for frame in frames(scheduler)] == ['1', '2']
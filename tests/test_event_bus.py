@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from event_bus import EventBusPublisher, EventBusSubscriber, HELLO
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def bus(tmp_path):
+    publisher = EventBusPublisher(str(tmp_path / 'bus.sock'), buffer_size=5, hello={'display': 'boot1'})
+    publisher.retain('display', 3)
+    publisher.retain('result')
+    yield publisher.start()
+    publisher.close()
+
+
+def collect(bus, frames, **handlers):
+    handlers.setdefault(HELLO, lambda seq, hello: frames.append((HELLO, hello)))
+    for channel in ('display', 'result'):
+        handlers.setdefault(channel, lambda seq, payload, channel=channel: frames.append((channel, seq, payload)))
+    return EventBusSubscriber(bus.path, handlers, retry=0.05).start()
+
+
+def test_late_worker_gets_hello_retained_then_live(bus):
+    for n in range(5):
+        bus.publish('display', {'n': n})
+    bus.publish('result', ['gun', '08:00:00.00'])
+    frames = []
+    subscriber = collect(bus, frames)
+    try:
+        wait_for(lambda: len(frames) == 5)
+        assert frames == [
+            (HELLO, {'display': 'boot1'}),
+            ('display', 3, {'n': 2}), ('display', 4, {'n': 3}), ('display', 5, {'n': 4}),
+            ('result', 1, ['gun', '08:00:00.00']),
+        ]
+        bus.publish('display', {'n': 5}, seq=9)
+        wait_for(lambda: len(frames) == 6)
+        assert frames[-1] == ('display', 9, {'n': 5})
+    finally:
+        subscriber.stop()
+
+
+def test_cleared_channel_is_not_resent(bus):
+    bus.publish('result', ['gun', '08:00:00.00'])
+    bus.clear('result')
+    bus.publish('result', ['reset'])
+    frames = []
+    subscriber = collect(bus, frames)
+    try:
+        wait_for(lambda: len(frames) == 2)
+        assert frames[1] == ('result', 2, ['reset'])
+    finally:
+        subscriber.stop()
+
+
+def test_worker_that_falls_behind_is_disconnected_and_resyncs(bus):
+    frames = []
+    stalled = threading.Event()
+    release = threading.Event()
+
+    def stall(seq, payload):
+        frames.append(('result', seq, payload))
+        if seq == 1:
+            stalled.set()
+            release.wait(5)
+
+    subscriber = collect(bus, frames, result=stall)
+    try:
+        wait_for(lambda: subscriber.connected)
+        bus.publish('result', ['gun', '08:00:00.00'])
+        assert stalled.wait(5)
+        # Enough to fill the socket as well as the worker's buffer
+        padding = 'x' * 4096
+        for n in range(300):
+            bus.publish('result', ['read', str(n), padding])
+        release.set()
+        wait_for(lambda: bus.stats['overflows'] == 1 and subscriber.stats['connects'] == 2)
+        # The second connection starts over with everything retained
+        wait_for(lambda: frames[-1][1] == 301)
+        restarted = frames.index((HELLO, {'display': 'boot1'}), 1)
+        assert [frame[1] for frame in frames[restarted + 1:]] == list(range(1, 302))
+        # Nothing after the drop was delivered out of order on the first one
+        first = [frame[1] for frame in frames[1:restarted]]
+        assert first == sorted(first) and first[-1] < 301
+    finally:
+        release.set()
+        subscriber.stop()
@@ -0,0 +1,57 @@
+import socket
+import threading
+
+import pytest
+
+from ingest_async import AsyncTimingServer
+
+SETTINGS = ('location=multi', 'stream-mode=push')
+
+
+@pytest.fixture
+def server():
+    lines = []
+    connected = {}
+    ready = threading.Event()
+    server = AsyncTimingServer(
+        '127.0.0.1', 0, SETTINGS, lambda line, source: lines.append((line, source)),
+        source_for=lambda peer, greeting: greeting.split('~')[0],
+        on_connect=lambda source, send: (connected.__setitem__(source, send), ready.set()),
+        acks=('rewind',)
+    )
+    server.address = server.start()
+    server.lines, server.connected, server.ready = lines, connected, ready
+    yield server
+    server.stop()
+
+
+def handshake(server, name='box-1'):
+    sock = socket.create_connection(server.address, timeout=5)
+    rfile = sock.makefile('rb')
+    sock.sendall(f'{name}~1.0~CTP01\r\n'.encode())
+    greeting = rfile.readline().decode().strip().split('~')
+    assert greeting[2] == str(len(SETTINGS))
+    replies = [rfile.readline().decode().strip() for _ in range(len(SETTINGS) + 3)]
+    assert replies[-1] == 'start'
+    assert server.ready.wait(5)
+    return sock, rfile
+
+
+def test_send_from_another_thread_reaches_the_box(server):
+    sock, rfile = handshake(server)
+    send = server.connected['box-1']
+
+    worker = threading.Thread(target=send, args=('rewind', 'finish', 5, 9))
+    worker.start()
+    worker.join(5)
+    assert rfile.readline() == b'rewind~finish~5~9\r\n'
+    sock.close()
+
+
+def test_acks_to_configured_commands_are_not_reads(server):
+    sock, rfile = handshake(server)
+    sock.sendall(b'ack~start\r\nack~rewind\r\nack~other\r\nCT01_33~1~finish~42~10:00:00.00~0~T1~1\r\nping\r\n')
+    assert rfile.readline() == b'ack~ping\r\n'
+    assert [line for line, _ in server.lines] == ['ack~other', 'CT01_33~1~finish~42~10:00:00.00~0~T1~1']
+    assert {source for _, source in server.lines} == {'box-1'}
+    sock.close()
@@ -0,0 +1,57 @@
+import logging
+import queue
+
+import pytest
+
+from log_config import DeferredQueueHandler, RateLimitedLogger
+
+
+def queued_logger(name):
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [DeferredQueueHandler(log_queue)]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger, log_queue
+
+
+def test_mutable_arguments_are_rendered_when_logged():
+    logger, log_queue = queued_logger('tests.deferred.mutable')
+    data = {'bib': '42'}
+    logger.info("Read %s", data)
+    data['backfilled'] = True
+
+    record = log_queue.get_nowait()
+    assert record.getMessage() == "Read {'bib': '42'}"
+
+
+def test_primitive_arguments_stay_deferred():
+    logger, log_queue = queued_logger('tests.deferred.primitive')
+    logger.info("Read %s at %s (%d)", '42', 'finish', 3)
+
+    record = log_queue.get_nowait()
+    assert record.msg == "Read %s at %s (%d)"
+    assert record.args == ('42', 'finish', 3)
+    assert record.getMessage() == "Read 42 at finish (3)"
+
+
+def test_sampling_after_burst():
+    logger, log_queue = queued_logger('tests.ratelimited')
+    limited = RateLimitedLogger(logger, burst=2, sample_every=5)
+    for number in range(1, 13):
+        limited.warning("Unknown bib %s", number)
+
+    messages = []
+    while not log_queue.empty():
+        messages.append(log_queue.get_nowait().getMessage())
+    assert messages == [
+        "Unknown bib 1",
+        "Unknown bib 2",
+        "Unknown bib 5 (2 similar messages suppressed)",
+        "Unknown bib 10 (4 similar messages suppressed)",
+    ]
+
+
+def test_sample_every_must_be_positive():
+    with pytest.raises(ValueError):
+        RateLimitedLogger(logging.getLogger('tests.ratelimited'), sample_every=0)
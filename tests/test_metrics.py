@@ -0,0 +1,71 @@
+import gc
+import threading
+
+from metrics import Registry
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_counter_totals_survive_finished_threads():
+    registry = Registry()
+    lines = registry.counter('lines_total', 'Lines', ['source'])
+
+    def work():
+        for _ in range(100):
+            lines.labels('box').inc()
+
+    for _ in range(5):
+        run_threads(20, work)
+    gc.collect()
+
+    child = lines.labels('box')
+    assert child.get() == 10000
+    # Cells of finished threads were folded into the base
+    assert len(child._value) == 0
+    lines.labels('box').inc(5)
+    assert child.get() == 10005
+    assert len(child._value) == 1
+
+
+def test_histogram_buckets_and_sum():
+    registry = Registry()
+    seconds = registry.histogram('line_seconds', 'Time per line', buckets=(0.01, 0.1))
+
+    def work():
+        seconds.observe(0.005)
+        seconds.observe(0.05)
+        seconds.observe(1)
+
+    run_threads(10, work)
+    gc.collect()
+    text = registry.exposition()
+    assert 'line_seconds_bucket{le="0.01"} 10\n' in text
+    assert 'line_seconds_bucket{le="0.1"} 20\n' in text
+    assert 'line_seconds_bucket{le="+Inf"} 30\n' in text
+    assert 'line_seconds_count 30\n' in text
+    total = next(line for line in text.splitlines() if line.startswith('line_seconds_sum '))
+    assert abs(float(total.split()[1]) - 10.55) < 1e-9
+
+
+def test_exposition_format():
+    registry = Registry()
+    registry.counter('reads_total', 'Reads', ['source']).labels('a"b').inc(2)
+    registry.gauge_callback('backlog', 'Waiting', lambda: 3)
+    registry.gauge_callback('lag', 'Lag', lambda: [(('x',), 1.5)], labelnames=['source'])
+    assert registry.exposition().splitlines() == [
+        '# HELP reads_total Reads',
+        '# TYPE reads_total counter',
+        'reads_total{source="a\\"b"} 2',
+        '# HELP backlog Waiting',
+        '# TYPE backlog gauge',
+        'backlog 3',
+        '# HELP lag Lag',
+        '# TYPE lag gauge',
+        'lag{source="x"} 1.5',
+    ]
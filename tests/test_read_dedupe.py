@@ -0,0 +1,63 @@
+from read_dedupe import ReadDeduplicator
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_repeat_inside_window_is_dropped():
+    clock = Clock()
+    dedupe = ReadDeduplicator(window=10.0, clock=clock)
+    assert dedupe.accept('42', 'finish')
+    clock.now += 9.9
+    assert not dedupe.accept('42', 'finish')
+    # Another location or runner is a different read
+    assert dedupe.accept('42', 'mile5')
+    assert dedupe.accept('43', 'finish')
+    assert dedupe.stats['duplicate_window'] == 1
+    assert dedupe.stats['accepted'] == 3
+
+
+def test_window_counts_from_the_accepted_read():
+    clock = Clock()
+    dedupe = ReadDeduplicator(window=10.0, clock=clock)
+    assert dedupe.accept('42', 'finish')
+    clock.now += 6
+    assert not dedupe.accept('42', 'finish')
+    # A dropped read doesn't extend the window
+    clock.now += 4
+    assert dedupe.accept('42', 'finish')
+
+
+def test_expired_keys_are_evicted_and_size_is_capped():
+    clock = Clock()
+    dedupe = ReadDeduplicator(window=10.0, max_keys=3, clock=clock)
+    for bib in '1234':
+        assert dedupe.accept(bib, 'finish')
+    assert len(dedupe) == 3
+    assert dedupe.stats['evicted'] == 1
+    # The oldest key was evicted, so its repeat gets through
+    assert dedupe.accept('1', 'finish')
+
+    clock.now += 11
+    dedupe.accept('9', 'finish')
+    assert len(dedupe) == 1
+
+
+def test_seeded_reads_suppress_repeats_after_restart():
+    clock = Clock()
+    dedupe = ReadDeduplicator(window=10.0, clock=clock)
+    dedupe.seed('42', 'finish', now=clock.now - 5)
+    dedupe.seed('43', 'finish', now=clock.now - 5, accepted=False)
+    assert not dedupe.accept('42', 'finish')
+    assert dedupe.accept('43', 'finish')
+    assert dedupe.stats['accepted'] == 1
+
+
+def test_zero_window_accepts_everything():
+    dedupe = ReadDeduplicator(window=0)
+    assert all(dedupe.accept('42', 'finish') for _ in range(5))
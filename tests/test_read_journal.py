@@ -0,0 +1,57 @@
+import os
+
+from read_journal import ACCEPTED, DUPLICATE, ReadJournal
+
+
+def write(journal, records):
+    journal.start()
+    for record in records:
+        journal.append(*record)
+    journal.close()
+
+
+def records(count, start=1000.0, source='box'):
+    return [(start + i, source, f'CT01_33~{i + 1}~finish~{i + 1}~10:00:00.00~0~T~1', ACCEPTED, str(i + 1))
+            for i in range(count)]
+
+
+def test_records_survive_reopening(tmp_path):
+    directory = str(tmp_path)
+    write(ReadJournal(directory, fsync=False), records(5))
+    reopened = ReadJournal(directory, fsync=False)
+    write(reopened, records(3, start=2000.0))
+
+    # Every open starts a new segment
+    assert reopened.segments() == [1, 2]
+    replayed = list(ReadJournal(directory).replay())
+    assert len(replayed) == 8
+    assert replayed[0] == [1000.0, 'box', 'CT01_33~1~finish~1~10:00:00.00~0~T~1', ACCEPTED, '1']
+    assert [r[0] for r in replayed] == sorted(r[0] for r in replayed)
+
+
+def test_torn_last_record_is_skipped(tmp_path):
+    directory = str(tmp_path)
+    write(ReadJournal(directory, fsync=False), records(4))
+    with open(os.path.join(directory, '00000001.log'), 'ab') as fp:
+        fp.write(b'[1004.0,"box","CT01_33~5~fin')
+
+    assert len(list(ReadJournal(directory).replay())) == 4
+    # Appending after the crash goes to a fresh segment, not after the torn line
+    journal = ReadJournal(directory, fsync=False)
+    write(journal, [(3000.0, 'box', 'CT01_33~9~finish~9~10:00:00.00~0~T~1', DUPLICATE, '9')])
+    replayed = list(ReadJournal(directory).replay())
+    assert len(replayed) == 5
+    assert replayed[-1][3] == DUPLICATE
+
+
+def test_rotation_and_time_range_scan(tmp_path):
+    directory = str(tmp_path)
+    journal = ReadJournal(directory, segment_bytes=2000, index_every=8, max_batch=10, fsync=False)
+    write(journal, records(200))
+    assert len(journal.segments()) > 3
+
+    scanned = list(ReadJournal(directory).scan(1050.0, 1059.5))
+    assert [r[0] for r in scanned] == [1050.0 + i for i in range(10)]
+    assert len(list(ReadJournal(directory).scan(end=1009.0))) == 10
+    assert len(list(ReadJournal(directory).scan(start=1190.0))) == 10
+    assert journal.stats['written'] == 200
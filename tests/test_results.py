@@ -0,0 +1,136 @@
+from results import LEADERBOARD_RESET, ResultsEngine, clock_seconds, format_duration
+
+
+def runner(name, race='10K', gender='F', division='F30-34'):
+    return {'name': name, 'race_name': race, 'gender': gender, 'division': division}
+
+
+def test_clock_and_duration_formatting():
+    assert clock_seconds('14:02:15.31') == 14 * 3600 + 2 * 60 + 15.31
+    assert clock_seconds('15.5') == 15.5
+    assert clock_seconds('bad') is None
+    assert format_duration(59.9) == '0:59'
+    assert format_duration(3725) == '1:02:05'
+    assert format_duration(None) == ''
+
+
+def test_gun_chip_times_and_pace():
+    engine = ResultsEngine(distances={'10K': 6.2})
+    engine.record_gun('08:00:00.00')
+    engine.record('1', runner('A'), 'start', '08:00:30.00')
+    fields = engine.record('1', runner('A'), 'finish', '08:50:30.00')
+    assert fields['gun_time'] == '50:30'
+    assert fields['chip_time'] == '50:00'
+    assert fields['pace'] == '8:03/mi'
+    assert (fields['place_overall'], fields['overall_count']) == (1, 1)
+
+
+def test_wave_starts_use_the_last_gun_before_the_start_mat():
+    engine = ResultsEngine(rank_by='gun')
+    engine.record_gun('08:00:00.00')
+    engine.record_gun('08:10:00.00')
+    engine.record('1', runner('A'), 'start', '08:00:05.00')
+    engine.record('2', runner('B'), 'start', '08:10:05.00')
+    # Runners who skip the start mat are timed from the last gun before they finish
+    engine.record('3', runner('C'), 'finish', '08:55:00.00')
+    assert engine.record('1', runner('A'), 'finish', '08:50:00.00')['gun_time'] == '50:00'
+    assert engine.record('2', runner('B'), 'finish', '08:55:00.00')['gun_time'] == '45:00'
+    assert engine.result('3')['splits']['finish']['gun_time'] == '45:00'
+
+
+def test_places_per_category_and_repeat_reads():
+    engine = ResultsEngine()
+    engine.record_gun('08:00:00.00')
+    engine.record('1', runner('A', gender='F'), 'finish', '08:50:00.00')
+    engine.record('2', runner('B', gender='M', division='M40-44'), 'finish', '08:40:00.00')
+    fields = engine.record('3', runner('C', gender='F'), 'finish', '08:45:00.00')
+    assert (fields['place_overall'], fields['place_gender'], fields['place_division']) == (2, 1, 1)
+    assert fields['gender_count'] == 2
+    # A repeat finish read doesn't add the runner twice
+    engine.record('1', runner('A', gender='F'), 'finish', '08:59:00.00')
+    standings = engine.standings('10K', 'finish')
+    assert [row['bib'] for row in standings['results']] == ['2', '3', '1']
+    assert standings['results'][2]['chip_time'] == '50:00'
+    assert engine.races() == {'10K': ['finish']}
+
+
+def test_laps_and_midnight():
+    engine = ResultsEngine()
+    engine.record_gun('23:50:00.00')
+    engine.record('1', runner('A'), 'start', '23:50:30.00')
+    engine.record('1', runner('A'), 'lap', '23:59:00.00', lap='1')
+    fields = engine.record('1', runner('A'), 'lap', '00:08:00.00', lap='2')
+    assert fields['chip_time'] == '17:30'
+    assert fields['gun_time'] == '18:00'
+    assert set(engine.result('1')['splits']) == {'lap', 'lap#2'}
+
+
+def test_leaderboard_deltas_and_versions():
+    deltas = []
+    engine = ResultsEngine(board_size=2, on_leaderboard=deltas.append)
+    engine.record_gun('08:00:00.00')
+    engine.record('1', runner('A'), 'finish', '08:50:00.00')
+    engine.record('2', runner('B'), 'finish', '08:40:00.00')
+    engine.record('3', runner('C'), 'finish', '08:55:00.00')
+
+    overall = [d for d in deltas if d['category'] == 'overall']
+    # The third finisher is outside the top two, so no delta for it
+    assert [(d['version'], d['place'], d['row']['bib']) for d in overall] == [(1, 1, '1'), (2, 1, '2')]
+    board = engine.leaderboard('10K', 'finish')
+    assert board['version'] == 2
+    assert board['total'] == 3
+    assert [row['bib'] for row in board['leaders']] == ['2', '1']
+
+
+def test_reset_clears_everything():
+    engine = ResultsEngine()
+    engine.record_gun('08:00:00.00')
+    engine.record('1', runner('A'), 'finish', '08:50:00.00')
+    engine.reset()
+    assert len(engine) == 0
+    assert engine.leaderboard('10K', 'finish')['leaders'] == []
+    # No gun any more, so only chip-less elapsed times are unknown
+    assert engine.record('1', runner('A'), 'finish', '08:50:00.00')['gun_time'] == ''
+
+
+def test_changes_mirror_another_engine():
+    changes = []
+    engine = ResultsEngine(on_change=changes.append)
+    engine.record_gun('08:00:00.00')
+    engine.record_gun('08:00:00.00')
+    engine.record('1', runner('A'), 'finish', '08:50:00.00')
+    engine.record('2', runner('B'), 'start', '08:00:10.00')
+    engine.record('2', runner('B'), 'start', '08:00:12.00')
+    engine.record('2', runner('B'), 'finish', '08:45:00.00')
+    engine.record('1', runner('A'), 'finish', '08:50:05.00')
+    # Repeat guns and crossings change nothing and aren't passed on
+    assert [change[0] for change in changes] == ['gun', 'read', 'read', 'read']
+
+    mirror = ResultsEngine()
+    for change in changes:
+        mirror.apply(change)
+    assert mirror.leaderboard('10K', 'finish') == engine.leaderboard('10K', 'finish')
+    assert mirror.result('2') == engine.result('2')
+
+
+def test_reset_and_quiet_tell_screens_to_reload():
+    deltas = []
+    engine = ResultsEngine(on_leaderboard=deltas.append)
+    engine.record_gun('08:00:00.00')
+    engine.record('1', runner('A'), 'finish', '08:50:00.00')
+    assert deltas[-1]['version'] == 1
+    engine.reset()
+    assert deltas[-1] == LEADERBOARD_RESET
+    deltas.clear()
+
+    with engine.quiet():
+        engine.record('1', runner('A'), 'finish', '08:50:00.00')
+        engine.record('2', runner('B'), 'finish', '08:51:00.00')
+        engine.reset()
+        engine.record_gun('08:00:00.00')
+        engine.record('2', runner('B'), 'finish', '08:51:00.00')
+    # Versions kept counting, but only the reset at the end was sent
+    assert deltas == [LEADERBOARD_RESET]
+    assert engine.leaderboard('10K', 'finish')['version'] == 1
+    engine.record('3', runner('C'), 'finish', '08:52:00.00')
+    assert deltas[-1]['version'] == 2
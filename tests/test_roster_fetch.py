@@ -0,0 +1,120 @@
+import pytest
+
+import app
+import roster_stub
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    servers = []
+
+    def start(**kwargs):
+        server = roster_stub.start_stub(**kwargs)
+        servers.append(server)
+        host, port = server.server_address
+        monkeypatch.setitem(app.API_CONFIG, 'BASE_URL', f'http://{host}:{port}/api')
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_concurrent_fetch_loads_every_page(stub):
+    server = stub(entries=1050, latency=0.01)
+    assert app.fetch_complete_roster('E1', {}, workers=4, page_size=100)
+
+    assert len(app.roster_data) == 1050
+    assert app.login_progress == {'total_entries': 1050, 'loaded_entries': 1050, 'complete': True}
+    # Each page asked for once, whatever order they complete in
+    assert sorted(server.requested) == list(range(1, 12))
+    # Every runner landed under its own bib with its own page's record
+    for entry in server.roster:
+        runner = app.roster_data[entry['entry_bib']]
+        assert runner['name'] == entry['entry_name']
+        assert runner['entry_id'] == entry['entry_id']
+    assert app.race_name == server.roster[0]['race_name']
+
+
+def test_single_worker_fetch_matches(stub):
+    server = stub(entries=250)
+    assert app.fetch_complete_roster('E1', {}, workers=1, page_size=100)
+    assert server.requested == [1, 2, 3]
+    assert len(app.roster_data) == 250
+
+
+def test_failing_page_fails_the_fetch_after_another_pass(stub):
+    server = stub(entries=500, failing_pages={3})
+    assert not app.fetch_complete_roster('E1', {}, workers=4, page_size=100)
+
+    # PAGE_RETRIES is 2: three attempts at page 3, three more after the
+    # others, and the others once
+    assert server.requested.count(3) == 6
+    assert sorted(p for p in server.requested if p != 3) == [1, 2, 4, 5]
+    assert app.login_progress['failed_pages'] == [3]
+    assert not app.login_progress['complete']
+
+
+def test_malformed_page_is_not_retried(stub):
+    server = stub(entries=300, malformed_pages={2})
+    assert not app.fetch_complete_roster('E1', {}, workers=4, page_size=100)
+
+    # Once in the pool and once in the second pass
+    assert server.requested.count(2) == 2
+
+
+def test_bad_base_url_fails_the_fetch(monkeypatch):
+    # requests raises MissingSchema, a ValueError, before any response exists
+    monkeypatch.setitem(app.API_CONFIG, 'BASE_URL', 'no-scheme/api')
+    assert app.fetch_roster_page('E1', {}, page=1) == (None, None)
+    assert not app.fetch_complete_roster('E1', {}, workers=4)
+
+
+def test_failed_first_page_fails_the_fetch(stub):
+    stub(entries=300, failing_pages={1})
+    assert not app.fetch_complete_roster('E1', {}, workers=4, page_size=100)
+
+
+def test_refresh_applies_only_changed_entries(stub, monkeypatch):
+    server = stub(entries=300)
+    assert app.fetch_complete_roster('E1', {}, page_size=100)
+    monkeypatch.setattr(app, 'current_event_id', 'E1')
+    monkeypatch.setattr(app, 'roster_synced_at', None)
+    before = app.roster_data
+
+    # Everything comes back for since=0, but it all matches the live roster
+    assert app.refresh_roster('E1', {})
+    assert app.roster_data is before
+
+    roster_stub.touch_entry(server.roster[4], entry_name='Changed Name')
+    assert app.refresh_roster('E1', {})
+    assert app.roster_data is not before
+    assert app.roster_data['5']['name'] == 'Changed Name'
+    assert len(app.roster_data) == 300
+
+
+def login(client, **form):
+    return client.post('/api/login', data={'user_id': 'u', 'password': 'p', 'event_id': 'E9', **form}).get_json()
+
+
+def test_incomplete_roster_is_not_saved(stub, monkeypatch):
+    stub(entries=300, failing_pages={2})
+    monkeypatch.setattr(app, 'current_event_id', None)
+    response = login(app.app.test_client())
+
+    assert not response['success']
+    assert response['error'] == 'Failed to fetch roster'
+    assert app.roster_store.load_roster('E9') is None
+
+
+def test_full_sync_skips_the_snapshot(stub, monkeypatch):
+    server = stub(entries=300, failing_pages={2})
+    monkeypatch.setattr(app, 'current_event_id', 'E9')
+    monkeypatch.setattr(app, 'roster_synced_at', None)
+    app.roster_store.save_roster('E9', {'1': {'name': 'Saved'}}, '10K', 100.0)
+
+    assert login(app.app.test_client(), full_sync='1')['error'] == 'Failed to fetch roster'
+    assert 1 in server.requested
+    # The saved roster is left as it was
+    assert app.roster_store.load_roster('E9')[2] == 100.0
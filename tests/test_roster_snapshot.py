@@ -0,0 +1,31 @@
+import pytest
+
+from roster_snapshot import MappedRoster, write_roster_snapshot
+from roster_table import RosterTable, normalize_tag
+
+
+@pytest.fixture
+def table(record):
+    return RosterTable.from_records({
+        '42': record(42),
+        '007': record(7, tag=' Chip7 '),
+        '900': record(9000, entry_id='E901'),
+    })
+
+
+def test_mapped_roster_resolves_like_the_table(tmp_path, table):
+    path = str(tmp_path / 'roster.snapshot')
+    assert write_roster_snapshot(path, table) == 3
+    mapped = MappedRoster(path)
+
+    reads = [('1', 'TAG42'), ('1', ' tag42'), ('1', 'chip7'), ('7', None), ('007', None),
+             ('E901', None), ('900', 'nope'), ('404', None), ('404', '')]
+    for bib, tag in reads:
+        if tag:
+            tag = normalize_tag(tag)
+        expected_bib, expected = table.resolve(bib, tag)
+        found_bib, found = mapped.resolve(bib, tag)
+        assert found_bib == expected_bib, (bib, tag)
+        assert (found is None) == (expected is None)
+        if expected is not None:
+            assert found == dict(expected)
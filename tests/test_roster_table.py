@@ -0,0 +1,67 @@
+from roster_table import RosterTable, normalize_tag
+
+
+def make_table(record, count):
+    return RosterTable.from_records({str(bib): record(bib) for bib in range(1, count + 1)})
+
+
+def test_refresh_cycles_stay_bounded(record):
+    table = make_table(record, 100)
+    for cycle in range(50):
+        updated = table.copy()
+        # Every refresh rewrites the whole roster, as when modified_after is ignored
+        updated.update({str(bib): record(bib, city=f'City {cycle}') for bib in range(1, 101)})
+        table = updated
+        assert table.dead_rows <= 100
+    assert len(table) == 100
+    assert table['42']['city'] == 'City 49'
+    assert len(table._columns['name'].values) <= 200
+
+
+def test_compacted_copy_keeps_runners_and_aliases(record):
+    table = make_table(record, 10)
+    table.update({str(bib): record(bib, division='F30-34') for bib in range(1, 11)})
+    del table['3']
+    compacted = table.copy(compact=True)
+
+    assert compacted.dead_rows == 0
+    assert len(compacted) == 9
+    assert dict(compacted['7']) == dict(table['7'])
+    assert compacted.resolve('999', 'TAG7')[0] == '7'
+    assert compacted.resolve('E8')[0] == '8'
+    assert compacted.resolve('3') == (None, None)
+    # Interned values only the dead rows used are gone
+    assert compacted._columns['division'].values == ['F30-34']
+
+
+def test_copy_leaves_views_of_the_original_valid(record):
+    table = make_table(record, 5)
+    table.update({str(bib): record(bib, name=f'New {bib}') for bib in range(1, 6)})
+    view = table['2']
+    updated = table.copy(compact=True)
+    updated['2'] = record(2, name='Newer')
+
+    assert view['name'] == 'New 2'
+    assert updated['2']['name'] == 'Newer'
+    assert table['2']['name'] == 'New 2'
+
+
+def test_resolve_order_and_normalization(record):
+    table = RosterTable.from_records({
+        '42': record(42, tag='0F2A38'),
+        '0042': record(4200, tag=''),
+        '007': record(7),
+        'E900': record(900, entry_id='E900'),
+        '900': record(9000, entry_id='E901'),
+    })
+    # The chip wins over the bib the reader sent, once the read's tag is
+    # normalized the way the roster's chips are
+    assert table.resolve('1', '0F2A38')[0] == '42'
+    assert table.resolve('1', normalize_tag(' 0f2a38 '))[0] == '42'
+    assert table.resolve('1', ' 0f2a38 ') == (None, None)
+    assert table.resolve('42', 'UNKNOWN')[0] == '42'
+    # Exact bib, then entry_id, then the normalized bib
+    assert table.resolve('0042')[0] == '0042'
+    assert table.resolve('E901')[0] == '900'
+    assert table.resolve('7')[0] == '007'
+    assert table.resolve('404') == (None, None)
@@ -0,0 +1,115 @@
+from sequence_tracker import (
+    SequenceTracker, IN_ORDER, GAP, FILLED, DUPLICATE, RESET, UNTRACKED
+)
+
+
+def feed(tracker, numbers, source='box', location='finish'):
+    return [tracker.observe(source, location, number, ('read', number)) for number in numbers]
+
+
+def test_in_order_and_untracked():
+    tracker = SequenceTracker()
+    assert feed(tracker, [5, 6, 7]) == [IN_ORDER] * 3
+    assert tracker.observe('box', 'finish', '') == UNTRACKED
+    assert tracker.gaps() == {}
+
+
+def test_gap_is_reported_and_filled():
+    requested = []
+    tracker = SequenceTracker(on_gap=lambda *gap: requested.append(gap))
+    assert feed(tracker, [1, 2, 6]) == [IN_ORDER, IN_ORDER, GAP]
+    assert requested == [('box', 'finish', 3, 5)]
+    assert tracker.stats['missing'] == 3
+    assert feed(tracker, [4]) == [FILLED]
+    assert tracker.gaps() == {('box', 'finish'): [(3, 3), (5, 5)]}
+    assert feed(tracker, [3, 5]) == [FILLED, FILLED]
+    assert tracker.gaps() == {}
+    assert tracker.stats['missing'] == 0
+
+
+def test_resent_read_is_a_duplicate():
+    tracker = SequenceTracker()
+    feed(tracker, range(1, 11))
+    assert feed(tracker, [7]) == [DUPLICATE]
+    # Too old to have a fingerprint, and not far enough back to be a restart
+    assert tracker.observe('box', 'finish', 4) == DUPLICATE
+    # Streams are separate per location
+    assert tracker.observe('box', 'mile5', 7, 'x') == IN_ORDER
+
+
+def test_sequence_one_again_is_a_restart():
+    resets = []
+    tracker = SequenceTracker(on_reset=lambda *reset: resets.append(reset))
+    feed(tracker, [1, 2, 5])
+    assert tracker.observe('box', 'finish', 1, 'new read') == RESET
+    assert resets == [('box', 'finish', 1)]
+    assert tracker.gaps() == {}
+    assert tracker.stats['missing'] == 0
+    assert tracker.observe('box', 'finish', 2, 'another') == IN_ORDER
+
+
+def test_different_read_at_a_seen_number_is_a_restart():
+    tracker = SequenceTracker()
+    feed(tracker, range(1, 50))
+    # The box came back counting from 30 with new reads
+    assert tracker.observe('box', 'finish', 30, 'new read') == RESET
+    assert tracker.observe('box', 'finish', 31, 'next') == IN_ORDER
+
+
+def test_first_read_after_reconnect_below_expected_is_a_restart():
+    tracker = SequenceTracker(max_seen=5)
+    feed(tracker, range(1, 50))
+    feed(tracker, range(50, 60), source='other')
+    tracker.reconnected('box')
+    assert tracker.observe('box', 'finish', 20) == RESET
+    # Only the reconnected box is affected, and only its first read
+    assert tracker.observe('other', 'finish', 20) == DUPLICATE
+    assert tracker.observe('box', 'finish', 21) == IN_ORDER
+    assert tracker.observe('box', 'finish', 10) == DUPLICATE
+
+
+def test_reconnect_keeps_filling_gaps():
+    tracker = SequenceTracker()
+    feed(tracker, [1, 2, 9])
+    tracker.reconnected('box')
+    # Resent reads answering the backfill request don't look like a restart
+    assert feed(tracker, [3, 4]) == [FILLED, FILLED]
+    assert feed(tracker, [10]) == [IN_ORDER]
+    assert feed(tracker, [4]) == [DUPLICATE]
+    assert tracker.observe('box', 'finish', 4, 'different') == RESET
+
+
+def test_large_backward_jump_is_a_restart():
+    tracker = SequenceTracker(reset_jump=100, max_seen=10)
+    feed(tracker, range(1, 500))
+    assert tracker.observe('box', 'finish', 450) == DUPLICATE
+    assert tracker.observe('box', 'finish', 300) == RESET
+
+
+def test_duplicate_burst_is_reported_once():
+    bursts = []
+    tracker = SequenceTracker(duplicate_alert=3, on_duplicates=lambda *burst: bursts.append(burst))
+    feed(tracker, range(1, 20))
+    assert feed(tracker, [10, 11, 12, 13, 14]) == [DUPLICATE] * 5
+    assert bursts == [('box', 'finish', 3)]
+    # A new read ends the run
+    feed(tracker, [20, 15, 16, 17])
+    assert bursts == [('box', 'finish', 3), ('box', 'finish', 3)]
+    assert tracker.stats[DUPLICATE] == 8
+
+
+def test_seen_reads_are_capped():
+    tracker = SequenceTracker(max_seen=10)
+    feed(tracker, range(1, 1000))
+    stream = tracker._streams[('box', 'finish')]
+    assert len(stream.seen) == 10
+    assert min(stream.seen) == 990
+
+
+def test_reset_forgets_streams():
+    tracker = SequenceTracker()
+    feed(tracker, [1, 5])
+    tracker.reset()
+    assert tracker.gaps() == {}
+    assert tracker.stats['missing'] == 0
+    assert feed(tracker, [3]) == [IN_ORDER]
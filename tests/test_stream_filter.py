@@ -0,0 +1,72 @@
+import queue
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import app
+from broadcast import BroadcastHub, projection_key
+from stream_filter import compile_filter, filter_from_args, parse_bib_ranges
+
+
+@pytest.mark.parametrize('value', ['abc', '-5', '10-5', '1-2-3', '5-x', '1.5'])
+def test_malformed_bib_ranges_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_bib_ranges([value])
+
+
+def test_bib_ranges_parse_and_sort():
+    assert parse_bib_ranges(['100-199', '42', ' 7 ']) == [(7, 7), (42, 42), (100, 199)]
+
+
+def test_overlapping_ranges_match_once():
+    stream_filter = compile_filter({'bib': ['1-10', '5-20', '8']})
+    assert [bib for bib in ('1', '8', '15', '20', '21', 'A1', '') if stream_filter({'bib': bib})] == ['1', '8', '15', '20']
+    # Equivalent filters share a key whatever order they were given in
+    assert compile_filter({'bib': ['8', '5-20', '1-10']}).key == stream_filter.key
+
+
+def test_fields_combine_and_ignore_case():
+    stream_filter = compile_filter({'location': 'Finish', 'race_name': ['10K', 'half']})
+    assert stream_filter({'location': 'finish', 'race_name': 'Half'})
+    assert not stream_filter({'location': 'finish', 'race_name': '5K'})
+    assert not stream_filter({'race_name': '10K'})
+    assert compile_filter({}) is None
+    assert compile_filter({'location': []}) is None
+
+
+def test_query_arguments():
+    args = MultiDict([('location', 'finish, mile5'), ('bib', '1-99'), ('bib', '200')])
+    stream_filter = filter_from_args(args)
+    assert stream_filter({'location': 'mile5', 'bib': '200'})
+    assert not stream_filter({'location': 'start', 'bib': '5'})
+    assert filter_from_args(MultiDict()) is None
+    with pytest.raises(ValueError):
+        filter_from_args(MultiDict([('bib', '9-1')]))
+
+
+def test_invalid_filter_is_a_bad_request():
+    response = app.app.test_client().get('/stream?bib=1-x')
+    assert response.status_code == 400
+    assert 'Invalid filter' in response.get_json()['error']
+
+
+def test_filter_and_projection_in_the_hub():
+    hub = BroadcastHub()
+    finish = compile_filter({'location': ['finish']})
+    subscriber = hub.subscribe('a', stream_filter=finish)
+    hub.publish({'bib': '1', 'name': 'A', 'location': 'start'})
+    hub.publish({'bib': '2', 'name': 'B', 'location': 'finish'})
+    hub.publish({'type': 'batch', 'runners': [
+        {'bib': '3', 'name': 'C', 'location': 'finish'}, {'bib': '4', 'name': 'D', 'location': 'start'}]})
+    events = []
+    while True:
+        try:
+            events.append(subscriber.get(timeout=0))
+        except queue.Empty:
+            break
+    fields = projection_key(['name'])
+    assert [event.encode(fields) for event in events] == [
+        '{"bib": "2", "name": "B"}',
+        '{"type": "batch", "runners": [{"bib": "3", "name": "C"}]}',
+    ]
+    assert hub.filtered_out == 1
@@ -0,0 +1,52 @@
+import os
+
+import app
+from template_cache import TemplateCache, compile_slots
+
+HTML = '<div><h1 data-placeholder="name"></h1><img data-placeholder="photo"><span class="bib-number"></span></div>'
+
+
+def test_slots_and_fields_are_compiled():
+    assert compile_slots(HTML) == [
+        {'field': 'name', 'index': 0, 'target': 'text'},
+        {'field': 'photo', 'index': 1, 'target': 'src'},
+        {'field': 'bib', 'class': 'bib-number', 'target': 'text'},
+    ]
+    cache = TemplateCache('.')
+    assert cache.get('no-such-template') is None
+
+
+def test_changed_file_is_compiled_again(tmp_path):
+    cache = TemplateCache(str(tmp_path))
+    first = cache.save('finish', HTML)
+    assert cache.get('finish') is first
+    assert first.fields == ('bib', 'name', 'photo')
+
+    # Edited on disk behind the cache's back
+    path = cache.path('finish')
+    with open(path, 'w', encoding='utf-8') as fp:
+        fp.write('<p data-placeholder="city"></p>')
+    os.utime(path, ns=(first.mtime + 10**9, first.mtime + 10**9))
+    second = cache.get('finish')
+    assert second is not first
+    assert second.fields == ('city',)
+    assert second.etag != first.etag
+
+    os.remove(path)
+    assert cache.get('finish') is None
+
+
+def test_unchanged_template_answers_304(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'template_cache', TemplateCache(str(tmp_path)))
+    app.template_cache.save('finish', HTML)
+    client = app.app.test_client()
+
+    response = client.get('/api/templates/finish')
+    assert response.status_code == 200
+    assert response.get_json()['slots'][0] == {'field': 'name', 'index': 0, 'target': 'text'}
+    etag = response.headers['ETag']
+
+    assert client.get('/api/templates/finish', headers={'If-None-Match': etag}).status_code == 304
+    app.template_cache.save('finish', '<p data-placeholder="city"></p>')
+    assert client.get('/api/templates/finish', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/api/templates/missing').status_code == 404
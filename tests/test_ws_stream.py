@@ -0,0 +1,76 @@
+import json
+
+from broadcast import BroadcastHub
+from ws_stream import ConnectionClosed, WebSocketSession, encode_batch
+
+
+class FakeSocket:
+    """Records frames sent and plays back client messages"""
+
+    def __init__(self, frames_before_close):
+        self.incoming = []
+        self.sent = []
+        self.frames_before_close = frames_before_close
+        self.on_send = None
+
+    def receive(self, timeout=None):
+        return self.incoming.pop(0) if self.incoming else None
+
+    def send(self, frame):
+        self.sent.append(json.loads(frame))
+        if self.on_send is not None:
+            self.on_send(self.sent[-1])
+        if len(self.sent) >= self.frames_before_close:
+            raise ConnectionClosed(1000, 'done')
+
+
+def bibs(frame):
+    return [row[frame['fields'].index('bib')] for row in frame['rows']]
+
+
+def test_encode_batch_sends_field_names_once():
+    hub = BroadcastHub()
+    events = [hub.publish({'bib': '1', 'name': 'A'}), hub.publish({'bib': '2', 'city': 'X'})]
+    frame = json.loads(encode_batch(events))
+    assert frame['fields'] == ['bib', 'name', 'city']
+    assert frame['rows'] == [['1', 'A', None], ['2', None, 'X']]
+    assert frame['ids'] == [event.id for event in events]
+
+
+def test_overflow_resends_from_the_last_ack():
+    hub = BroadcastHub(buffer_size=3, replay_size=100)
+    ws = FakeSocket(frames_before_close=7)
+    seen = hub.publish({'bib': '0'})
+    session = WebSocketSession(ws, hub, 'test', last_event_id=seen.id, window=0)
+
+    def publish_burst(frame):
+        if len(ws.sent) == 1:
+            # The client acks the first frame, then six reads arrive at once
+            ws.incoming.append(json.dumps({'ack': frame['ids'][-1]}))
+            for bib in range(2, 8):
+                hub.publish({'bib': str(bib)})
+
+    ws.on_send = publish_burst
+    hub.publish({'bib': '1'})
+    session.run()
+
+    received = [bib for frame in ws.sent for bib in bibs(frame)]
+    # The buffer held 3 of the 6; the rest came back from history
+    assert received == ['1', '2', '3', '4', '5', '6', '7']
+    assert session.resyncs == 1
+    assert len(hub) == 0
+
+
+def test_fields_messages():
+    session = WebSocketSession(FakeSocket(1), BroadcastHub(), 'ws-test')
+    session.handle_message(json.dumps({'fields': ['name', 'city']}))
+    assert session.fields == ('bib', 'city', 'name', 'type')
+    # A lone string is one field, not a set of letters
+    session.handle_message(json.dumps({'fields': 'name'}))
+    assert session.fields == ('bib', 'name', 'type')
+    # Anything else leaves the projection as it was
+    for bad in (42, {'name': True}, ['name', 3]):
+        session.handle_message(json.dumps({'fields': bad}))
+        assert session.fields == ('bib', 'name', 'type')
+    session.handle_message(json.dumps({'fields': []}))
+    assert session.fields is None
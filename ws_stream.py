@@ -0,0 +1,163 @@
+import json
+import logging
+import queue
+import time
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    ConnectionClosed = OSError
+
+from broadcast import projection_key
+from stream_filter import compile_filter
+
+stream_log = logging.getLogger('race_display.stream')
+
+
+def encode_batch(events, fields=None, encoding='json'):
+    """Pack a window of events into one frame
+
+    Field names are sent once per frame and each event becomes a row of
+    values in that order:
+    {"type": "frame", "fields": [...], "ids": [...], "rows": [[...], ...]}
+    With encoding='msgpack' the same structure is MessagePack encoded.
+    """
+    views = [event.view(fields) for event in events]
+    names = []
+    seen = set()
+    for view in views:
+        for key in view:
+            if key not in seen:
+                seen.add(key)
+                names.append(key)
+    frame = {
+        'type': 'frame',
+        'fields': names,
+        'ids': [event.id for event in events],
+        'rows': [[view.get(name) for name in names] for view in views],
+    }
+    if encoding == 'msgpack':
+        return msgpack.packb(frame)
+    return json.dumps(frame, separators=(',', ':'))
+
+
+class WebSocketSession:
+    """Forward hub events to one WebSocket client in batched frames
+
+    Events arriving within `window` seconds of the first one in a batch go out
+    together. The client may send JSON messages back:
+    {"ack": "<event id>"} once it has shown a frame, and
+    {"fields": [...], "filter": {"location": [...], "bib": ["1-999"]}} to change
+    what it gets; filters are applied by the hub before events are queued.
+    A client that reconnects with ?last_event_id=<last ack> is sent what it missed.
+
+    If the client falls far enough behind that its buffer drops events, the
+    session subscribes again from the last acked event (or the last one sent,
+    for clients that don't ack), so the gap is refilled from the hub's
+    history instead of being lost.
+    """
+
+    def __init__(self, ws, hub, name, fields=None, last_event_id=None,
+                 encoding='json', window=0.075, max_batch=500, stream_filter=None):
+        self.ws = ws
+        self.hub = hub
+        self.name = name
+        self.fields = fields
+        self.last_event_id = last_event_id
+        self.encoding = 'msgpack' if encoding == 'msgpack' and msgpack is not None else 'json'
+        self.window = window
+        self.max_batch = max_batch
+        self.filter = stream_filter
+        self.subscriber = None
+        self.acked = None
+        self.sent = None
+        self.frames = 0
+        self.resyncs = 0
+
+    def handle_message(self, message):
+        try:
+            data = json.loads(message)
+        except (TypeError, ValueError):
+            stream_log.debug("Ignoring malformed message from %s: %r", self.name, message)
+            return
+        if not isinstance(data, dict):
+            return
+        if 'ack' in data:
+            self.acked = data['ack']
+        if 'fields' in data:
+            fields = data['fields'] or ()
+            if isinstance(fields, str):
+                # {"fields": "bib"} means the one field, not its letters
+                fields = [fields]
+            if not isinstance(fields, (list, tuple)) or not all(isinstance(f, str) for f in fields):
+                stream_log.debug("Ignoring bad fields from %s: %r", self.name, fields)
+            else:
+                self.fields = projection_key(fields)
+        if 'filter' in data:
+            try:
+                self.filter = compile_filter(data['filter'])
+            except (AttributeError, TypeError, ValueError) as e:
+                stream_log.debug("Ignoring bad filter from %s: %s", self.name, e)
+                return
+            if self.subscriber is not None:
+                self.subscriber.filter = self.filter
+
+    def poll_client(self):
+        """Handle everything the client has sent without waiting"""
+        while True:
+            message = self.ws.receive(timeout=0)
+            if message is None:
+                return
+            self.handle_message(message)
+
+    def collect(self, subscriber):
+        """Wait up to a second for an event, then gather the rest of its window"""
+        try:
+            batch = [subscriber.get(timeout=1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(subscriber.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def resync(self):
+        """Replace an overflowed subscriber with one replaying from the last ack"""
+        dropped = self.subscriber.dropped
+        self.hub.unsubscribe(self.subscriber)
+        resume = self.acked or self.sent or self.last_event_id
+        # Room for the whole replay history, or the replay would overflow too
+        self.subscriber = self.hub.subscribe(
+            self.name, resume, self.filter,
+            buffer_size=self.hub.buffer_size + self.hub.history_size()
+        )
+        self.resyncs += 1
+        stream_log.info("%s dropped %d events; resending from %s", self.name, dropped, resume)
+
+    def run(self):
+        self.subscriber = self.hub.subscribe(self.name, self.last_event_id, self.filter)
+        try:
+            while True:
+                self.poll_client()
+                if self.subscriber.dropped:
+                    self.resync()
+                batch = self.collect(self.subscriber)
+                if batch:
+                    self.ws.send(encode_batch(batch, self.fields, self.encoding))
+                    self.sent = batch[-1].id
+                    self.frames += 1
+        except ConnectionClosed:
+            pass
+        finally:
+            self.hub.unsubscribe(self.subscriber)